@@ -0,0 +1,146 @@
+"""
+内容处理基准测试
+Benchmark: compiled paragraph classifier vs. the per-pattern implementation
+
+用法:
+    python -m benchmarks.bench_content_processor --txt 第一卷.txt
+    python -m benchmarks.bench_content_processor --fetch 第一卷   # 从缓存目录下载整卷TXT
+    python -m benchmarks.bench_content_processor                  # 使用内置示例文本
+"""
+
+import argparse
+import re
+import sys
+import time
+from typing import List
+
+from epub.content_processor import ContentProcessor
+
+class LegacyContentProcessor(ContentProcessor):
+    """逐段逐模式匹配的旧实现，作为对照组"""
+
+    # 强调格式：按顺序逐条替换
+    EMPHASIS_REPLACEMENTS = [
+        (r'\*\*([^*]+)\*\*', r'<strong>\1</strong>'),                # **粗体**
+        (r'__([^_]+)__', r'<strong>\1</strong>'),                    # __粗体__
+        (r'\*([^*]+)\*', r'<em>\1</em>'),                            # *斜体*
+        (r'_([^_]+)_', r'<em>\1</em>'),                              # _斜体_
+        (r'《([^》]+)》', r'<em class="book-title">《\1》</em>'),      # 《书名》
+        (r'【([^】]+)】', r'<strong class="special">\1</strong>'),    # 【特殊强调】
+    ]
+
+    def _process_paragraph(self, paragraph: str) -> str:
+        escaped_para = self._apply_emphasis(self._escape_html(paragraph))
+        para_type = self._identify_paragraph_type(paragraph)
+        return self.PARAGRAPH_TEMPLATES[para_type].format(escaped_para)
+
+    def _identify_paragraph_type(self, paragraph: str) -> str:
+        if self._is_subtitle(paragraph):
+            return 'title'
+        if self._contains_pattern(paragraph, self.dialogue_patterns):
+            return 'dialogue'
+        if self._contains_pattern(paragraph, self.thought_patterns):
+            return 'thought'
+        if self._contains_pattern(paragraph, self.narrator_patterns):
+            return 'narrator'
+        return 'normal'
+
+    def _is_subtitle(self, paragraph: str) -> bool:
+        if len(paragraph) > 50:
+            return False
+        return any(re.match(pattern, paragraph) for pattern in self.subtitle_patterns)
+
+    def _contains_pattern(self, text: str, patterns: List[str]) -> bool:
+        return any(re.search(pattern, text) for pattern in patterns)
+
+    def _apply_emphasis(self, text: str) -> str:
+        for pattern, replacement in self.EMPHASIS_REPLACEMENTS:
+            text = re.sub(pattern, replacement, text)
+        return text
+
+    def process_content(self, content: str) -> str:
+        html_paragraphs = []
+        for para in self._split_paragraphs(content):
+            if para.strip():
+                html_paragraphs.append(self._process_paragraph(para.strip()))
+        return '\n'.join(html_paragraphs)
+
+SAMPLE_TEXT = """「这是一段对话，」主角说道，「应该会以特殊的样式显示。」
+
+（这是内心独白，通常用括号表示。）
+
+**这是粗体文本**，*这是斜体文本*。《这是书名》，【这是特殊强调】。
+
+※ 这是旁白或注释文本 ※
+
+——这也是一种内心独白的表示方式——
+
+这是另一个普通段落，用来测试段落间的间距和排版效果。文本应该自动对齐，并且有适当的行间距。
+
+1. 这可能是一个小标题
+
+★ 特殊标记的文本 ★"""
+
+def load_chapters(args) -> List[str]:
+    """加载基准测试用的章节文本"""
+    if args.txt:
+        with open(args.txt, 'r', encoding='utf-8') as f:
+            text = f.read()
+        # 整卷文本按空行拆分为约每章200段的块
+        paragraphs = [line.strip() for line in text.splitlines() if line.strip()]
+        return ['\n\n'.join(paragraphs[i:i + 200]) for i in range(0, len(paragraphs), 200)]
+
+    if args.fetch:
+        from crawler.catalog import CatalogStore
+        from crawler.txt_ingest import TxtVolumeIngest
+        from utils.config import Config
+
+        catalog = CatalogStore().load(Config.NOVEL_URL)
+        volume = catalog.get_volume(args.fetch) if catalog else None
+        if volume is None:
+            sys.exit(f"缓存目录中没有卷册: {args.fetch}")
+        ingest = TxtVolumeIngest()
+        chapters, _ = ingest.split_chapters(ingest.fetch_volume_text(volume), volume)
+        return [chapter['content'] for chapter in chapters]
+
+    return [SAMPLE_TEXT] * 200
+
+def run_benchmark(chapters: List[str], repeat: int) -> dict:
+    """运行基准测试，返回两种实现的耗时"""
+    legacy = LegacyContentProcessor()
+    compiled = ContentProcessor()
+
+    mismatches = sum(1 for c in chapters if legacy.process_content(c) != compiled.process_content(c))
+
+    timings = {}
+    for name, processor in (('legacy', legacy), ('compiled', compiled)):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for chapter in chapters:
+                processor.process_content(chapter)
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+
+    paragraph_count = sum(len(compiled._split_paragraphs(c)) for c in chapters)
+    return {'timings': timings, 'paragraphs': paragraph_count, 'mismatches': mismatches}
+
+def main():
+    parser = argparse.ArgumentParser(description="内容处理基准测试")
+    parser.add_argument('--txt', help='整卷TXT文件路径')
+    parser.add_argument('--fetch', help='从缓存目录下载指定卷册的TXT（卷册标题）')
+    parser.add_argument('--repeat', type=int, default=5, help='重复次数，取最佳值')
+    args = parser.parse_args()
+
+    chapters = load_chapters(args)
+    result = run_benchmark(chapters, args.repeat)
+    legacy, compiled = result['timings']['legacy'], result['timings']['compiled']
+
+    print(f"章节: {len(chapters)}  段落: {result['paragraphs']}")
+    print(f"逐模式实现: {legacy * 1000:.1f} ms")
+    print(f"预编译实现: {compiled * 1000:.1f} ms")
+    print(f"加速比: {legacy / compiled:.1f}x")
+    print(f"输出不一致的章节: {result['mismatches']}")
+
+if __name__ == "__main__":
+    main()
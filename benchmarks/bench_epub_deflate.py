@@ -0,0 +1,72 @@
+"""
+EPUB压缩基准测试
+Benchmark: serial vs. thread-pool deflate when writing an EPUB
+
+用法:
+    python -m benchmarks.bench_epub_deflate
+    python -m benchmarks.bench_epub_deflate --chapters 300 --workers 1 2 4
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List
+
+from epub.epub_writer import StreamingEPUBWriter
+
+METADATA = {'identifier': 'urn:bench', 'title': '压缩测试卷', 'language': 'zh-CN', 'modified': '1980-01-01T00:00:00Z'}
+
+def sample_chapters(count: int, paragraphs: int) -> List[bytes]:
+    """生成与章节XHTML大小相近、不易压缩得过好的文本"""
+    rng = random.Random(0)
+    words = ['他', '她', '说道', '「', '」', '然后', '学校', '走廊', '窗外', '天空', '没有', '什么', '。', '，', '……']
+    chapters = []
+    for i in range(count):
+        body = '\n'.join(f'    <p>{"".join(rng.choice(words) for _ in range(80))}</p>' for _ in range(paragraphs))
+        chapters.append(f'<html><body><h1>第{i}章</h1>\n{body}\n</body></html>'.encode('utf-8'))
+    return chapters
+
+def write_epub(path: str, chapters: List[bytes], workers: int) -> float:
+    """写入EPUB，返回耗时（秒）"""
+    start = time.perf_counter()
+    with StreamingEPUBWriter(path, METADATA, compress_workers=workers) as writer:
+        for i, content in enumerate(chapters):
+            writer.add_document(f'chapter_{i}', f'chapter_{i}.xhtml', content, title=f'第{i}章')
+    return time.perf_counter() - start
+
+def run_benchmark(chapters: List[bytes], workers: List[int], repeat: int) -> Dict[int, Dict]:
+    """各线程数的最佳耗时和输出摘要"""
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for count in workers:
+            path = os.path.join(directory, f'bench_{count}.epub')
+            best = min(write_epub(path, chapters, count) for _ in range(repeat))
+            with open(path, 'rb') as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            results[count] = {'seconds': best, 'sha256': digest}
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="EPUB压缩基准测试")
+    parser.add_argument('--chapters', type=int, default=200, help='章节数')
+    parser.add_argument('--paragraphs', type=int, default=150, help='每章段落数')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help='压缩线程数')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数，取最佳值')
+    args = parser.parse_args()
+
+    chapters = sample_chapters(args.chapters, args.paragraphs)
+    size = sum(len(content) for content in chapters)
+    results = run_benchmark(chapters, args.workers, args.repeat)
+    serial = results[args.workers[0]]['seconds']
+
+    print(f"章节: {len(chapters)}  原始大小: {size / 1024 / 1024:.1f} MB  CPU核数: {os.cpu_count()}")
+    for count, result in results.items():
+        print(f"  {count} 个线程: {result['seconds'] * 1000:.1f} ms  ({serial / result['seconds']:.2f}x)")
+    digests = {result['sha256'] for result in results.values()}
+    print(f"输出一致: {'是' if len(digests) == 1 else '否'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+事件循环阻塞基准测试
+Benchmark: loop lag caused by parsing and EPUB writing inline vs. offloaded to executors
+
+用法:
+    python -m benchmarks.bench_loop_lag
+    python -m benchmarks.bench_loop_lag --pages 200 --chapters 40
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+
+from utils.config import Config
+from utils.loop_watchdog import LoopWatchdog
+from crawler.page_parser import PageParser
+from crawler.parse_executor import ParseExecutor
+from epub.epub_generator import EPUBGenerator
+
+def sample_page(index: int) -> str:
+    """生成与章节页面结构相近的HTML"""
+    paragraphs = ''.join(f'<br/>&nbsp;&nbsp;&nbsp;&nbsp;第{index}章第{i}段，「对话内容」以及较长的叙述文字。' * 3
+                         for i in range(120))
+    return (f'<html><head><title>第{index}章</title></head><body>'
+            f'<div id="title">第{index}章</div><div id="content">{paragraphs}</div></body></html>')
+
+def sample_volume(chapters: int) -> dict:
+    """生成示例卷册数据"""
+    return {
+        'title': '阻塞测试卷',
+        'chapters': [{'title': f'第{i}章', 'content': f'第{i}章的正文。\n\n' * 400, 'url': f'https://example.com/{i}'}
+                     for i in range(chapters)],
+        'images': [],
+    }
+
+async def ticker(stop: asyncio.Event):
+    """模拟与解析并发运行的其他任务（如Playwright通信）"""
+    while not stop.is_set():
+        await asyncio.sleep(0.01)
+
+async def run_case(name: str, work, watchdog_threshold: float):
+    """在阻塞检测下运行一组工作，返回检测结果"""
+    stop = asyncio.Event()
+    background = asyncio.create_task(ticker(stop))
+    start = time.perf_counter()
+    async with LoopWatchdog(threshold=watchdog_threshold) as watchdog:
+        await work()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await background
+
+    print(f"\n[{name}] 用时 {elapsed:.2f}秒，阻塞 {watchdog.stalls} 次，合计 {watchdog.total_blocked * 1000:.0f}ms，"
+          f"最长 {watchdog.max_lag * 1000:.0f}ms")
+    for site in watchdog.report()[:5]:
+        print(f"  {site['total'] * 1000:8.0f}ms  {site['count']:>4}次  {site['site']}")
+
+async def main_async(args):
+    pages = [sample_page(i) for i in range(args.pages)]
+    volume = sample_volume(args.chapters)
+    parser = PageParser()
+    loop = asyncio.get_running_loop()
+
+    async def parse_inline():
+        for page in pages:
+            parser.parse_chapter_page(page)
+            await asyncio.sleep(0)
+
+    async def parse_offloaded():
+        with ParseExecutor() as executor:
+            await executor.parse_batch(pages, 'chapter')
+
+    async def epub_inline():
+        EPUBGenerator().create_epub(volume)
+
+    async def epub_offloaded():
+        await loop.run_in_executor(None, EPUBGenerator().create_epub, volume)
+
+    for name, work in (('在事件循环中解析', parse_inline), ('解析进程池', parse_offloaded),
+                       ('在事件循环中生成EPUB', epub_inline), ('线程池生成EPUB', epub_offloaded)):
+        await run_case(name, work, args.threshold)
+
+def main():
+    parser = argparse.ArgumentParser(description="事件循环阻塞基准测试")
+    parser.add_argument('--pages', type=int, default=100, help='解析的页面数')
+    parser.add_argument('--chapters', type=int, default=100, help='EPUB章节数')
+    parser.add_argument('--threshold', type=float, default=0.05, help='阻塞阈值（秒）')
+    parser.add_argument('--writer', choices=['streaming', 'ebooklib'], default='ebooklib', help='EPUB写入方式')
+    args = parser.parse_args()
+
+    Config.EPUB_WRITER = args.writer
+    with tempfile.TemporaryDirectory() as directory:
+        Config.OUTPUT_DIR = directory
+        asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
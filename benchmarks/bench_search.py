@@ -0,0 +1,133 @@
+"""
+全文搜索基准测试
+Benchmark: posting list decoding and candidate ranking over a synthetic library index
+
+用法:
+    python -m benchmarks.bench_search
+    python -m benchmarks.bench_search --chapters 100000 --segments 1 16
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+from utils.chapter_store import _connect
+from utils.search_index import SearchIndex, decode_postings, encode_postings
+
+# 索引词及其出现在多少比例的章节中（常用字、常见二字组、少见的人名）
+TERMS = {'的': 1.0, '他们': 0.6, '们的': 0.5, '的学': 0.2, '学校': 0.1, '魔王': 0.01, '葛葉': 0.0005}
+QUERIES = ('葛葉', '魔王', '学校', '他们', '他们的学校')
+
+def encode_varint_postings(postings: List[Tuple[int, int]]) -> bytes:
+    """改用定长数组之前的格式：(文档ID差值, 词频) 依次写成varint，用于对比"""
+    out = bytearray()
+    last_doc = 0
+    for doc, tf in postings:
+        for value in (doc - last_doc, tf):
+            while value >= 0x80:
+                out.append((value & 0x7f) | 0x80)
+                value >>= 7
+            out.append(value)
+        last_doc = doc
+    return bytes(out)
+
+def decode_varint_postings(blob: bytes) -> List[Tuple[int, int]]:
+    postings = []
+    values = []
+    value = shift = 0
+    for byte in blob:
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        values.append(value)
+        value = shift = 0
+        if len(values) == 2:
+            doc = values[0] + (postings[-1][0] if postings else 0)
+            postings.append((doc, values[1]))
+            values = []
+    return postings
+
+def build_index(path: str, chapters: int, segments: int) -> Dict[str, List[Tuple[int, int]]]:
+    """直接写入章节、文档记录和倒排段（不经过分词），返回各词的倒排表"""
+    rng = random.Random(0)
+    conn = _connect(path)
+    SearchIndex(conn)
+    postings = {term: sorted((doc, rng.randint(1, 40)) for doc in rng.sample(range(1, chapters + 1),
+                                                                          max(1, int(chapters * ratio))))
+                for term, ratio in TERMS.items()}
+    with conn:
+        conn.execute("INSERT INTO volumes (id, novel, title) VALUES (1, 'bench', '第1卷')")
+        conn.executemany(
+            'INSERT INTO chapters (id, volume_id, url, position, title, content, length) VALUES (?, 1, ?, ?, ?, ?, ?)',
+            ((doc, f'/{doc}.htm', doc, f'第{doc}章', b'', 5000) for doc in range(1, chapters + 1))
+        )
+        conn.executemany('INSERT INTO search_docs (id, chapter_id, length) VALUES (?, ?, ?)',
+                         ((doc, doc, rng.randint(3000, 8000)) for doc in range(1, chapters + 1)))
+        # 按文档ID区间分段，与逐批写入、尚未合并时的布局相同
+        step = -(-chapters // segments)
+        for term, entries in postings.items():
+            for first in range(1, chapters + 1, step):
+                segment = [(doc, tf) for doc, tf in entries if first <= doc < first + step]
+                if segment:
+                    conn.execute('INSERT INTO search_terms VALUES (?, ?, ?, ?)',
+                                 (term, segment[0][0], len(segment), encode_postings(segment)))
+    conn.close()
+    return postings
+
+def best_of(func, repeat: int) -> float:
+    """最佳耗时（毫秒）"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+def run_benchmark(chapters: int, segments: int, repeat: int) -> Dict:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.db')
+        postings = build_index(path, chapters, segments)
+        conn = sqlite3.connect(path)
+        index = SearchIndex(conn)
+        size = conn.execute('SELECT SUM(LENGTH(postings)) FROM search_terms').fetchone()[0]
+
+        terms = {}
+        for term, entries in postings.items():
+            assert index._postings(term) == dict(entries)
+            blob, varint = encode_postings(entries), encode_varint_postings(entries)
+            terms[term] = {
+                'df': len(entries),
+                'postings_ms': best_of(lambda: index._postings(term), repeat),
+                'decode_ms': best_of(lambda: decode_postings(blob), repeat),
+                'varint_ms': best_of(lambda: decode_varint_postings(varint), repeat),
+                'varint_bytes': len(varint),
+            }
+        queries = {query: best_of(lambda: index.candidates(query), repeat) for query in QUERIES}
+        conn.close()
+    return {'bytes': size, 'terms': terms, 'queries': queries}
+
+def main():
+    parser = argparse.ArgumentParser(description="全文搜索基准测试")
+    parser.add_argument('--chapters', type=int, default=40000, help='章节数（每章约100段）')
+    parser.add_argument('--segments', type=int, nargs='+', default=[1, 16], help='每个词的倒排段数')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数，取最佳值')
+    args = parser.parse_args()
+
+    print(f"章节: {args.chapters}  （约 {args.chapters * 100 // 10000} 万段）")
+    for segments in args.segments:
+        result = run_benchmark(args.chapters, segments, args.repeat)
+        print(f"倒排段数 {segments}，倒排表共 {result['bytes'] / 1024 / 1024:.1f} MB")
+        for term, info in result['terms'].items():
+            print(f"  {term}: 文档数 {info['df']:>6}  读取合并 {info['postings_ms']:7.2f} ms  "
+                  f"解码 {info['decode_ms']:6.2f} ms（varint格式解码 {info['varint_ms']:7.2f} ms，"
+                  f"大小为定长格式的 {info['varint_bytes'] / (info['df'] * 6):.0%}）")
+        for query, ms in result['queries'].items():
+            print(f"  候选排序 \"{query}\": {ms:7.2f} ms")
+
+if __name__ == "__main__":
+    main()
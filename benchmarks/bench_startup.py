@@ -0,0 +1,82 @@
+"""
+启动时间基准测试
+Benchmark: wall-clock startup and imported heavy modules for commands that need no browser
+
+用法:
+    python -m benchmarks.bench_startup                 # 默认命令各运行5次
+    python -m benchmarks.bench_startup --repeat 10
+    python -m benchmarks.bench_startup --top 15        # 同时列出导入耗时最多的模块
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+# 不需要浏览器的命令（--volumes 使用不存在的卷册名，只测启动与导入，不做实际构建）
+COMMANDS = [
+    ['--help'],
+    ['--list'],
+    ['--rebuild-all', '--volumes', '__startup_benchmark__'],
+    ['--omnibus', '--volumes', '__startup_benchmark__'],
+]
+
+# 这些命令不应导入的重量级依赖
+HEAVY_MODULES = ('playwright', 'ebooklib', 'bs4', 'lxml', 'fake_useragent', 'requests', 'httpx', 'PIL')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run_once(argv: List[str]) -> float:
+    """运行一次命令，返回耗时（秒）"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, *argv], cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+def import_profile(args: List[str]) -> Dict[str, int]:
+    """用 -X importtime 运行命令，返回 {模块: 累计导入耗时(微秒)}，只统计顶层导入"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', 'main.py', *args], cwd=ROOT,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # 被其他模块间接导入的模块名前有额外缩进
+        modules[name.strip()] = int(cumulative) if not name.startswith('  ') else modules.get(name.strip(), 0)
+    return modules
+
+def main():
+    parser = argparse.ArgumentParser(description="启动时间基准测试")
+    parser.add_argument('--repeat', type=int, default=5, help='每个命令的运行次数')
+    parser.add_argument('--top', type=int, default=0, help='列出导入耗时最多的N个模块')
+    args = parser.parse_args()
+
+    baseline = min(run_once(['-c', 'pass']) for _ in range(args.repeat))
+    print(f"空解释器启动: {baseline * 1000:.1f} ms")
+
+    failed = False
+    for command in COMMANDS:
+        timings = [run_once(['main.py', *command]) for _ in range(args.repeat)]
+        modules = import_profile(command)
+        heavy = sorted({name.split('.')[0] for name in modules} & set(HEAVY_MODULES))
+        failed = failed or bool(heavy)
+
+        print(f"\nmain.py {' '.join(command)}")
+        print(f"  最佳 {min(timings) * 1000:.1f} ms  中位数 {statistics.median(timings) * 1000:.1f} ms  "
+              f"(扣除解释器 {(min(timings) - baseline) * 1000:.1f} ms)")
+        print(f"  重量级依赖: {', '.join(heavy) if heavy else '无'}")
+
+        if args.top:
+            top = sorted(((us, name) for name, us in modules.items() if us), reverse=True)[:args.top]
+            for us, name in top:
+                print(f"    {us / 1000:7.1f} ms  {name}")
+
+    if os.environ.get('PYTHONDONTWRITEBYTECODE'):
+        print("\n注意: 设置了PYTHONDONTWRITEBYTECODE，每次启动都会重新编译源码，结果偏慢")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+"""
+pytest配置：运行时目录指向临时目录
+Point data/, output/ and logs/ at a temporary directory while the test suite runs
+"""
+
+import os
+import shutil
+import tempfile
+
+from utils.config import Config
+from utils.logger import logger
+
+_RUNTIME_ROOTS = (Config.DATA_DIR, Config.OUTPUT_DIR, Config.LOG_DIR)
+_runtime_dir = tempfile.mkdtemp(prefix='novel_crawler_test_')
+
+# 章节库、资源缓存、UA池、目录缓存、日志和输出等路径都位于这三个目录下
+for _name, _value in list(vars(Config).items()):
+    if _name.isupper() and isinstance(_value, str) and _value.split(os.sep)[0] in _RUNTIME_ROOTS:
+        setattr(Config, _name, os.path.join(_runtime_dir, _value))
+
+# 日志文件路径在设置时确定，按新目录重新设置
+logger.reconfigure()
+
+def pytest_unconfigure(config):
+    logger.shutdown()
+    shutil.rmtree(_runtime_dir, ignore_errors=True)
@@ -3,27 +3,80 @@
 Anti-crawler strategy module
 """
 
+import json
+import os
 import random
 import time
 import asyncio
-from typing import List
-from fake_useragent import UserAgent
+from typing import List, Optional
 from utils.config import Config
 from utils.logger import logger
+from crawler.http_session import SessionExpired
+from crawler.proxy_pool import playwright_proxy
+
+class UserAgentPool:
+    """缓存在本地的User-Agent池
+
+    fake-useragent加载数据较慢，只在缓存不存在或过期时才导入并抽样生成；
+    平时直接从缓存文件中随机选取。生成失败时使用配置中的User-Agent列表。
+    """
+    
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or Config.UA_POOL_PATH
+        self._agents: Optional[List[str]] = None
+    
+    @property
+    def agents(self) -> List[str]:
+        if self._agents is None:
+            self._agents = self._load() or self._refresh()
+        return self._agents
+    
+    def random(self) -> str:
+        """随机选取一个User-Agent"""
+        return random.choice(self.agents)
+    
+    def _load(self) -> Optional[List[str]]:
+        """读取未过期的缓存"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        if time.time() - cached.get('created', 0) > Config.UA_POOL_MAX_AGE_DAYS * 86400:
+            return None
+        return cached.get('agents') or None
+    
+    def _refresh(self) -> List[str]:
+        """用fake-useragent重新抽样并写入缓存"""
+        try:
+            from fake_useragent import UserAgent
+            ua = UserAgent()
+            agents = sorted({ua.random for _ in range(Config.UA_POOL_SIZE * 2)})[:Config.UA_POOL_SIZE]
+        except Exception as e:
+            logger.warning(f"fake-useragent不可用，使用配置中的User-Agent: {str(e)}")
+            return list(Config.USER_AGENTS)
+        
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path + '.part', 'w', encoding='utf-8') as f:
+            json.dump({'created': time.time(), 'agents': agents}, f, ensure_ascii=False, indent=2)
+        os.replace(self.path + '.part', self.path)
+        logger.debug(f"User-Agent池已更新: {len(agents)} 个")
+        return agents
 
 class AntiCrawlerStrategy:
     """反爬虫策略类"""
     
     def __init__(self):
-        self.ua = UserAgent()
+        self.ua_pool = UserAgentPool()
         self.request_count = 0
         self.last_request_time = 0
     
     def get_random_user_agent(self) -> str:
         """获取随机User-Agent"""
         try:
-            # 优先使用fake-useragent
-            return self.ua.random
+            # 优先使用缓存的fake-useragent抽样
+            return self.ua_pool.random()
         except Exception:
             # 如果失败，使用配置中的User-Agent池
             return random.choice(Config.USER_AGENTS)
@@ -35,7 +88,7 @@ class AntiCrawlerStrategy:
     async def apply_delay(self):
         """应用延迟策略"""
         delay = self.get_random_delay()
-        logger.debug(f"应用延迟: {delay:.2f}秒")
+        logger.debug("应用延迟: %.2f秒", delay)
         await asyncio.sleep(delay)
     
     def should_delay(self) -> bool:
@@ -61,9 +114,9 @@ class AntiCrawlerStrategy:
         if self.request_count % 50 == 0:
             logger.info(f"已完成 {self.request_count} 个请求")
     
-    def get_playwright_options(self) -> dict:
-        """获取Playwright配置选项"""
-        return {
+    def get_playwright_options(self, proxy: Optional[str] = None) -> dict:
+        """获取Playwright配置选项（指定代理时浏览器上下文经由该代理访问）"""
+        options = {
             'user_agent': self.get_random_user_agent(),
             'viewport': {'width': 1920, 'height': 1080},
             'extra_http_headers': {
@@ -75,6 +128,9 @@ class AntiCrawlerStrategy:
                 'Upgrade-Insecure-Requests': '1',
             }
         }
+        if proxy:
+            options['proxy'] = playwright_proxy(proxy)
+        return options
     
     async def handle_request_with_retry(self, request_func, *args, max_retries: int = None, **kwargs):
         """带重试机制的请求处理"""
@@ -97,6 +153,9 @@ class AntiCrawlerStrategy:
                 
                 return result
                 
+            except SessionExpired:
+                # 会话失效重试无意义，交给调用方重新通过浏览器验证
+                raise
             except Exception as e:
                 last_exception = e
                 logger.warning(f"请求失败 (尝试 {attempt + 1}/{max_retries + 1}): {str(e)}")
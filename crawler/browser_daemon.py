@@ -0,0 +1,252 @@
+"""
+常驻浏览器模块
+Long-lived Chromium daemon with a persistent profile, reached over CDP
+
+用法:
+    python -m crawler.browser_daemon start
+    python -m crawler.browser_daemon status
+    python -m crawler.browser_daemon stop
+"""
+
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Dict, List, Optional
+
+from utils.config import Config
+from utils.logger import logger
+
+# 本地调试端口不走系统代理
+_LOCAL_OPENER = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+# Windows进程查询
+_PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+_ERROR_ACCESS_DENIED = 5
+_STILL_ACTIVE = 259
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == 'nt':
+        # Windows上os.kill(pid, 0)会向进程发送CTRL_C_EVENT，改为查询退出码
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(_PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            # 进程不存在时为ERROR_INVALID_PARAMETER，无权限时进程仍在运行
+            return ctypes.GetLastError() == _ERROR_ACCESS_DENIED
+        try:
+            code = ctypes.c_ulong()
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(code))) and code.value == _STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+
+    # 由本进程启动的浏览器退出后需要回收，否则仍会被视为存活
+    try:
+        if os.waitpid(pid, os.WNOHANG)[0] == pid:
+            return False
+    except ChildProcessError:
+        pass
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+def _command_line(pid: int) -> Optional[str]:
+    """进程的命令行，无法读取时为None"""
+    if os.path.isdir('/proc'):
+        try:
+            with open(f'/proc/{pid}/cmdline', 'rb') as f:
+                return f.read().replace(b'\0', b' ').decode('utf-8', errors='replace')
+        except OSError:
+            return None
+    if os.name == 'nt':
+        command = ['powershell', '-NoProfile', '-NonInteractive', '-Command',
+                   f'(Get-CimInstance Win32_Process -Filter "ProcessId={pid}").CommandLine']
+    else:
+        command = ['ps', '-ww', '-o', 'command=', '-p', str(pid)]
+    try:
+        result = subprocess.run(command, capture_output=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    output = result.stdout.decode('utf-8', errors='replace').strip()
+    return output if result.returncode == 0 and output else None
+
+def _kill(pid: int, force: bool):
+    """结束进程：POSIX发送SIGTERM/SIGKILL，Windows调用taskkill（连同子进程）"""
+    if os.name == 'nt':
+        subprocess.run(['taskkill', '/PID', str(pid), '/T'] + (['/F'] if force else []),
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return
+    try:
+        os.kill(pid, signal.SIGKILL if force else signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+
+class BrowserDaemon:
+    """在后台常驻的Chromium
+
+    浏览器使用 BROWSER_DAEMON_DIR 下固定的用户数据目录，HTTP缓存、cookie和已通过的验证
+    在多次运行之间保留。爬虫通过 connect_over_cdp 连接，结束时只断开连接。
+    状态文件记录进程号、端口和User-Agent；连接前检查调试端口，无响应时结束旧进程并重新启动。
+    """
+
+    def __init__(self, directory: Optional[str] = None, port: Optional[int] = None):
+        self.directory = directory or Config.BROWSER_DAEMON_DIR
+        self.port = port or Config.BROWSER_DAEMON_PORT
+        self.state_path = os.path.join(self.directory, 'daemon.json')
+        self.profile_dir = os.path.join(self.directory, 'profile')
+        self.log_path = os.path.join(self.directory, 'chromium.log')
+
+    @property
+    def endpoint(self) -> str:
+        """connect_over_cdp 使用的地址"""
+        return f"http://127.0.0.1:{self.port}"
+
+    def load_state(self) -> Optional[Dict]:
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_state(self, state: Dict):
+        with open(self.state_path + '.part', 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(self.state_path + '.part', self.state_path)
+
+    def version(self, timeout: float = 2.0) -> Optional[Dict]:
+        """健康检查：调试端口返回的浏览器版本信息，无响应时为None"""
+        try:
+            with _LOCAL_OPENER.open(f"{self.endpoint}/json/version", timeout=timeout) as response:
+                info = json.loads(response.read().decode('utf-8'))
+        except (OSError, ValueError):
+            return None
+        return info if 'webSocketDebuggerUrl' in info else None
+
+    def status(self) -> Optional[Dict]:
+        """正在运行且健康时返回状态（含浏览器版本），否则为None"""
+        state = self.load_state()
+        if state is None or state.get('port') != self.port:
+            return None
+        info = self.version()
+        if info is None:
+            return None
+        return {**state, 'browser': info.get('Browser', '')}
+
+    def ensure(self, executable: str, user_agent: str) -> Dict:
+        """返回可连接的常驻浏览器状态，没有运行或不健康时（重新）启动"""
+        state = self.status()
+        if state is not None:
+            logger.debug("复用常驻浏览器: pid %s, %s", state['pid'], state['browser'])
+            return state
+
+        stale = self.load_state()
+        if stale is not None:
+            logger.warning(f"常驻浏览器无响应，重新启动（旧进程 {stale.get('pid')}）")
+            self._terminate(stale.get('pid'))
+        return self.launch(executable, user_agent)
+
+    def _owns(self, pid: int) -> bool:
+        """进程是否为使用本用户数据目录的浏览器（进程号可能已被其他进程复用）
+
+        读取不到命令行时无法确认，按不属于本浏览器处理，宁可留下旧进程也不误杀其他进程。
+        """
+        cmdline = _command_line(pid)
+        if cmdline is None:
+            logger.warning(f"无法读取进程 {pid} 的命令行，不结束该进程")
+            return False
+        return f'--user-data-dir={os.path.abspath(self.profile_dir)}' in cmdline
+
+    def _command(self, executable: str, user_agent: str) -> List[str]:
+        return [
+            executable,
+            '--headless=new',
+            f'--remote-debugging-port={self.port}',
+            '--remote-debugging-address=127.0.0.1',
+            f'--user-data-dir={os.path.abspath(self.profile_dir)}',
+            f'--user-agent={user_agent}',
+            '--no-first-run',
+            '--no-default-browser-check',
+            *Config.BROWSER_ARGS,
+            'about:blank',
+        ]
+
+    def launch(self, executable: str, user_agent: str) -> Dict:
+        """启动脱离当前进程的浏览器，等待调试端口就绪"""
+        os.makedirs(self.profile_dir, exist_ok=True)
+        options = {'start_new_session': True} if os.name == 'posix' else {
+            'creationflags': subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP}
+        with open(self.log_path, 'ab') as log:
+            process = subprocess.Popen(self._command(executable, user_agent), stdin=subprocess.DEVNULL,
+                                       stdout=log, stderr=subprocess.STDOUT, close_fds=True, **options)
+
+        start = time.perf_counter()
+        while self.version(timeout=1.0) is None:
+            if process.poll() is not None:
+                raise RuntimeError(f"常驻浏览器启动失败（退出码 {process.returncode}），详见 {self.log_path}")
+            if time.perf_counter() - start > Config.BROWSER_DAEMON_START_TIMEOUT:
+                self._terminate(process.pid)
+                raise RuntimeError(f"常驻浏览器 {Config.BROWSER_DAEMON_START_TIMEOUT} 秒内未就绪，详见 {self.log_path}")
+            time.sleep(0.1)
+
+        state = {'pid': process.pid, 'port': self.port, 'user_agent': user_agent,
+                 'profile': os.path.abspath(self.profile_dir), 'started': time.time()}
+        self._save_state(state)
+        logger.info(f"常驻浏览器已启动: pid {process.pid}, 端口 {self.port} ({time.perf_counter() - start:.1f}秒)")
+        return state
+
+    def stop(self) -> bool:
+        """结束常驻浏览器"""
+        state = self.load_state()
+        if state is None:
+            return False
+        self._terminate(state.get('pid'))
+        os.remove(self.state_path)
+        logger.info(f"常驻浏览器已停止: pid {state.get('pid')}")
+        return True
+
+    def _terminate(self, pid: Optional[int], timeout: float = 5.0):
+        """结束浏览器进程（先正常退出，超时后强制结束）"""
+        if not pid or not _pid_alive(pid) or not self._owns(pid):
+            return
+        _kill(pid, force=False)
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            if not _pid_alive(pid):
+                return
+            time.sleep(0.1)
+        _kill(pid, force=True)
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="常驻浏览器管理")
+    parser.add_argument('action', choices=['start', 'stop', 'status'])
+    args = parser.parse_args()
+
+    daemon = BrowserDaemon()
+    if args.action == 'start':
+        from playwright.sync_api import sync_playwright
+        from crawler.anti_crawler import AntiCrawlerStrategy
+        with sync_playwright() as playwright:
+            executable = playwright.chromium.executable_path
+        state = daemon.ensure(executable, AntiCrawlerStrategy().get_random_user_agent())
+        print(f"常驻浏览器运行中: pid {state['pid']}, {daemon.endpoint}")
+    elif args.action == 'stop':
+        if not daemon.stop():
+            print("常驻浏览器未运行")
+    else:
+        state = daemon.status()
+        if state is None:
+            print("常驻浏览器未运行")
+            sys.exit(1)
+        print(f"常驻浏览器运行中: pid {state['pid']}, {daemon.endpoint}, {state['browser']}, "
+              f"已运行 {(time.time() - state['started']) / 3600:.1f} 小时")
+
+if __name__ == "__main__":
+    main()
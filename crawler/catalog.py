@@ -0,0 +1,187 @@
+"""
+目录索引模块
+Catalog index module - structured, cached novel catalog
+"""
+
+import hashlib
+import json
+import os
+import re
+import zlib
+from typing import Dict, List, Optional
+from urllib.parse import urljoin
+
+from utils.config import Config
+from utils.logger import logger
+
+class Catalog:
+    """结构化目录：小说 → 卷册 → 章节"""
+
+    def __init__(self, novel_url: str, fingerprint: str, volumes: List[Dict]):
+        self.novel_url = novel_url
+        self.fingerprint = fingerprint
+        self.volumes = volumes
+        self._build_index()
+
+    @classmethod
+    def from_volume_list(cls, novel_url: str, fingerprint: str, volume_list: List[Dict]) -> 'Catalog':
+        """由 PageParser.parse_volume_list 的结果构建目录"""
+        volumes = []
+        order = 0
+
+        for volume_index, raw_volume in enumerate(volume_list):
+            chapters = []
+            for chapter in raw_volume['chapters']:
+                chapters.append(cls._make_entry(novel_url, chapter, order, volume_index))
+                order += 1
+
+            images = [
+                cls._make_entry(novel_url, image, i, volume_index)
+                for i, image in enumerate(raw_volume['images'])
+            ]
+
+            volumes.append({
+                # 卷册ID只用于拼接整卷TXT下载地址，推算错误时由整卷导入的抽样校验兜底
+                'id': cls._volume_id(raw_volume, chapters),
+                'index': volume_index,
+                'title': raw_volume['title'],
+                'chapters': chapters,
+                'images': images
+            })
+
+        return cls(novel_url, fingerprint, volumes)
+
+    @classmethod
+    def _make_entry(cls, novel_url: str, link: Dict, order: int, volume_index: int) -> Dict:
+        """生成带ID、绝对URL和顺序的目录条目"""
+        url = urljoin(novel_url, link['url'])
+        return {
+            'id': cls.chapter_id(url),
+            'title': link['title'],
+            'url': url,
+            'order': order,
+            'volume': volume_index
+        }
+
+    @staticmethod
+    def chapter_id(url: str) -> int:
+        """稳定的章节数字ID：优先使用URL中的编号，否则使用URL的CRC32"""
+        match = re.search(r'(\d+)\.htm', url)
+        if match:
+            return int(match.group(1))
+        return zlib.crc32(url.encode('utf-8'))
+
+    @staticmethod
+    def _volume_id(raw_volume: Dict, chapters: List[Dict]) -> Optional[int]:
+        """卷册ID：优先使用页面上的vid，否则推算
+
+        wenku8的目录中卷名行和章节共用一个递增编号，卷册ID就是卷名行的编号，
+        即紧挨着的首章ID减一。这只是惯例（站点插入章节、改版后可能不成立）：
+        推算的ID只影响整卷TXT下载地址，下载到的内容若与章节页面不符，
+        整卷导入会在抽样校验时发现并改用逐章爬取。
+        首章URL中没有编号时（ID为URL的CRC32）无法推算，返回None。
+        """
+        vid = raw_volume.get('vid')
+        if vid and str(vid).isdigit():
+            return int(vid)
+        if chapters and re.search(r'(\d+)\.htm', chapters[0]['url']):
+            return chapters[0]['id'] - 1
+        return None
+
+    def _build_index(self):
+        """建立O(1)查找索引"""
+        self._chapters_by_id: Dict[int, Dict] = {}
+        self._volumes_by_key: Dict = {}
+
+        for volume in self.volumes:
+            self._volumes_by_key[volume['title']] = volume
+            self._volumes_by_key[volume['index']] = volume
+            if volume['id'] is not None:
+                self._volumes_by_key[('id', volume['id'])] = volume
+            for entry in volume['chapters'] + volume['images']:
+                self._chapters_by_id[entry['id']] = entry
+
+    def get_chapter(self, chapter_id: int) -> Optional[Dict]:
+        """按章节ID查找"""
+        return self._chapters_by_id.get(chapter_id)
+
+    def get_volume(self, key) -> Optional[Dict]:
+        """按卷册标题或序号查找"""
+        return self._volumes_by_key.get(key)
+
+    def get_volume_by_id(self, volume_id: int) -> Optional[Dict]:
+        """按卷册ID查找"""
+        return self._volumes_by_key.get(('id', volume_id))
+
+    def volume_of(self, chapter_id: int) -> Optional[Dict]:
+        """查找章节所属卷册"""
+        chapter = self.get_chapter(chapter_id)
+        return self.volumes[chapter['volume']] if chapter else None
+
+    def to_dict(self) -> Dict:
+        """转换为可序列化的字典"""
+        return {
+            'novel_url': self.novel_url,
+            'fingerprint': self.fingerprint,
+            'volumes': self.volumes
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Catalog':
+        """从字典恢复目录"""
+        return cls(data['novel_url'], data['fingerprint'], data['volumes'])
+
+class CatalogStore:
+    """目录缓存：按小说持久化目录及目录页指纹"""
+
+    # 指纹计算前移除的动态内容（脚本、样式、注释）
+    _VOLATILE = re.compile(r'<script\b.*?</script>|<style\b.*?</style>|<!--.*?-->', re.DOTALL | re.IGNORECASE)
+    _WHITESPACE = re.compile(r'\s+')
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or Config.CATALOG_DIR
+
+    @classmethod
+    def fingerprint(cls, html_content: str) -> str:
+        """计算目录页指纹"""
+        normalized = cls._WHITESPACE.sub(' ', cls._VOLATILE.sub('', html_content))
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+    def path_for(self, novel_url: str) -> str:
+        """目录缓存文件路径"""
+        match = re.search(r'/novel/\d+/(\d+)/', novel_url)
+        key = match.group(1) if match else hashlib.sha1(novel_url.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load(self, novel_url: str) -> Optional[Catalog]:
+        """读取缓存的目录"""
+        path = self.path_for(novel_url)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return Catalog.from_dict(json.load(f))
+        except Exception as e:
+            logger.warning(f"目录缓存读取失败 {path}: {str(e)}")
+            return None
+
+    def load_if_unchanged(self, novel_url: str, fingerprint: str) -> Optional[Catalog]:
+        """指纹一致时返回缓存目录，否则返回None"""
+        catalog = self.load(novel_url)
+        if catalog and catalog.fingerprint == fingerprint:
+            logger.info("目录页未变化，使用缓存目录")
+            return catalog
+        return None
+
+    def save(self, catalog: Catalog):
+        """保存目录（先写临时文件再替换）"""
+        path = self.path_for(catalog.novel_url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(catalog.to_dict(), f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+
+        logger.debug(f"目录已缓存: {path}")
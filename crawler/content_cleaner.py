@@ -0,0 +1,92 @@
+"""
+正文清理模块
+Content cleaner module
+"""
+
+import re
+from typing import Dict, Iterable, Iterator, List, Optional
+from urllib.parse import urlparse
+
+from utils.config import Config
+
+class ContentCleaner:
+    """正文清理器：单遍扫描移除样板文本，并保留段落边界"""
+
+    _site_cache: Dict[str, 'ContentCleaner'] = {}
+
+    def __init__(self, rules: Iterable[str] = ()):
+        self.rules = list(rules)
+
+        # 所有规则合并为一个预编译的扫描器：样板文本 | 换行（段落边界） | 行内空白
+        parts = []
+        if self.rules:
+            parts.append('(?P<junk>' + '|'.join(f'(?:{rule})' for rule in self.rules) + ')')
+        parts.append(r'(?P<brk>[^\S\n]*\n\s*)')
+        parts.append(r'(?P<ws>[^\S\n]+)')
+        self._scanner = re.compile('|'.join(parts), re.DOTALL)
+
+    @classmethod
+    def for_site(cls, site: Optional[str] = None) -> 'ContentCleaner':
+        """获取指定站点（URL或域名）的清理器，按域名缓存"""
+        host = cls._site_host(site or Config.BASE_URL)
+        cleaner = cls._site_cache.get(host)
+        if cleaner is None:
+            cleaner = cls(cls._site_rules(host))
+            cls._site_cache[host] = cleaner
+        return cleaner
+
+    @staticmethod
+    def _site_host(site: str) -> str:
+        """从URL或域名中提取主机名"""
+        host = urlparse(site).netloc if '://' in site else site
+        return host.lower().split(':')[0]
+
+    @staticmethod
+    def _site_rules(host: str) -> List[str]:
+        """查找站点对应的规则集（支持子域名匹配）"""
+        rule_sets = Config.CONTENT_CLEAN_RULES
+        for domain, rules in rule_sets.items():
+            if domain != 'default' and (host == domain or host.endswith('.' + domain)):
+                return rules
+        return rule_sets.get('default', [])
+
+    def iter_paragraphs(self, text: str) -> Iterator[str]:
+        """单遍扫描文本，逐个产出清理后的段落"""
+        if not text:
+            return
+
+        buffer: List[str] = []
+        pos = 0
+
+        for match in self._scanner.finditer(text):
+            start = match.start()
+            if start > pos:
+                buffer.append(text[pos:start])
+            pos = match.end()
+
+            kind = match.lastgroup
+            if kind == 'brk':
+                paragraph = self._flush(buffer)
+                if paragraph:
+                    yield paragraph
+                buffer = []
+            elif kind == 'ws':
+                if buffer and buffer[-1] != ' ':
+                    buffer.append(' ')
+            # junk: 直接丢弃
+
+        if pos < len(text):
+            buffer.append(text[pos:])
+        paragraph = self._flush(buffer)
+        if paragraph:
+            yield paragraph
+
+    def clean(self, text: str) -> str:
+        """清理文本，段落之间以空行分隔"""
+        return '\n\n'.join(self.iter_paragraphs(text))
+
+    @staticmethod
+    def _flush(buffer: List[str]) -> str:
+        """合并缓冲区为段落，过滤掉太短的段落"""
+        paragraph = ''.join(buffer).strip()
+        return paragraph if len(paragraph) > 1 else ''
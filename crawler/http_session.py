@@ -0,0 +1,211 @@
+"""
+会话移交模块
+Browser-to-HTTP session handoff - reuses Playwright's cookies, UA and headers in a pooled async httpx client
+"""
+
+import asyncio
+import os
+import re
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Set
+
+from utils.config import Config
+from utils.logger import logger
+from crawler.proxy_pool import ProxyPool, ProxyState, Throttled
+
+try:
+    import httpx
+except ImportError:  # 未安装时所有页面仍由浏览器抓取
+    httpx = None
+
+_META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+
+# 浏览器会自动处理的请求头，HTTP客户端自行设置
+_BROWSER_ONLY_HEADERS = {'connection', 'accept-encoding', 'upgrade-insecure-requests'}
+
+# 请求发出前在本地出错（URL无效、客户端已关闭等），与代理无关，不计入代理的健康度
+_LOCAL_ERRORS = (RuntimeError,) + ((httpx.InvalidURL, httpx.UnsupportedProtocol) if httpx is not None else ())
+
+class SessionExpired(Exception):
+    """HTTP会话失效（遇到验证页面或验证cookie过期），需要重新通过浏览器验证"""
+
+def decode_html(content: bytes, encoding: Optional[str] = None) -> str:
+    """按响应头或页面meta声明的编码解码（GBK按GB18030处理）"""
+    if not encoding:
+        match = _META_CHARSET.search(content[:2048])
+        encoding = match.group(1).decode('ascii') if match else 'utf-8'
+    if encoding.lower() in ('gbk', 'gb2312'):
+        encoding = 'gb18030'
+    try:
+        return content.decode(encoding, errors='replace')
+    except LookupError:
+        return content.decode('utf-8', errors='replace')
+
+def is_challenge(status_code: int, text: str) -> bool:
+    """响应是否为反爬验证页面"""
+    if status_code in Config.CHALLENGE_STATUS:
+        return True
+    head = text[:4096]
+    return any(marker in head for marker in Config.CHALLENGE_MARKERS)
+
+class HttpSession:
+    """从浏览器接手的HTTP会话
+
+    浏览器通过验证后导出cookie、User-Agent和请求头，建立带连接池的异步httpx客户端，
+    之后的章节页面和图片都由它抓取。遇到验证页面或验证cookie过期时抛出SessionExpired，
+    由调用方重新用浏览器打开页面后再次移交。
+
+    配置了代理池时每个代理各有一个客户端（共享同一组cookie和请求头），
+    每次请求由代理池选择代理、限速，失败时换用其他代理重试。
+    重新移交时先换上新客户端，旧客户端等其上进行中的请求结束后再关闭。
+    """
+
+    def __init__(self, proxy_pool: Optional[ProxyPool] = None):
+        self.client: Optional['httpx.AsyncClient'] = None
+        self.proxy_pool = proxy_pool if proxy_pool is not None and len(proxy_pool) else None
+        self.requests = 0
+        self.handoffs = 0
+        self._expires = 0.0
+        self._client_options: Dict = {}
+        self._proxy_clients: Dict[str, 'httpx.AsyncClient'] = {}
+        self._in_flight: Counter = Counter()  # 各客户端上进行中的请求数
+        self._retired: Set['httpx.AsyncClient'] = set()
+        self._closing: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def available() -> bool:
+        """是否启用并安装了httpx"""
+        return Config.HTTP_HANDOFF and httpx is not None
+
+    @property
+    def ready(self) -> bool:
+        return self.client is not None
+
+    async def handoff(self, context, user_agent: str, headers: Dict[str, str]):
+        """从Playwright浏览器上下文接手会话"""
+        await self.load(await context.cookies(), user_agent, headers)
+
+    async def load(self, cookies: List[Dict], user_agent: str, headers: Dict[str, str]):
+        """用导出的cookie和请求头建立新的客户端（替换旧客户端）"""
+        jar = httpx.Cookies()
+        for cookie in cookies:
+            jar.set(cookie['name'], cookie['value'], domain=cookie.get('domain', ''), path=cookie.get('path', '/'))
+        # 只看验证cookie：站点的统计、偏好等短期cookie过期不影响访问
+        expires = [cookie['expires'] for cookie in cookies
+                   if cookie['name'] in Config.CHALLENGE_COOKIES and cookie.get('expires', -1) > 0]
+        self._expires = min(expires) - Config.HTTP_REFRESH_MARGIN if expires else 0.0
+
+        client_headers = {key: value for key, value in headers.items() if key.lower() not in _BROWSER_ONLY_HEADERS}
+        client_headers['User-Agent'] = user_agent
+        # 各代理的客户端共用同一个SSL上下文（每次创建都要重新加载证书，耗时上百毫秒）
+        self._client_options = {
+            'verify': httpx.create_ssl_context(),
+            'headers': client_headers,
+            'cookies': jar,
+            'timeout': Config.TIMEOUT,
+            'follow_redirects': True,
+            'limits': httpx.Limits(max_connections=Config.HTTP_MAX_CONNECTIONS,
+                                   max_keepalive_connections=Config.HTTP_MAX_CONNECTIONS),
+        }
+        old_clients = [self.client, *self._proxy_clients.values()]
+        self.client = httpx.AsyncClient(**self._client_options)
+        self._proxy_clients = {}
+        for client in old_clients:
+            if client is not None:
+                await self._retire(client)
+        self.handoffs += 1
+        logger.info(f"浏览器会话已移交给HTTP客户端（cookie {len(cookies)} 个）")
+
+    def _client(self, proxy: ProxyState) -> 'httpx.AsyncClient':
+        """代理对应的客户端（按需创建）"""
+        client = self._proxy_clients.get(proxy.url)
+        if client is None:
+            client = httpx.AsyncClient(proxy=proxy.url, **self._client_options)
+            self._proxy_clients[proxy.url] = client
+        return client
+
+    async def _get(self, url: str, referer: Optional[str] = None) -> 'httpx.Response':
+        if self.client is None:
+            raise SessionExpired("HTTP会话尚未建立")
+        if self._expires and time.time() >= self._expires:
+            raise SessionExpired("验证cookie即将过期")
+
+        if self.proxy_pool is None:
+            response = await self._send(self.client, url, referer)
+        else:
+            response = await self.proxy_pool.request(lambda proxy: self._send(self._client(proxy), url, referer),
+                                                     passthrough=(SessionExpired,) + _LOCAL_ERRORS)
+        # 404等客户端错误说明代理正常送达了请求，在代理池之外失败，不重试也不计入代理的健康度
+        response.raise_for_status()
+        return response
+
+    async def _send(self, client: 'httpx.AsyncClient', url: str, referer: Optional[str]) -> 'httpx.Response':
+        self._in_flight[client] += 1
+        try:
+            response = await client.get(url, headers={'Referer': referer} if referer else None)
+        finally:
+            self._in_flight[client] -= 1
+            if not self._in_flight[client]:
+                del self._in_flight[client]
+                if client in self._retired:
+                    self._close_later(client)
+        self.requests += 1
+        if response.status_code == 429:
+            raise Throttled(f"请求被限流: {url}")
+        content_type = response.headers.get('content-type', '')
+        text = decode_html(response.content[:4096], response.charset_encoding) if 'html' in content_type else ''
+        if is_challenge(response.status_code, text):
+            raise SessionExpired(f"遇到验证页面 ({response.status_code}): {url}")
+        if response.is_server_error:
+            response.raise_for_status()
+        return response
+
+    async def get_text(self, url: str) -> str:
+        """抓取页面并解码为文本"""
+        logger.debug("HTTP抓取页面: %s", url)
+        response = await self._get(url)
+        return decode_html(response.content, response.charset_encoding)
+
+    async def download(self, url: str, save_path: str, referer: Optional[str] = None) -> bool:
+        """下载文件（会话失效时抛出SessionExpired，其他错误返回False）"""
+        try:
+            response = await self._get(url, referer)
+            os.makedirs(os.path.dirname(save_path), exist_ok=True)
+            with open(save_path, 'wb') as f:
+                f.write(response.content)
+            logger.debug("图片下载成功: %s", save_path)
+            return True
+        except SessionExpired:
+            raise
+        except Exception as e:
+            logger.error(f"图片下载失败 {url}: {str(e)}")
+            return False
+
+    async def _retire(self, client: 'httpx.AsyncClient'):
+        """停用被替换的客户端：没有进行中的请求时立即关闭，否则等最后一个请求结束"""
+        if self._in_flight[client]:
+            self._retired.add(client)
+        else:
+            await client.aclose()
+
+    def _close_later(self, client: 'httpx.AsyncClient'):
+        """在后台关闭已停用的客户端（请求可能正被取消，不在finally中等待）"""
+        self._retired.discard(client)
+        task = asyncio.ensure_future(client.aclose())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def close(self):
+        """关闭所有客户端（包括仍有请求进行中的旧客户端）"""
+        for client in self._proxy_clients.values():
+            await client.aclose()
+        self._proxy_clients.clear()
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+        for client in list(self._retired):
+            await client.aclose()
+        self._retired.clear()
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
@@ -5,23 +5,53 @@ Novel crawler core module
 
 import asyncio
 import os
-from typing import List, Dict, Optional
-from playwright.async_api import async_playwright, Browser, Page
+import time
+from typing import List, Dict, Optional, Set, Tuple
+from playwright.async_api import async_playwright, Browser, BrowserContext, Page
 from urllib.parse import urljoin
 
 from utils.config import Config
-from utils.logger import logger
+from utils.logger import log_context, logger
 from crawler.anti_crawler import AntiCrawlerStrategy
 from crawler.page_parser import PageParser
+from crawler.parse_executor import ParseExecutor
+from crawler.catalog import Catalog, CatalogStore
+from crawler.txt_ingest import TxtVolumeIngest
+from crawler.http_session import HttpSession, SessionExpired
+from crawler.browser_daemon import BrowserDaemon
+from crawler.proxy_pool import ProxyPool
+from utils.chapter_store import ChapterStore
+from utils.memory_monitor import MemoryMonitor
 
 class NovelCrawler:
     """小说爬虫主类"""
     
-    def __init__(self):
+    def __init__(self, parse_executor: Optional[ParseExecutor] = None,
+                 memory_monitor: Optional[MemoryMonitor] = None):
         self.anti_crawler = AntiCrawlerStrategy()
         self.parser = PageParser()
+        # 可由多个爬虫实例共享同一个解析进程池
+        self._owns_executor = parse_executor is None
+        self.parse_executor = parse_executor or ParseExecutor()
+        self.catalog_store = CatalogStore()
+        self.chapter_store = ChapterStore()
+        # 配置了代理时，HTTP请求分散到代理池中的各个代理，浏览器使用当前最健康的代理
+        self.proxy_pool = ProxyPool()
+        proxy = self.proxy_pool.best()
+        # 浏览器通过验证后，页面和图片改由HTTP会话抓取，所有请求使用同一个User-Agent
+        self.browser_options = self.anti_crawler.get_playwright_options(proxy.url if proxy else None)
+        self.txt_ingest = TxtVolumeIngest(self.browser_options['user_agent'], self.parser.cleaner)
+        self.parser.set_user_agent(self.browser_options['user_agent'])
+        self.playwright = None
         self.browser: Optional[Browser] = None
+        self.context: Optional[BrowserContext] = None
         self.page: Optional[Page] = None
+        self.http_session = HttpSession(self.proxy_pool)
+        self._browser_lock: Optional[asyncio.Lock] = None
+        self.browser_pages = 0
+        self.browser_seconds = 0.0
+        # 内存受限模式下接近上限时暂停抓取（未启用时为空操作）
+        self.memory_monitor = memory_monitor or MemoryMonitor(limit_mb=0)
     
     async def __aenter__(self):
         """异步上下文管理器入口"""
@@ -33,89 +63,186 @@ class NovelCrawler:
         await self.close()
     
     async def start(self):
-        """启动浏览器"""
-        logger.info("启动浏览器...")
-        playwright = await async_playwright().start()
-        
-        # 启动浏览器
-        self.browser = await playwright.chromium.launch(
-            headless=True,  # 无头模式
-            args=[
-                '--no-sandbox',
-                '--disable-blink-features=AutomationControlled',
-                '--disable-web-security',
-                '--disable-features=VizDisplayCompositor'
-            ]
-        )
+        """启动浏览器（启用常驻浏览器时连接到常驻浏览器）"""
+        self.playwright = await async_playwright().start()
+        self._browser_lock = asyncio.Lock()
         
-        # 创建页面
-        context = await self.browser.new_context(**self.anti_crawler.get_playwright_options())
-        self.page = await context.new_page()
+        if Config.BROWSER_DAEMON:
+            await self._connect_daemon()
+        else:
+            logger.info("启动浏览器...")
+            self.browser = await self.playwright.chromium.launch(
+                headless=True,  # 无头模式
+                args=list(Config.BROWSER_ARGS)
+            )
+            self.context = await self.browser.new_context(**self.browser_options)
         
+        # 创建页面
+        await self._new_page()
+        logger.info("浏览器启动成功")
+    
+    async def _connect_daemon(self):
+        """连接常驻浏览器，没有运行或无响应时（重新）启动"""
+        daemon = BrowserDaemon()
+        loop = asyncio.get_running_loop()
+        state = await loop.run_in_executor(None, daemon.ensure, self.playwright.chromium.executable_path,
+                                           self.browser_options['user_agent'])
+        self.browser = await self.playwright.chromium.connect_over_cdp(daemon.endpoint)
+        # 使用常驻浏览器的默认上下文，其中保存了之前运行的缓存、cookie和已通过的验证
+        self.context = self.browser.contexts[0]
+        if 'proxy' in self.browser_options:
+            logger.warning("常驻浏览器的默认上下文不能设置代理，浏览器直连，HTTP请求仍使用代理池")
+        await self.context.set_extra_http_headers(self.browser_options['extra_http_headers'])
+        self._set_user_agent(state['user_agent'])
+        logger.info(f"已连接常驻浏览器: pid {state['pid']}")
+    
+    async def _new_page(self):
+        self.page = await self.context.new_page()
+        if Config.BROWSER_DAEMON:
+            await self.page.set_viewport_size(self.browser_options['viewport'])
         # 设置超时
         self.page.set_default_timeout(Config.TIMEOUT * 1000)
-        
-        logger.info("浏览器启动成功")
+    
+    async def _ensure_browser(self):
+        """常驻浏览器断开（崩溃或被关闭）时重新连接，页面崩溃时重新打开页面"""
+        if not Config.BROWSER_DAEMON:
+            return
+        if not self.browser.is_connected():
+            logger.warning("与常驻浏览器的连接已断开，重新连接")
+            await self._connect_daemon()
+            await self._new_page()
+        elif self.page.is_closed():
+            await self._new_page()
+    
+    def _set_user_agent(self, user_agent: str):
+        """所有请求使用与浏览器相同的User-Agent"""
+        self.browser_options['user_agent'] = user_agent
+        self.txt_ingest.session.headers['User-Agent'] = user_agent
+        self.parser.set_user_agent(user_agent)
     
     async def close(self):
-        """关闭浏览器"""
+        """关闭浏览器（常驻浏览器只断开连接）"""
+        await self.http_session.close()
+        if self.http_session.handoffs:
+            logger.info(f"浏览器打开页面 {self.browser_pages} 个（{self.browser_seconds:.1f}秒），"
+                        f"HTTP请求 {self.http_session.requests} 个，会话移交 {self.http_session.handoffs} 次")
+        self.proxy_pool.log_report()
+        
         if self.browser:
-            await self.browser.close()
-            logger.info("浏览器已关闭")
+            if Config.BROWSER_DAEMON:
+                # 常驻浏览器中不留下本次打开的页面
+                if self.browser.is_connected() and not self.page.is_closed():
+                    await self.page.close()
+                await self.browser.close()
+                logger.info("已断开与常驻浏览器的连接")
+            else:
+                await self.browser.close()
+                logger.info("浏览器已关闭")
+        if self.playwright:
+            await self.playwright.stop()
+        
+        if self._owns_executor:
+            self.parse_executor.shutdown()
+        
+        self.chapter_store.close()
     
     async def get_page_content(self, url: str) -> str:
-        """获取页面内容"""
-        async def _get_content():
-            # 如果是相对URL，需要基于小说目录页面构建完整URL
-            if not url.startswith('http'):
-                if url.endswith('.htm'):
-                    # 章节页面URL
-                    full_url = f"https://www.wenku8.net/novel/1/1213/{url}"
-                else:
-                    full_url = urljoin(Config.BASE_URL, url)
+        """获取页面内容（已移交会话时用HTTP客户端，会话失效时回到浏览器重新验证）"""
+        await self.memory_monitor.throttle()
+        
+        # 如果是相对URL，需要基于小说目录页面构建完整URL
+        if not url.startswith('http'):
+            if url.endswith('.htm'):
+                # 章节页面URL
+                full_url = f"https://www.wenku8.net/novel/1/1213/{url}"
             else:
-                full_url = url
-
-            logger.debug(f"访问页面: {full_url}")
-
-            await self.page.goto(full_url, wait_until='networkidle')
-            content = await self.page.content()
-            return content
-
-        return await self.anti_crawler.handle_request_with_retry(_get_content)
+                full_url = urljoin(Config.BASE_URL, url)
+        else:
+            full_url = url
+        
+        if self.http_session.ready:
+            try:
+                return await self._http_content(full_url)
+            except SessionExpired as e:
+                logger.info(f"HTTP会话失效，重新通过浏览器验证: {str(e)}")
+        
+        return await self._refresh_session(full_url)
+    
+    async def _http_content(self, full_url: str) -> str:
+        # 使用代理池时由代理池按代理限速和重试，否则使用全局的延迟和重试策略
+        if self.http_session.proxy_pool is not None:
+            return await self.http_session.get_text(full_url)
+        return await self.anti_crawler.handle_request_with_retry(self.http_session.get_text, full_url)
+    
+    async def _refresh_session(self, full_url: str) -> str:
+        """用浏览器打开页面（通过验证），再把会话移交给HTTP客户端"""
+        handoffs = self.http_session.handoffs
+        # 并发抓取时只有一个任务使用浏览器页面
+        async with self._browser_lock:
+            if self.http_session.ready and self.http_session.handoffs != handoffs:
+                # 等待期间其他任务已重新验证
+                return await self._http_content(full_url)
+            content = await self.anti_crawler.handle_request_with_retry(self._browser_content, full_url)
+            if HttpSession.available():
+                await self.http_session.handoff(self.context, self.browser_options['user_agent'],
+                                                self.browser_options['extra_http_headers'])
+        return content
+    
+    async def _browser_content(self, full_url: str) -> str:
+        logger.debug("访问页面: %s", full_url)
+        await self._ensure_browser()
+        start = time.perf_counter()
+        await self.page.goto(full_url, wait_until='networkidle')
+        content = await self.page.content()
+        self.browser_pages += 1
+        self.browser_seconds += time.perf_counter() - start
+        return content
+    
+    async def crawl_catalog(self) -> Catalog:
+        """爬取目录页，目录页未变化时直接使用缓存目录"""
+        html_content = await self.get_page_content(Config.NOVEL_URL)
+        fingerprint = self.catalog_store.fingerprint(html_content)
+        
+        catalog = self.catalog_store.load_if_unchanged(Config.NOVEL_URL, fingerprint)
+        if catalog is None:
+            result = await self.parse_executor.parse(html_content.encode('utf-8'), 'volumes')
+            catalog = Catalog.from_volume_list(Config.NOVEL_URL, fingerprint, result['volumes'])
+            self.catalog_store.save(catalog)
+        
+        return catalog
     
     async def crawl_volume_list(self) -> List[Dict]:
         """爬取卷册列表"""
         logger.info("开始爬取卷册列表...")
         
-        html_content = await self.get_page_content(Config.NOVEL_URL)
-        volumes = self.parser.parse_volume_list(html_content)
+        catalog = await self.crawl_catalog()
+        volumes = catalog.volumes
         
         logger.info(f"成功获取 {len(volumes)} 个卷册信息")
         return volumes
     
     async def crawl_chapter(self, chapter_url: str) -> Dict:
         """爬取单个章节"""
-        logger.debug(f"爬取章节: {chapter_url}")
+        logger.debug("爬取章节: %s", chapter_url)
         
         html_content = await self.get_page_content(chapter_url)
         
-        # 解析章节内容
-        title = self.parser.extract_chapter_title(html_content)
-        content = self.parser.parse_chapter_content(html_content)
+        # 在进程池中解析章节内容
+        result = await self.parse_executor.parse(html_content.encode('utf-8'), 'chapter')
         
         return {
-            'title': title,
-            'content': content,
+            'title': result['title'],
+            'content': '\n\n'.join(result['paragraphs']),
             'url': chapter_url
         }
     
     async def crawl_images(self, image_url: str, volume_name: str) -> List[str]:
         """爬取图片页面的所有图片"""
-        logger.debug(f"爬取图片页面: {image_url}")
+        logger.debug("爬取图片页面: %s", image_url)
         
         html_content = await self.get_page_content(image_url)
-        image_urls = self.parser.parse_image_urls(html_content)
+        result = await self.parse_executor.parse(html_content.encode('utf-8'), 'images')
+        image_urls = result['image_urls']
         
         # 下载图片
         downloaded_images = []
@@ -125,45 +252,180 @@ class NovelCrawler:
             img_path = os.path.join(Config.DATA_DIR, "images", img_filename)
             
             # 下载图片
-            if self.parser.download_image(img_url, img_path):
+            if await self._download_image(img_url, img_path, image_url):
                 downloaded_images.append(img_path)
         
         logger.info(f"成功下载 {len(downloaded_images)} 张图片")
         return downloaded_images
     
+    async def _download_image(self, img_url: str, img_path: str, page_url: str) -> bool:
+        """用HTTP会话下载图片（与页面使用相同的cookie和User-Agent），会话失效时重新验证一次"""
+        if not self.http_session.ready:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self.parser.download_image, img_url, img_path)
+        
+        try:
+            return await self.http_session.download(img_url, img_path, referer=page_url)
+        except SessionExpired as e:
+            logger.info(f"HTTP会话失效，重新通过浏览器验证: {str(e)}")
+            await self._refresh_session(page_url)
+            try:
+                return await self.http_session.download(img_url, img_path, referer=page_url)
+            except SessionExpired as e:
+                logger.error(f"图片下载失败 {img_url}: {str(e)}")
+                return False
+    
     async def crawl_volume(self, volume: Dict) -> Dict:
-        """爬取完整卷册"""
+        """爬取完整卷册，章节逐个写入章节存储，已存储的章节跳过
+        
+        返回的卷册数据中章节为惰性序列，正文不常驻内存。
+        """
         volume_title = volume['title']
         logger.info(f"开始爬取卷册: {volume_title}")
         
-        # 爬取所有章节
-        chapters_data = []
-        for chapter in volume['chapters']:
+        volume_id, stored = self._prepare_volume(volume)
+        
+        # 爬取所有章节（使用代理池时按代理池的并发数同时抓取）
+        pending = [(position, chapter) for position, chapter in enumerate(volume['chapters'])
+                   if chapter['url'] not in stored]
+        if len(self.proxy_pool) and self.http_session.ready:
+            semaphore = asyncio.Semaphore(self.proxy_pool.concurrency)
+            
+            async def _bounded(position: int, chapter: Dict) -> bool:
+                async with semaphore:
+                    return await self._crawl_and_store(volume_id, position, chapter)
+            
+            results = await asyncio.gather(*(_bounded(position, chapter) for position, chapter in pending))
+        else:
+            results = [await self._crawl_and_store(volume_id, position, chapter) for position, chapter in pending]
+        crawled = sum(results)
+        
+        # 爬取图片
+        images_data = await self._volume_images(volume, volume_id)
+        
+        result = self._finish_volume(volume_id, volume)
+        logger.info(f"卷册爬取完成: {volume_title} (章节: {len(result['chapters'])}，本次爬取 {crawled}，"
+                    f"已存储跳过 {len(stored)}，图片: {len(images_data)})")
+        return result
+    
+    async def _crawl_and_store(self, volume_id: int, position: int, chapter: Dict) -> bool:
+        """爬取单章并写入章节存储，返回是否成功"""
+        with log_context(chapter=chapter['title']):
             try:
                 chapter_data = await self.crawl_chapter(chapter['url'])
-                chapters_data.append(chapter_data)
+                self.chapter_store.put_chapter(volume_id, position, chapter_data)
                 logger.info(f"完成章节: {chapter_data['title']}")
+                return True
             except Exception as e:
                 logger.error(f"章节爬取失败 {chapter['title']}: {str(e)}")
+                return False
+    
+    def _prepare_volume(self, volume: Dict) -> Tuple[int, Set[str]]:
+        """获取卷册记录并按当前目录同步已存储章节，返回卷册ID和已存储章节的URL"""
+        volume_id = self.chapter_store.volume_id(volume['title'], volume.get('index', 0))
+        self.chapter_store.sync_catalog(volume_id, [chapter['url'] for chapter in volume['chapters']])
+        return volume_id, self.chapter_store.stored_urls(volume_id)
+    
+    def _finish_volume(self, volume_id: int, volume: Dict) -> Dict:
+        """目录中所有章节都已存储时标记卷册完成，返回从章节存储惰性读取的卷册数据"""
+        stored = self.chapter_store.stored_urls(volume_id)
+        missing = [chapter['title'] for chapter in volume['chapters'] if chapter['url'] not in stored]
+        self.chapter_store.mark_complete(volume_id, not missing)
+        if missing:
+            logger.warning(f"卷册未完成，缺少 {len(missing)} 章（重新运行时补爬）: {', '.join(missing)}")
+        return self.chapter_store.load_volume(volume_id)
+    
+    async def _volume_images(self, volume: Dict, volume_id: int) -> List[str]:
+        """获取卷册插图：已存储且文件都在时直接使用，否则爬取并记录"""
+        images_data = self.chapter_store.images(volume_id)
+        if images_data and all(os.path.exists(path) for path in images_data):
+            return images_data
         
-        # 爬取图片
+        images_data = await self._crawl_volume_images(volume)
+        self.chapter_store.set_images(volume_id, images_data)
+        return images_data
+    
+    async def crawl_volume_bulk(self, volume: Dict) -> Dict:
+        """通过整卷TXT下载爬取卷册，HTML爬取仅用于校验和补缺"""
+        volume_title = volume['title']
+        logger.info(f"开始整卷导入: {volume_title}")
+        
+        volume_id, stored = self._prepare_volume(volume)
+        if all(c['url'] in stored for c in volume['chapters']):
+            logger.info(f"所有章节已存储，跳过TXT下载: {volume_title}")
+            await self._volume_images(volume, volume_id)
+            return self._finish_volume(volume_id, volume)
+        
+        if not self.txt_ingest.volume_txt_url(volume):
+            logger.warning(f"卷册ID未知，改用逐章爬取: {volume_title}")
+            return await self.crawl_volume(volume)
+        
+        async def _fetch_text():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self.txt_ingest.fetch_volume_text, volume)
+        
+        try:
+            await self.memory_monitor.throttle()
+            text = await self.anti_crawler.handle_request_with_retry(_fetch_text)
+        except Exception as e:
+            logger.warning(f"整卷TXT下载失败，改用逐章爬取 {volume_title}: {str(e)}")
+            return await self.crawl_volume(volume)
+        
+        chapters_by_url = {}
+        txt_chapters, missing = self.txt_ingest.split_chapters(text, volume)
+        for chapter_data in txt_chapters:
+            chapters_by_url[chapter_data['url']] = chapter_data
+        
+        # 抽样校验拆分结果
+        for sample in txt_chapters[:Config.TXT_VERIFY_SAMPLES]:
+            try:
+                html_chapter = await self.crawl_chapter(sample['url'])
+            except Exception as e:
+                logger.warning(f"TXT校验章节爬取失败，改用逐章爬取 {volume_title}: {str(e)}")
+                return await self.crawl_volume(volume)
+            loop = asyncio.get_running_loop()
+            matched = await loop.run_in_executor(None, self.txt_ingest.matches,
+                                                 sample['content'], html_chapter['content'])
+            if not matched:
+                logger.warning(f"TXT拆分校验失败，改用逐章爬取: {volume_title}")
+                return await self.crawl_volume(volume)
+        
+        # 补全TXT中缺失的章节
+        missing = [entry for entry in missing if entry['url'] not in stored]
+        filled = 0
+        for entry in missing:
+            try:
+                chapter_data = await self.crawl_chapter(entry['url'])
+                chapters_by_url[entry['url']] = chapter_data
+                filled += 1
+                logger.info(f"补全章节: {chapter_data['title']}")
+            except Exception as e:
+                logger.error(f"章节爬取失败 {entry['title']}: {str(e)}")
+        
+        for position, chapter in enumerate(volume['chapters']):
+            if chapter['url'] in chapters_by_url and chapter['url'] not in stored:
+                self.chapter_store.put_chapter(volume_id, position, chapters_by_url[chapter['url']])
+        chapters_by_url.clear()
+        images_data = await self._volume_images(volume, volume_id)
+        
+        logger.info(f"整卷导入完成: {volume_title} (TXT章节: {len(txt_chapters)}, "
+                    f"补全章节: {filled}/{len(missing)}, 图片: {len(images_data)})")
+        
+        return self._finish_volume(volume_id, volume)
+    
+    async def _crawl_volume_images(self, volume: Dict) -> List[str]:
+        """爬取卷册的所有插图页"""
         images_data = []
+        volume_safe_name = self._safe_filename(volume['title'])
+        
         for image_page in volume['images']:
             try:
-                volume_safe_name = self._safe_filename(volume_title)
                 images = await self.crawl_images(image_page['url'], volume_safe_name)
                 images_data.extend(images)
             except Exception as e:
                 logger.error(f"图片爬取失败 {image_page['title']}: {str(e)}")
         
-        result = {
-            'title': volume_title,
-            'chapters': chapters_data,
-            'images': images_data
-        }
-        
-        logger.info(f"卷册爬取完成: {volume_title} (章节: {len(chapters_data)}, 图片: {len(images_data)})")
-        return result
+        return images_data
     
     def _safe_filename(self, filename: str) -> str:
         """生成安全的文件名"""
@@ -3,23 +3,39 @@
 Page parser module
 """
 
-import re
 import os
-import requests
 from typing import List, Dict, Tuple, Optional
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
 from utils.config import Config
 from utils.logger import logger
+from crawler.content_cleaner import ContentCleaner
 
 class PageParser:
     """页面解析器类"""
     
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
+    # 需要在文本提取时换行的块级元素
+    BLOCK_TAGS = ['p', 'div', 'li', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']
+    
+    def __init__(self, site: Optional[str] = None):
+        self.cleaner = ContentCleaner.for_site(site)
+        self.user_agent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        self._session = None
+
+    @property
+    def session(self):
+        """图片下载使用的会话（按需创建，解析进程中用不到）"""
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+            self._session.headers.update({'User-Agent': self.user_agent})
+        return self._session
+
+    def set_user_agent(self, user_agent: str):
+        """设置图片下载使用的User-Agent"""
+        self.user_agent = user_agent
+        if self._session is not None:
+            self._session.headers['User-Agent'] = user_agent
     
     def parse_volume_list(self, html_content: str) -> List[Dict]:
         """解析卷册列表"""
@@ -36,11 +52,14 @@ class PageParser:
             for row in rows:
                 cells = row.find_all('td')
                 
-                # 检查是否是卷册标题行
-                if len(cells) == 1 and cells[0].get_text().strip().startswith('第'):
+                # 检查是否是卷册标题行（wenku8使用vcss类标记卷名）
+                if len(cells) == 1 and not cells[0].find('a') and (
+                        'vcss' in (cells[0].get('class') or []) or
+                        cells[0].get_text().strip().startswith('第')):
                     volume_title = cells[0].get_text().strip()
                     current_volume = {
                         'title': volume_title,
+                        'vid': cells[0].get('vid'),  # wenku8卷册ID（如有）
                         'chapters': [],
                         'images': []
                     }
@@ -70,10 +89,27 @@ class PageParser:
         logger.info(f"共发现 {len(volumes)} 个卷册")
         return volumes
     
-    def parse_chapter_content(self, html_content: str) -> str:
-        """解析章节内容"""
+    def parse_chapter_page(self, html_content: str) -> Dict:
+        """一次解析章节页面，返回标题、段落和图片URL"""
         soup = BeautifulSoup(html_content, 'lxml')
 
+        # 标题和图片需在正文提取（会移除部分标签）之前获取
+        title = self._title_from_soup(soup)
+        image_urls = self._image_urls_from_soup(soup)
+        content = self._content_from_soup(soup)
+
+        return {
+            'title': title,
+            'paragraphs': content.split('\n\n') if content else [],
+            'image_urls': image_urls
+        }
+    
+    def parse_chapter_content(self, html_content: str) -> str:
+        """解析章节内容"""
+        return self._content_from_soup(BeautifulSoup(html_content, 'lxml'))
+    
+    def _content_from_soup(self, soup: BeautifulSoup) -> str:
+        """从已解析的文档中提取章节内容"""
         # 移除脚本和样式标签
         for script in soup(["script", "style", "nav", "header", "footer"]):
             script.decompose()
@@ -118,7 +154,7 @@ class PageParser:
 
         if content_div:
             # 清理内容
-            content = self._clean_content(content_div.get_text())
+            content = self._clean_content(self._element_text(content_div))
             if len(content) > 100:  # 确保内容不为空
                 return content
 
@@ -127,7 +163,10 @@ class PageParser:
     
     def parse_image_urls(self, html_content: str) -> List[str]:
         """解析图片URL列表"""
-        soup = BeautifulSoup(html_content, 'lxml')
+        return self._image_urls_from_soup(BeautifulSoup(html_content, 'lxml'))
+    
+    def _image_urls_from_soup(self, soup: BeautifulSoup) -> List[str]:
+        """从已解析的文档中提取图片URL"""
         image_urls = []
         
         # 查找所有图片链接
@@ -158,47 +197,31 @@ class PageParser:
             with open(save_path, 'wb') as f:
                 f.write(response.content)
             
-            logger.debug(f"图片下载成功: {save_path}")
+            logger.debug("图片下载成功: %s", save_path)
             return True
             
         except Exception as e:
             logger.error(f"图片下载失败 {url}: {str(e)}")
             return False
     
+    def _element_text(self, element) -> str:
+        """提取元素文本，<br>和块级元素转换为换行以保留段落边界"""
+        for br in element.find_all('br'):
+            br.replace_with('\n')
+        for block in element.find_all(self.BLOCK_TAGS):
+            block.append('\n')
+        return element.get_text()
+    
     def _clean_content(self, text: str) -> str:
         """清理文本内容"""
-        if not text:
-            return ""
-        
-        # 移除多余的空白字符
-        text = re.sub(r'\s+', ' ', text)
-        
-        # 移除页面导航相关文本
-        patterns_to_remove = [
-            r'背景颜色.*?保存设置',
-            r'轻小说文库.*?繁體化',
-            r'添加书签.*?内容报错',
-            r'添加书签.*?返回书目',
-            r'绅士游戏.*?online',
-        ]
-        
-        for pattern in patterns_to_remove:
-            text = re.sub(pattern, '', text, flags=re.DOTALL)
-        
-        # 分割成段落并清理
-        paragraphs = text.split('\n')
-        cleaned_paragraphs = []
-        
-        for para in paragraphs:
-            para = para.strip()
-            if para and len(para) > 1:  # 过滤掉太短的段落
-                cleaned_paragraphs.append(para)
-        
-        return '\n\n'.join(cleaned_paragraphs)
+        return self.cleaner.clean(text)
     
     def extract_chapter_title(self, html_content: str) -> str:
         """提取章节标题"""
-        soup = BeautifulSoup(html_content, 'lxml')
+        return self._title_from_soup(BeautifulSoup(html_content, 'lxml'))
+    
+    def _title_from_soup(self, soup: BeautifulSoup) -> str:
+        """从已解析的文档中提取章节标题"""
 
         # 尝试从title标签提取
         title_tag = soup.find('title')
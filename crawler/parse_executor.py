@@ -0,0 +1,89 @@
+"""
+解析执行器模块
+Parse executor module - runs HTML parsing in a process pool
+"""
+
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Union
+
+from utils.config import Config
+from utils.logger import logger
+from utils.sampling_profiler import profile_worker
+from crawler.page_parser import PageParser
+
+# 工作进程内的解析器实例（每个进程创建一次）
+_worker_parser: Optional[PageParser] = None
+
+def _init_worker(site: Optional[str]):
+    """工作进程初始化"""
+    global _worker_parser
+    _worker_parser = PageParser(site)
+    profile_worker()
+
+def parse_page(html: Union[bytes, str], kind: str = 'chapter') -> Dict:
+    """在工作进程中解析页面，返回精简的结果字典"""
+    global _worker_parser
+    if _worker_parser is None:
+        _worker_parser = PageParser()
+
+    # 页面内容由浏览器序列化，始终为UTF-8，不能按页面声明的编码解码
+    if isinstance(html, bytes):
+        html = html.decode('utf-8', errors='replace')
+
+    if kind == 'chapter':
+        return _worker_parser.parse_chapter_page(html)
+    if kind == 'images':
+        return {'image_urls': _worker_parser.parse_image_urls(html)}
+    if kind == 'volumes':
+        return {'volumes': _worker_parser.parse_volume_list(html)}
+
+    raise ValueError(f"未知的页面类型: {kind}")
+
+class ParseExecutor:
+    """HTML解析进程池，避免解析阻塞事件循环"""
+
+    def __init__(self, max_workers: Optional[int] = None, site: Optional[str] = None):
+        self.max_workers = max_workers or Config.PARSE_WORKERS or os.cpu_count() or 1
+        self.site = site
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """按需创建进程池"""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=(self.site,)
+            )
+            logger.debug(f"解析进程池已启动: {self.max_workers} 个进程")
+        return self._pool
+
+    async def parse(self, html: Union[bytes, str], kind: str = 'chapter') -> Dict:
+        """异步提交单个页面解析"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_pool(), parse_page, html, kind)
+
+    async def parse_batch(self, pages: List[Union[bytes, str]], kind: str = 'chapter') -> List[Dict]:
+        """异步批量提交页面解析，结果顺序与输入一致"""
+        return await asyncio.gather(*(self.parse(html, kind) for html in pages))
+
+    def parse_batch_sync(self, pages: List[Union[bytes, str]], kind: str = 'chapter') -> List[Dict]:
+        """同步批量解析（用于重新解析等离线场景），按块分发到各进程"""
+        if not pages:
+            return []
+        chunksize = max(1, len(pages) // (self.max_workers * 4))
+        return list(self._get_pool().map(parse_page, pages, [kind] * len(pages), chunksize=chunksize))
+
+    def shutdown(self):
+        """关闭进程池"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
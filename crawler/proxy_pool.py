@@ -0,0 +1,200 @@
+"""
+代理池模块
+Health-scored proxy pool - per-proxy token buckets, latency/success tracking and quarantine
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Type, TypeVar
+from urllib.parse import urlparse
+
+from utils.config import Config
+from utils.logger import logger
+
+T = TypeVar('T')
+
+class Throttled(Exception):
+    """请求被限流（429等），对应代理需要降速"""
+
+def playwright_proxy(url: str) -> Dict[str, str]:
+    """代理URL转换为Playwright的proxy选项（用户名密码单独传递）"""
+    parsed = urlparse(url)
+    server = f"{parsed.scheme}://{parsed.hostname}" + (f":{parsed.port}" if parsed.port else '')
+    proxy = {'server': server}
+    if parsed.username:
+        proxy['username'] = parsed.username
+        proxy['password'] = parsed.password or ''
+    return proxy
+
+class TokenBucket:
+    """令牌桶：rate为每秒补充的令牌数，burst为桶容量"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self) -> float:
+        """距离有一个令牌还需等待的秒数"""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> bool:
+        self._refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+class ProxyState:
+    """单个代理的健康状态"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.bucket = TokenBucket(Config.PROXY_RATE, Config.PROXY_BURST)
+        self.latency = 0.0  # 成功请求耗时的指数移动平均
+        self.health = 1.0  # 成功率的指数移动平均
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.throttled = 0
+        self.consecutive_failures = 0
+        self.quarantines = 0
+        self.quarantined_until = 0.0
+
+    @property
+    def name(self) -> str:
+        """日志中显示的名称（不含用户名密码）"""
+        parsed = urlparse(self.url)
+        return f"{parsed.hostname}:{parsed.port}" if parsed.port else (parsed.hostname or self.url)
+
+    def available(self, now: float) -> bool:
+        return now >= self.quarantined_until and self.in_flight < Config.PROXY_CONCURRENCY
+
+    def score(self) -> float:
+        """健康度越高、延迟越低得分越高"""
+        return self.health / max(self.latency, 0.05)
+
+class ProxyPool:
+    """代理池
+
+    每个代理有独立的令牌桶和并发上限。每次请求从未隔离、有空闲额度的代理中选择
+    得分（成功率/平均延迟）最高的一个；所有代理都没有额度时等待最早补充的令牌。
+    请求被限流时该代理的速率减半（成功后逐步恢复），连续失败 PROXY_MAX_FAILURES 次
+    则隔离一段时间，再次隔离时时长加倍。总吞吐量随代理数量线性增长。
+    """
+
+    def __init__(self, proxies: Optional[List[str]] = None):
+        proxies = Config.PROXIES if proxies is None else proxies
+        self.proxies = [ProxyState(url) for url in dict.fromkeys(proxies)]
+
+    def __len__(self) -> int:
+        return len(self.proxies)
+
+    @property
+    def concurrency(self) -> int:
+        """池内可同时进行的请求数"""
+        return len(self.proxies) * Config.PROXY_CONCURRENCY
+
+    def best(self) -> Optional[ProxyState]:
+        """当前得分最高的未隔离代理（不占用额度，用于浏览器上下文）"""
+        now = time.monotonic()
+        candidates = [proxy for proxy in self.proxies if now >= proxy.quarantined_until]
+        return max(candidates, key=lambda proxy: proxy.score(), default=None)
+
+    async def acquire(self) -> ProxyState:
+        """取得一个有额度的代理，没有时等待"""
+        warned = False
+        while True:
+            now = time.monotonic()
+            available = [proxy for proxy in self.proxies if proxy.available(now)]
+            for proxy in sorted(available, key=lambda proxy: proxy.score(), reverse=True):
+                if proxy.bucket.take():
+                    proxy.in_flight += 1
+                    return proxy
+
+            if available:
+                wait = min(proxy.bucket.wait_time() for proxy in available)
+            elif all(now < proxy.quarantined_until for proxy in self.proxies):
+                wait = min(proxy.quarantined_until for proxy in self.proxies) - now
+                if not warned:
+                    logger.warning(f"所有代理都已隔离，等待 {wait:.0f}秒")
+                    warned = True
+            else:
+                # 都在并发上限，等待进行中的请求完成
+                wait = 0.01
+            await asyncio.sleep(max(wait, 0.001))
+
+    def report(self, proxy: ProxyState, seconds: float, ok: bool, throttled: bool = False):
+        """记录一次请求的结果（只更新健康度和速率，并发额度由request释放）"""
+        proxy.requests += 1
+        alpha = Config.PROXY_EWMA_ALPHA
+        proxy.health = (1 - alpha) * proxy.health + alpha * (1.0 if ok else 0.0)
+        bucket = proxy.bucket
+
+        if ok:
+            proxy.latency = seconds if not proxy.latency else (1 - alpha) * proxy.latency + alpha * seconds
+            proxy.consecutive_failures = 0
+            # 限流后逐步恢复速率
+            bucket.rate = min(Config.PROXY_RATE, bucket.rate + Config.PROXY_RATE * 0.1)
+            return
+
+        proxy.failures += 1
+        if throttled:
+            proxy.throttled += 1
+            bucket.rate = max(Config.PROXY_MIN_RATE, bucket.rate / 2)
+            bucket.tokens = min(bucket.tokens, 0)
+            logger.debug("代理被限流，降速: %s -> %.2f/秒", proxy.name, bucket.rate)
+            return
+
+        proxy.consecutive_failures += 1
+        if proxy.consecutive_failures >= Config.PROXY_MAX_FAILURES:
+            duration = Config.PROXY_QUARANTINE * 2 ** proxy.quarantines
+            proxy.quarantines += 1
+            proxy.consecutive_failures = 0
+            proxy.quarantined_until = time.monotonic() + duration
+            logger.warning(f"代理连续失败，隔离 {duration:.0f}秒: {proxy.name}")
+
+    async def request(self, func: Callable[[ProxyState], Awaitable[T]],
+                      passthrough: Tuple[Type[BaseException], ...] = ()) -> T:
+        """通过代理执行请求，失败时换用其他代理重试（passthrough中的异常直接抛出）"""
+        last_exception: Optional[BaseException] = None
+        for attempt in range(Config.MAX_RETRIES + 1):
+            proxy = await self.acquire()
+            start = time.perf_counter()
+            try:
+                result = await func(proxy)
+            except passthrough:
+                # 与代理无关的异常（如会话失效、本地客户端错误）不影响代理的健康度
+                raise
+            except Throttled as e:
+                self.report(proxy, time.perf_counter() - start, ok=False, throttled=True)
+                last_exception = e
+            except Exception as e:
+                self.report(proxy, time.perf_counter() - start, ok=False)
+                last_exception = e
+                logger.debug("代理请求失败 (%s, 尝试 %d): %s", proxy.name, attempt + 1, e)
+            else:
+                self.report(proxy, time.perf_counter() - start, ok=True)
+                return result
+            finally:
+                # 请求被取消时同样释放并发额度
+                proxy.in_flight -= 1
+        raise last_exception
+
+    def log_report(self):
+        """输出各代理的请求统计"""
+        if not self.proxies:
+            return
+        lines = ["=== 代理统计 ==="]
+        for proxy in sorted(self.proxies, key=lambda proxy: proxy.requests, reverse=True):
+            lines.append(f"  {proxy.name}: 请求 {proxy.requests}，失败 {proxy.failures}（限流 {proxy.throttled}），"
+                         f"成功率 {proxy.health:.0%}，延迟 {proxy.latency * 1000:.0f}ms，"
+                         f"速率 {proxy.bucket.rate:.2f}/秒，隔离 {proxy.quarantines} 次")
+        logger.info('\n'.join(lines))
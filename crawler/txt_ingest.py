@@ -0,0 +1,117 @@
+"""
+TXT整卷导入模块
+Bulk volume ingest through wenku8's packaged TXT downloads
+"""
+
+import difflib
+import re
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+from utils.config import Config
+from utils.logger import logger
+from crawler.content_cleaner import ContentCleaner
+
+class TxtVolumeIngest:
+    """下载整卷TXT并按目录拆分为章节"""
+
+    _WHITESPACE = re.compile(r'\s+')
+
+    def __init__(self, user_agent: Optional[str] = None, cleaner: Optional[ContentCleaner] = None):
+        self.session = requests.Session()
+        if user_agent:
+            self.session.headers.update({'User-Agent': user_agent})
+        self.cleaner = cleaner or ContentCleaner.for_site(Config.BASE_URL)
+
+    def volume_txt_url(self, volume: Dict) -> Optional[str]:
+        """整卷TXT下载地址（卷册ID未知时返回None）"""
+        novel_id = Config.get_novel_id()
+        if volume.get('id') is None or novel_id is None:
+            return None
+        return Config.TXT_VOLUME_URL.format(aid=novel_id, vid=volume['id'])
+
+    def fetch_volume_text(self, volume: Dict) -> str:
+        """下载整卷TXT（同步，应在线程池中调用）"""
+        url = self.volume_txt_url(volume)
+        if not url:
+            raise ValueError(f"卷册ID未知，无法下载TXT: {volume['title']}")
+
+        logger.debug(f"下载整卷TXT: {url}")
+        response = self.session.get(url, timeout=Config.TIMEOUT)
+        response.raise_for_status()
+
+        data = response.content
+        try:
+            return data.decode('utf-8')
+        except UnicodeDecodeError:
+            return data.decode('gb18030', errors='replace')
+
+    def split_chapters(self, text: str, volume: Dict) -> Tuple[List[Dict], List[Dict]]:
+        """按目录中的章节标题拆分整卷文本
+
+        返回 (章节数据列表, 未能定位的目录条目列表)，章节数据格式与
+        NovelCrawler.crawl_chapter 一致，并附带目录中的章节ID。
+        """
+        lines = text.splitlines()
+        normalized = [self._normalize(line) for line in lines]
+
+        # 插图页标题同样作为分界，但其内容不计入章节
+        boundaries = {self._normalize(image['title']) for image in volume['images']}
+
+        positions = []
+        missing = []
+        cursor = 0
+        for entry in volume['chapters']:
+            line_no = self._find_line(normalized, self._normalize(entry['title']), cursor)
+            if line_no is None:
+                missing.append(entry)
+                continue
+            positions.append((line_no, entry))
+            cursor = line_no + 1
+
+        chapters = []
+        for i, (line_no, entry) in enumerate(positions):
+            end = positions[i + 1][0] if i + 1 < len(positions) else len(lines)
+            # 遇到插图页标题时截断
+            for j in range(line_no + 1, end):
+                if normalized[j] in boundaries:
+                    end = j
+                    break
+
+            content = self.cleaner.clean('\n'.join(lines[line_no + 1:end]))
+            if not content:
+                missing.append(entry)
+                continue
+
+            chapters.append({
+                'id': entry.get('id'),
+                'title': entry['title'],
+                'content': content,
+                'url': entry['url']
+            })
+
+        return chapters, missing
+
+    def matches(self, txt_content: str, html_content: str, threshold: float = 0.9) -> bool:
+        """校验TXT拆分结果与HTML爬取结果是否一致（按顺序比较，长章节需要数百毫秒）"""
+        a = self._normalize(txt_content)
+        b = self._normalize(html_content)
+        if not a or not b:
+            return False
+        matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+        # quick_ratio只比较字符计数，是ratio的上界，用于快速排除
+        return matcher.quick_ratio() >= threshold and matcher.ratio() >= threshold
+
+    def _find_line(self, normalized: List[str], title: str, start: int) -> Optional[int]:
+        """从start开始查找与标题一致的行"""
+        if not title:
+            return None
+        for i in range(start, len(normalized)):
+            if normalized[i] == title:
+                return i
+        return None
+
+    def _normalize(self, text: str) -> str:
+        """移除所有空白，用于标题和内容比较"""
+        return self._WHITESPACE.sub('', text)
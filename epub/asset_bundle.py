@@ -0,0 +1,164 @@
+"""
+共享资源包模块
+Shared asset bundle - minified, hashed and precompressed styles reused by every EPUB
+"""
+
+import hashlib
+import json
+import os
+import re
+from typing import Dict, List, Optional
+
+from utils.config import Config
+from utils.logger import logger
+from epub.enhanced_styles import EnhancedStyles
+from epub.zip_writer import deflate
+
+_CSS_STRING = r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')'
+
+# 字符串原样保留，注释删除
+_CSS_COMMENT = re.compile(_CSS_STRING + r'|/\*.*?\*/', re.DOTALL)
+
+# 字符串原样保留；标点两侧和冒号后的空白删除；其余空白压缩为一个空格
+_CSS_SPACE = re.compile(_CSS_STRING + r'|\s*([{};,>])\s*|(:)\s+|\s+')
+
+def minify_css(css: str) -> str:
+    """压缩CSS：删除注释和多余空白，去掉块末尾的分号"""
+    css = _CSS_COMMENT.sub(lambda m: m.group(1) or '', css)
+    css = _CSS_SPACE.sub(lambda m: m.group(1) or m.group(2) or m.group(3) or ' ', css)
+    return css.strip().replace(';}', '}')
+
+def _as_bytes(value) -> bytes:
+    """资源内容统一为字节"""
+    return value.encode('utf-8') if isinstance(value, str) else value
+
+class AssetBundle:
+    """所有EPUB共用的静态资源（目前为样式表，将来的字体等也在此登记）
+
+    每个资源只在生成器版本或压缩级别变化时处理一次：压缩后的字节、SHA-256
+    以及deflate数据流和CRC都缓存在 data/assets/<版本>/ 下，打包时直接写入zip。
+    """
+
+    # (uid, EPUB内路径, 媒体类型, 源内容)
+    SOURCES = [
+        ('main_css', 'style/main.css', 'text/css', EnhancedStyles.get_main_css),
+        ('nav_css', 'style/nav.css', 'text/css', EnhancedStyles.get_navigation_css),
+    ]
+
+    _loaded: Dict[tuple, 'AssetBundle'] = {}
+
+    def __init__(self, assets: List[Dict]):
+        self.assets = assets
+
+    @classmethod
+    def load(cls, directory: Optional[str] = None) -> 'AssetBundle':
+        """获取资源包（进程内只加载一次，磁盘缓存失效时重新生成）"""
+        directory = directory or os.path.join(Config.ASSET_CACHE_DIR, Config.EPUB_GENERATOR_VERSION)
+        key = (directory, Config.EPUB_COMPRESSLEVEL)
+        if key not in cls._loaded:
+            cls._loaded[key] = cls._read(directory) or cls._build(directory)
+        return cls._loaded[key]
+
+    @classmethod
+    def _sources_hash(cls) -> str:
+        """源内容哈希，源样式修改但未递增版本号时缓存同样失效"""
+        digest = hashlib.sha256()
+        for uid, href, media_type, source in cls.SOURCES:
+            digest.update(f'{uid}\0{href}\0{media_type}\0'.encode('utf-8'))
+            digest.update(_as_bytes(source()))
+        return digest.hexdigest()
+
+    @classmethod
+    def _read(cls, directory: str) -> Optional['AssetBundle']:
+        """读取磁盘缓存"""
+        index_path = os.path.join(directory, 'index.json')
+        if not os.path.exists(index_path):
+            return None
+
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if index['sources'] != cls._sources_hash() or index['compresslevel'] != Config.EPUB_COMPRESSLEVEL:
+                return None
+
+            assets = []
+            for asset in index['assets']:
+                with open(os.path.join(directory, asset['file']), 'rb') as f:
+                    asset['data'] = f.read()
+                with open(os.path.join(directory, asset['file'] + '.deflate'), 'rb') as f:
+                    asset['payload'] = f.read()
+                if hashlib.sha256(asset['data']).hexdigest() != asset['sha256']:
+                    return None
+                assets.append(asset)
+            return cls(assets)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"资源缓存读取失败，重新生成: {str(e)}")
+            return None
+
+    @classmethod
+    def _build(cls, directory: str) -> 'AssetBundle':
+        """压缩、计算哈希并预压缩所有资源，写入磁盘缓存"""
+        assets = []
+        for uid, href, media_type, source in cls.SOURCES:
+            original = source()
+            data = minify_css(original).encode('utf-8') if media_type == 'text/css' else _as_bytes(original)
+            payload, crc, size = deflate(data, Config.EPUB_COMPRESSLEVEL)
+            assets.append({
+                'uid': uid,
+                'href': href,
+                'media_type': media_type,
+                'file': os.path.basename(href),
+                'sha256': hashlib.sha256(data).hexdigest(),
+                'crc': crc,
+                'size': size,
+                'original_size': len(_as_bytes(original)),
+                'data': data,
+                'payload': payload,
+            })
+
+        try:
+            cls._write(directory, assets)
+        except OSError as e:
+            logger.warning(f"资源缓存写入失败: {str(e)}")
+        return cls(assets)
+
+    @classmethod
+    def _write(cls, directory: str, assets: List[Dict]):
+        """写入资源文件、deflate数据流和索引"""
+        os.makedirs(directory, exist_ok=True)
+        for asset in assets:
+            path = os.path.join(directory, asset['file'])
+            for suffix, content in (('', asset['data']), ('.deflate', asset['payload'])):
+                with open(path + suffix + '.tmp', 'wb') as f:
+                    f.write(content)
+                os.replace(path + suffix + '.tmp', path + suffix)
+
+        index = {
+            'sources': cls._sources_hash(),
+            'compresslevel': Config.EPUB_COMPRESSLEVEL,
+            'assets': [{k: v for k, v in a.items() if k not in ('data', 'payload')} for a in assets],
+        }
+        index_path = os.path.join(directory, 'index.json')
+        with open(index_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+        os.replace(index_path + '.tmp', index_path)
+        logger.info(f"资源包已生成: {directory}")
+
+    def get(self, uid: str) -> Dict:
+        """按uid获取资源"""
+        for asset in self.assets:
+            if asset['uid'] == uid:
+                return asset
+        raise KeyError(uid)
+
+    def digest(self) -> str:
+        """资源包内容哈希（用于构建清单）"""
+        return hashlib.sha256(''.join(a['sha256'] for a in self.assets).encode('ascii')).hexdigest()
+
+    def summary(self) -> Dict[str, int]:
+        """资源包体积：原始、压缩后和deflate后的字节数"""
+        return {
+            'original': sum(a['original_size'] for a in self.assets),
+            'minified': sum(a['size'] for a in self.assets),
+            'compressed': sum(len(a['payload']) for a in self.assets),
+        }
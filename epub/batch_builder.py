@@ -0,0 +1,205 @@
+"""
+多卷并行生成模块
+Process-parallel EPUB generation across volumes
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+from utils.config import Config
+from utils.logger import log_context, logger
+from utils.chapter_store import ChapterStore
+from utils.memory_monitor import MemoryMonitor
+from utils.sampling_profiler import profile_worker
+from epub.epub_generator import EPUBGenerator
+from epub.build_manifest import BuildManifest, file_sha256, volume_inputs
+from formats.fanout import FormatFanout
+
+def build_volume(volume_data: Dict, force: bool = False) -> Dict:
+    """无状态地生成单卷EPUB，返回包含路径和耗时的结果
+
+    输入哈希与构建清单一致且输出文件完好时直接跳过；只有章节变化时在旧EPUB的基础上
+    增量更新。force为True时总是完整重新生成。配置了EPUB以外的输出格式时，
+    由FormatFanout一次处理正文后并行写出所有格式。
+    """
+    start = time.perf_counter()
+    title = volume_data['title']
+    result = {'title': title, 'path': None, 'seconds': 0.0, 'error': None,
+              'skipped': False, 'patched': False, 'inputs': None, 'sha256': None, 'sizes': None,
+              'formats': None}
+
+    try:
+        result['inputs'] = volume_inputs(volume_data)
+        manifest = BuildManifest()
+        if tuple(Config.OUTPUT_FORMATS) != ('epub',):
+            result['formats'] = FormatFanout(Config.OUTPUT_FORMATS, force).run(volume_data, result['inputs'])
+            written = {fmt: output for fmt, output in result['formats'].items() if not output['error']}
+            first = written.get('epub') or next(iter(written.values()), None)
+            result['path'] = first['path'] if first else None
+            failed = [f"{fmt}: {output['error']}" for fmt, output in result['formats'].items() if output['error']]
+            # 部分格式失败时整卷报告错误，成功的格式仍由构建清单记录
+            result['error'] = '; '.join(failed) or None
+            result['skipped'] = not failed and all(output['skipped'] for output in written.values())
+        elif not force and manifest.is_current(title, result['inputs']):
+            result['path'] = manifest.get(title)['output']['path']
+            result['skipped'] = True
+        else:
+            base_path = None if force else manifest.patch_base(title, result['inputs'])
+            result['patched'] = base_path is not None
+            # 每次使用新的生成器实例，不共享任何书籍状态
+            generator = EPUBGenerator()
+            result['path'] = generator.create_epub(volume_data, base_path)
+            result['sizes'] = generator.size_report
+            result['sha256'] = file_sha256(result['path'])
+    except Exception as e:
+        result['error'] = str(e)
+
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def build_stored_volume(volume_title: str, force: bool = False) -> Dict:
+    """从章节存储生成EPUB（工作进程自行读取数据，避免在进程间传递正文）"""
+    store = ChapterStore()
+    monitor = MemoryMonitor()
+    try:
+        with log_context(volume=volume_title), monitor, monitor.track('packaging', volume_title):
+            volume_data = store.load_volume(volume_title)
+            if volume_data is None:
+                return {'title': volume_title, 'path': None, 'seconds': 0.0, 'error': "章节存储中没有该卷册"}
+            result = build_volume(volume_data, force)
+            del volume_data
+        # 内存受限模式下随结果返回本进程的峰值
+        result['memory'] = monitor.peak('packaging', volume_title)
+        return result
+    finally:
+        store.close()
+
+def _init_worker(device_profile: str, output_formats: tuple, log_format: str, memory_limit_mb: int):
+    """工作进程初始化：卷册之间已并行，卷内压缩改为串行以免线程超额"""
+    Config.EPUB_COMPRESS_WORKERS = 1
+    # spawn方式启动的进程不继承运行时修改的配置
+    Config.DEVICE_PROFILE = device_profile
+    Config.OUTPUT_FORMATS = output_formats
+    Config.MEMORY_LIMIT_MB = memory_limit_mb
+    if log_format != Config.LOG_FORMAT:
+        Config.LOG_FORMAT = log_format
+        logger.reconfigure()
+    profile_worker()
+
+class ParallelEPUBBuilder:
+    """将多个卷册分发到进程池并行生成EPUB"""
+
+    def __init__(self, max_workers: Optional[int] = None, force: bool = False):
+        self.max_workers = max_workers or Config.BUILD_WORKERS or os.cpu_count() or 1
+        self.force = force
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._titles: Dict[Future, str] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        """按需创建进程池"""
+        if self._pool is None:
+            options = {}
+            if Config.MEMORY_LIMIT_MB and sys.version_info >= (3, 11):
+                # 内存受限模式：每个工作进程只生成一卷，退出时把内存完整归还系统
+                options['max_tasks_per_child'] = 1
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers, initializer=_init_worker,
+                initargs=(Config.DEVICE_PROFILE, tuple(Config.OUTPUT_FORMATS), Config.LOG_FORMAT, Config.MEMORY_LIMIT_MB),
+                **options
+            )
+        return self._pool
+
+    def _submit(self, title: str, func, *args) -> Future:
+        """提交任务并记住卷册标题（任务异常时用于生成错误结果）"""
+        future = self.pool.submit(func, *args)
+        self._titles[future] = title
+        return future
+
+    def submit_stored(self, volume_title: str) -> Future:
+        """提交章节存储中单个卷册的生成任务"""
+        return self._submit(volume_title, build_stored_volume, volume_title, self.force)
+
+    def build_stored(self, volume_titles: List[str]) -> List[Dict]:
+        """并行生成章节存储中多个卷册的EPUB"""
+        return self.collect([self.submit_stored(title) for title in volume_titles])
+
+    def build_volumes(self, volumes_data: List[Dict]) -> List[Dict]:
+        """并行生成内存中多个卷册的EPUB"""
+        return self.collect([self._submit(volume_data.get('title', ''), build_volume, volume_data, self.force)
+                             for volume_data in volumes_data])
+
+    def collect(self, futures: List[Future]) -> List[Dict]:
+        """等待所有任务完成，结果顺序与提交顺序一致
+
+        工作进程中未捕获的异常（读取章节存储失败、进程被结束等）只作为该卷的错误结果，
+        其余卷的结果照常记录到构建清单。
+        """
+        start = time.perf_counter()
+        results: Dict[Future, Dict] = {}
+        for future in as_completed(futures):
+            results[future] = self._result(future)
+            self.log_result(results[future])
+
+        results = [results[future] for future in futures]
+        # 构建清单只在主进程中更新
+        BuildManifest().record_results(results)
+        self.report(results, time.perf_counter() - start)
+        return results
+
+    def _result(self, future: Future) -> Dict:
+        """任务结果，任务异常时转换为与build_volume相同格式的错误结果"""
+        title = self._titles.pop(future, '')
+        try:
+            return future.result()
+        except Exception as e:
+            return {'title': title, 'path': None, 'seconds': 0.0, 'error': f"{type(e).__name__}: {e}"}
+
+    @staticmethod
+    def log_result(result: Dict):
+        """记录单卷结果"""
+        if result['error']:
+            logger.error(f"EPUB生成失败 {result['title']}: {result['error']} ({result['seconds']:.2f}秒)")
+        elif result.get('skipped'):
+            logger.info(f"输入未变化，跳过 {result['title']} -> {result['path']}")
+        else:
+            action = "增量更新" if result.get('patched') else "生成"
+            logger.info(f"EPUB{action}完成 {result['title']}: {result['seconds']:.2f}秒 -> {result['path']}")
+
+    def report(self, results: List[Dict], wall_seconds: float):
+        """输出各卷耗时汇总"""
+        if not results:
+            return
+
+        succeeded = [r for r in results if not r['error']]
+        skipped = [r for r in results if r.get('skipped')]
+        slowest = max(results, key=lambda r: r['seconds'])
+        total = sum(r['seconds'] for r in results)
+
+        logger.info("=== EPUB生成耗时 ===")
+        for result in results:
+            status = ("失败" if result['error'] else "跳过" if result.get('skipped')
+                      else "增量更新" if result.get('patched') else "完成")
+            sizes = result.get('sizes')
+            size_info = (f"，{sizes['total'] / 1024:.0f} KB（正文 {sizes['text'] / 1024:.0f} KB，"
+                         f"图片 {sizes['images'] / 1024:.0f} KB，样式 {sizes['styles']} 字节）") if sizes else ""
+            logger.info(f"  {result['title']}: {result['seconds']:.2f}秒 ({status}){size_info}")
+        logger.info(f"成功 {len(succeeded)}/{len(results)} 卷（未变化跳过 {len(skipped)} 卷），"
+                    f"进程数 {self.max_workers}")
+        logger.info(f"总耗时 {wall_seconds:.2f}秒，各卷耗时之和 {total:.2f}秒，"
+                    f"最慢卷册 {slowest['title']} {slowest['seconds']:.2f}秒")
+
+    def shutdown(self):
+        """关闭进程池"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
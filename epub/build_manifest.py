@@ -0,0 +1,148 @@
+"""
+构建清单模块
+Build manifest - input hashes and output checksums for skipping unchanged rebuilds
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+
+from utils.config import Config
+from utils.logger import logger
+from epub.asset_bundle import AssetBundle
+
+_CHUNK_SIZE = 1024 * 1024
+
+def _sha256_json(value) -> str:
+    """按规范化JSON计算SHA-256"""
+    data = json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+def file_sha256(path: str) -> str:
+    """分块计算文件SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def volume_inputs(volume_data: Dict) -> Dict[str, str]:
+    """计算影响卷册EPUB输出的各项输入哈希"""
+    images = [
+        [os.path.basename(path), file_sha256(path)]
+        for path in volume_data['images'] if os.path.exists(path)
+    ]
+    # 逐章计算，章节可以是从章节存储惰性读取的序列
+    chapters = hashlib.sha256()
+    for chapter in volume_data['chapters']:
+        chapters.update(_sha256_json([chapter['title'], chapter['content']]).encode('ascii'))
+    inputs = {
+        'chapters': chapters.hexdigest(),
+        'images': _sha256_json(images),
+        'css': AssetBundle.load().digest(),
+        'generator': _sha256_json([
+            Config.EPUB_GENERATOR_VERSION, Config.EPUB_WRITER, Config.EPUB_COMPRESSLEVEL,
+            Config.EPUB_BUILD_TIMESTAMP, Config.NOVEL_URL, Config.EPUB_TITLE, Config.EPUB_AUTHOR,
+            Config.EPUB_LANGUAGE, Config.EPUB_PUBLISHER, list(Config.EPUB_STORED_MEDIA_TYPES),
+            Config.get_device_profile(),
+        ]),
+    }
+    inputs['hash'] = _sha256_json(inputs)
+    return inputs
+
+def output_key(volume_title: str, fmt: str = 'epub') -> str:
+    """构建清单中的条目名：EPUB使用卷册标题，其他格式加上格式后缀"""
+    return volume_title if fmt == 'epub' else f"{volume_title}#{fmt}"
+
+class BuildManifest:
+    """记录每卷的输入哈希和输出校验和
+
+    输入哈希相同且输出文件仍在（大小一致）时，可以跳过该卷的重新生成。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(Config.OUTPUT_DIR, Config.BUILD_MANIFEST_NAME)
+        self.entries: Dict[str, Dict] = self._read()
+
+    def _read(self) -> Dict[str, Dict]:
+        """读取清单文件，不存在或损坏时返回空清单"""
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('volumes', {})
+        except (OSError, ValueError) as e:
+            logger.warning(f"构建清单读取失败，将全部重新生成: {str(e)}")
+            return {}
+
+    def get(self, volume_title: str) -> Optional[Dict]:
+        """获取卷册的清单条目"""
+        return self.entries.get(volume_title)
+
+    def is_current(self, volume_title: str, inputs: Dict[str, str]) -> bool:
+        """输入未变化且输出文件完好时返回True"""
+        entry = self.get(volume_title)
+        if not entry or entry['inputs']['hash'] != inputs['hash']:
+            return False
+        output = entry['output']
+        return os.path.exists(output['path']) and os.path.getsize(output['path']) == output['size']
+
+    def patch_base(self, volume_title: str, inputs: Dict[str, str]) -> Optional[str]:
+        """只有章节变化时返回可增量更新的旧EPUB路径，否则返回None"""
+        entry = self.get(volume_title)
+        if not entry or Config.EPUB_WRITER != 'streaming':
+            return None
+        if any(entry['inputs'].get(key) != inputs[key] for key in ('images', 'css', 'generator')):
+            return None
+        output = entry['output']
+        if os.path.exists(output['path']) and os.path.getsize(output['path']) == output['size']:
+            return output['path']
+        return None
+
+    def record(self, volume_title: str, inputs: Dict[str, str], output_path: str,
+               output_sha256: Optional[str] = None):
+        """记录一次成功的构建"""
+        self.entries[volume_title] = {
+            'inputs': inputs,
+            'output': {
+                'path': output_path,
+                'size': os.path.getsize(output_path),
+                'sha256': output_sha256 or file_sha256(output_path),
+            },
+        }
+
+    def save(self):
+        """写入清单文件（先合并磁盘上其他卷册的条目，再原子替换）"""
+        merged = self._read()
+        merged.update(self.entries)
+        self.entries = merged
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'volumes': merged}, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def record_results(self, results: List[Dict]):
+        """记录批量构建结果（跳过的和失败的输出不变）并保存
+
+        result['formats']为各格式的输出 {格式: {'path', 'sha256', 'skipped', 'error'}}，
+        按格式分别记录；没有时视为只生成了EPUB。
+        """
+        changed = False
+        for result in results:
+            if not result.get('inputs'):
+                continue
+            outputs = result.get('formats')
+            if not outputs:
+                if result['error']:
+                    continue
+                outputs = {'epub': {'path': result['path'], 'sha256': result.get('sha256'),
+                                    'skipped': result.get('skipped')}}
+            for fmt, output in outputs.items():
+                if not output['skipped'] and not output.get('error'):
+                    self.record(output_key(result['title'], fmt), result['inputs'], output['path'], output['sha256'])
+                    changed = True
+        if changed:
+            self.save()
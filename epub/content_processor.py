@@ -5,6 +5,7 @@ Content processor module for intelligent text formatting
 
 import re
 from typing import List, Tuple
+from epub.paragraph_classifier import ParagraphClassifier, escape_html
 
 class ContentProcessor:
     """智能内容处理器"""
@@ -35,30 +36,72 @@ class ContentProcessor:
             r'\[[^\]]*\]', # 方括号
         ]
         
-        # 强调文本模式
-        self.emphasis_patterns = [
-            r'\*\*([^*]+)\*\*',  # **粗体**
-            r'\*([^*]+)\*',      # *斜体*
-            r'__([^_]+)__',      # __下划线__
-            r'_([^_]+)_',        # _斜体_
+        # 小标题模式
+        self.subtitle_patterns = [
+            r'^\d+[、.]',  # 以数字开头
+            r'^[一二三四五六七八九十]+[、.]',  # 以中文数字开头
+            r'^第[一二三四五六七八九十\d]+[章节部分]',  # 章节标题
+            r'^\*+\s*\w+\s*\*+$',  # 星号包围
+            r'^=+\s*\w+\s*=+$',   # 等号包围
         ]
+        
+        # 预编译的分类引擎（一次扫描得到段落类型和强调片段）
+        self.classifier = ParagraphClassifier(
+            self.dialogue_patterns,
+            self.thought_patterns,
+            self.narrator_patterns,
+            self.subtitle_patterns
+        )
+    
+    # 段落类型对应的HTML模板
+    PARAGRAPH_TEMPLATES = {
+        'dialogue': '    <p class="dialogue">{}</p>',
+        'thought': '    <p class="thought">{}</p>',
+        'narrator': '    <p class="narrator">{}</p>',
+        'title': '    <h2>{}</h2>',
+        'normal': '    <p>{}</p>',
+    }
     
     def process_content(self, content: str) -> str:
         """处理内容，返回格式化的HTML"""
         if not content:
             return "<p>内容为空</p>"
         
+        return '\n'.join(self.render_paragraphs(content))
+    
+    def render_paragraphs(self, content: str) -> List[str]:
+        """将正文分割为段落并逐段生成HTML"""
+        templates = self.PARAGRAPH_TEMPLATES
+        return [templates[para_type].format(html) for para_type, _, html in self.process_paragraphs(content)]
+    
+    def process_paragraphs(self, content: str) -> List[Tuple[str, str, str]]:
+        """分割段落并整章批量分类，返回 (段落类型, 原文, 带强调标记的HTML) 列表"""
         # 分割段落
         paragraphs = self._split_paragraphs(content)
         
-        # 处理每个段落
-        html_paragraphs = []
-        for para in paragraphs:
-            if para.strip():
-                processed_para = self._process_paragraph(para.strip())
-                html_paragraphs.append(processed_para)
-        
-        return '\n'.join(html_paragraphs)
+        # 整章批量分类并生成HTML
+        paragraphs = [para.strip() for para in paragraphs if para.strip()]
+        return [
+            (para_type, text, html)
+            for (para_type, html), text in zip(self.classifier.render_batch(paragraphs), paragraphs)
+        ]
+    
+    def split_pages(self, html_paragraphs: List[str], max_bytes: int = 0,
+                    max_paragraphs: int = 0) -> List[List[str]]:
+        """在段落边界把章节切分为多页，每页不超过给定的字节数和段落数（0 表示不限制）"""
+        pages = [[]]
+        page_bytes = 0
+        for html in html_paragraphs:
+            size = len(html.encode('utf-8')) + 1
+            page = pages[-1]
+            if page and ((max_bytes and page_bytes + size > max_bytes)
+                         or (max_paragraphs and len(page) >= max_paragraphs)):
+                page = []
+                pages.append(page)
+                page_bytes = 0
+            page.append(html)
+            page_bytes += size
+        return pages
     
     def _split_paragraphs(self, content: str) -> List[str]:
         """智能分割段落"""
@@ -92,103 +135,61 @@ class ContentProcessor:
     
     def _process_paragraph(self, paragraph: str) -> str:
         """处理单个段落"""
-        # 转义HTML字符
-        escaped_para = self._escape_html(paragraph)
-        
-        # 应用强调格式
-        escaped_para = self._apply_emphasis(escaped_para)
-        
-        # 识别段落类型并应用相应的CSS类
-        para_type = self._identify_paragraph_type(paragraph)
-        
-        if para_type == 'dialogue':
-            return f'    <p class="dialogue">{escaped_para}</p>'
-        elif para_type == 'thought':
-            return f'    <p class="thought">{escaped_para}</p>'
-        elif para_type == 'narrator':
-            return f'    <p class="narrator">{escaped_para}</p>'
-        elif para_type == 'title':
-            return f'    <h2>{escaped_para}</h2>'
-        else:
-            return f'    <p>{escaped_para}</p>'
+        para_type, spans = self.classifier.classify(paragraph)
+        return self._render_paragraph(paragraph, para_type, spans)
+    
+    def _render_paragraph(self, paragraph: str, para_type: str, spans: list) -> str:
+        """按段落类型和强调片段生成HTML"""
+        return self.PARAGRAPH_TEMPLATES[para_type].format(self.classifier.render(paragraph, spans))
     
     def _identify_paragraph_type(self, paragraph: str) -> str:
         """识别段落类型"""
-        # 检查是否为小标题
-        if self._is_subtitle(paragraph):
-            return 'title'
-        
-        # 检查是否为对话
-        if self._contains_pattern(paragraph, self.dialogue_patterns):
-            return 'dialogue'
-        
-        # 检查是否为内心独白
-        if self._contains_pattern(paragraph, self.thought_patterns):
-            return 'thought'
-        
-        # 检查是否为旁白
-        if self._contains_pattern(paragraph, self.narrator_patterns):
-            return 'narrator'
-        
-        return 'normal'
+        return self.classifier.classify(paragraph)[0]
     
     def _is_subtitle(self, paragraph: str) -> bool:
         """判断是否为小标题"""
-        # 小标题通常较短且可能包含数字、特殊符号
-        if len(paragraph) > 50:
-            return False
-        
-        subtitle_patterns = [
-            r'^\d+[、.]',  # 以数字开头
-            r'^[一二三四五六七八九十]+[、.]',  # 以中文数字开头
-            r'^第[一二三四五六七八九十\d]+[章节部分]',  # 章节标题
-            r'^\*+\s*\w+\s*\*+$',  # 星号包围
-            r'^=+\s*\w+\s*=+$',   # 等号包围
-        ]
-        
-        return any(re.match(pattern, paragraph) for pattern in subtitle_patterns)
-    
-    def _contains_pattern(self, text: str, patterns: List[str]) -> bool:
-        """检查文本是否包含指定模式"""
-        for pattern in patterns:
-            if re.search(pattern, text):
-                return True
-        return False
+        return self._identify_paragraph_type(paragraph) == 'title'
     
     def _apply_emphasis(self, text: str) -> str:
-        """应用强调格式"""
-        # 处理粗体
-        text = re.sub(r'\*\*([^*]+)\*\*', r'<strong>\1</strong>', text)
-        text = re.sub(r'__([^_]+)__', r'<strong>\1</strong>', text)
-        
-        # 处理斜体
-        text = re.sub(r'\*([^*]+)\*', r'<em>\1</em>', text)
-        text = re.sub(r'_([^_]+)_', r'<em>\1</em>', text)
-        
-        # 处理特殊强调（如书名、专有名词等）
-        text = re.sub(r'《([^》]+)》', r'<em class="book-title">《\1》</em>', text)
-        text = re.sub(r'【([^】]+)】', r'<strong class="special">\1</strong>', text)
-        
-        return text
+        """应用强调格式（输入为已转义的文本）"""
+        return self.classifier.render_emphasis(text, escape=False)
     
-    def _escape_html(self, text: str) -> str:
+    @staticmethod
+    def _escape_html(text: str) -> str:
         """转义HTML特殊字符"""
-        if not text:
-            return ""
-        
-        # 基本HTML转义
-        text = text.replace('&', '&amp;')
-        text = text.replace('<', '&lt;')
-        text = text.replace('>', '&gt;')
-        text = text.replace('"', '&quot;')
-        text = text.replace("'", '&#x27;')
-        
-        return text
+        return escape_html(text)
     
     def create_chapter_html(self, title: str, content: str) -> str:
         """创建完整的章节HTML"""
+        return self._chapter_page(title, self.process_content(content), first=True, last=True)
+    
+    def create_chapter_pages(self, title: str, content: str, max_bytes: int = 0,
+                             max_paragraphs: int = 0) -> List[str]:
+        """创建章节HTML，超过阈值时在段落边界切分为多个文档
+        
+        只有一页时与create_chapter_html的输出相同；章节标题只出现在第一页。
+        """
+        if not content:
+            return [self.create_chapter_html(title, content)]
+        return self.create_pages_from_html(title, self.render_paragraphs(content), max_bytes, max_paragraphs)
+    
+    def create_pages_from_html(self, title: str, html_paragraphs: List[str], max_bytes: int = 0,
+                               max_paragraphs: int = 0) -> List[str]:
+        """由已生成的段落HTML创建章节文档（可切分为多页）"""
+        pages = self.split_pages(html_paragraphs, max_bytes, max_paragraphs)
+        return [
+            self._chapter_page(title, '\n'.join(page), first=i == 0, last=i == len(pages) - 1)
+            for i, page in enumerate(pages)
+        ]
+    
+    def _chapter_page(self, title: str, processed_content: str, first: bool, last: bool) -> str:
+        """生成章节（或章节中的一页）的XHTML"""
         escaped_title = self._escape_html(title)
-        processed_content = self.process_content(content)
+        heading = f"""
+    <h1>{escaped_title}</h1>
+    <div class="chapter-separator">※ ※ ※</div>""" if first else ""
+        closing = """
+    <div class="chapter-separator">※ ※ ※</div>""" if last else ""
         
         html_template = f"""<!DOCTYPE html>
 <html xmlns="http://www.w3.org/1999/xhtml">
@@ -197,11 +198,8 @@ class ContentProcessor:
     <meta charset="utf-8"/>
     <link rel="stylesheet" type="text/css" href="style/main.css"/>
 </head>
-<body>
-    <h1>{escaped_title}</h1>
-    <div class="chapter-separator">※ ※ ※</div>
-{processed_content}
-    <div class="chapter-separator">※ ※ ※</div>
+<body>{heading}
+{processed_content}{closing}
 </body>
 </html>"""
         
@@ -5,12 +5,32 @@ EPUB generator module
 
 import os
 import uuid
-from typing import List, Dict
-from ebooklib import epub
+from datetime import datetime, timezone
+from typing import Iterable, List, Dict, Optional
 from utils.config import Config
 from utils.logger import logger
-from epub.enhanced_styles import EnhancedStyles
+from epub.asset_bundle import AssetBundle
 from epub.content_processor import ContentProcessor
+from epub.epub_writer import StreamingEPUBWriter
+from epub.build_manifest import file_sha256
+
+# ebooklib只在EPUB_WRITER为ebooklib时使用，按需导入
+epub = None
+
+def _load_ebooklib():
+    """导入ebooklib（只在第一次调用时执行）"""
+    global epub
+    if epub is None:
+        from ebooklib import epub as ebooklib_epub
+        epub = ebooklib_epub
+    return epub
+
+def safe_filename(filename: str) -> str:
+    """生成安全的文件名（替换文件系统不允许的字符）"""
+    unsafe_chars = '<>:"/\\|?*'
+    for char in unsafe_chars:
+        filename = filename.replace(char, '_')
+    return filename.strip()
 
 class EPUBGenerator:
     """EPUB文件生成器"""
@@ -18,13 +38,20 @@ class EPUBGenerator:
     def __init__(self):
         self.book = None
         self.content_processor = ContentProcessor()
+        self.assets = AssetBundle.load()
+        # 最近一次流式生成的体积统计
+        self.size_report = None
     
-    def create_epub(self, volume_data: Dict) -> str:
-        """创建EPUB文件"""
+    def create_epub(self, volume_data: Dict, base_path: Optional[str] = None) -> str:
+        """创建EPUB文件（base_path为之前生成的同卷EPUB时，流式写入器复用其中未变化的条目）"""
         volume_title = volume_data['title']
         logger.info(f"开始生成EPUB: {volume_title}")
 
+        if Config.EPUB_WRITER == 'streaming':
+            return self.create_epub_streaming(volume_data, base_path)
+
         # 创建EPUB书籍对象
+        _load_ebooklib()
         self.book = epub.EpubBook()
 
         # 设置元数据
@@ -39,11 +66,12 @@ class EPUBGenerator:
         # 创建插图页面
         illustration_chapters = self._create_illustration_pages(image_mapping, volume_title)
 
-        # 添加章节
+        # 添加章节（每章可能切分为多个文档）
         text_chapters = self._add_chapters(volume_data['chapters'])
 
-        # 合并所有章节（插图页面 + 文本章节）
-        all_chapters = illustration_chapters + text_chapters
+        # 合并所有章节（插图页面 + 文本章节），目录中每章只保留第一个文档
+        all_chapters = illustration_chapters + [pages[0] for pages in text_chapters]
+        all_documents = illustration_chapters + [page for pages in text_chapters for page in pages]
 
         if not all_chapters:
             raise ValueError("没有有效的章节内容")
@@ -52,7 +80,7 @@ class EPUBGenerator:
         self._create_toc(all_chapters)
 
         # 添加导航文件
-        self._add_navigation(all_chapters)
+        self._add_navigation(all_documents)
 
         # 生成文件
         output_path = Config.get_output_path(self._safe_filename(volume_title))
@@ -64,28 +92,206 @@ class EPUBGenerator:
         except Exception as e:
             logger.error(f"EPUB写入失败: {str(e)}")
             raise
+        finally:
+            # 书籍对象持有整卷正文和图片数据，写出后立即释放
+            self.book = None
     
+    def create_epub_streaming(self, volume_data: Dict, base_path: Optional[str] = None) -> str:
+        """流式创建EPUB文件：章节和图片生成后立即写入，内存占用与最大单项相当"""
+        volume_title = volume_data['title']
+        output_path = Config.get_output_path(self._safe_filename(volume_title))
+
+        try:
+            writer = StreamingEPUBWriter(output_path, self._build_metadata(volume_title), base_path=base_path)
+            with writer:
+                # 共享资源直接写入预压缩的数据
+                for asset in self.assets.assets:
+                    writer.add_precompressed(asset['uid'], asset['href'], asset['media_type'],
+                                             asset['payload'], asset['crc'], asset['size'])
+
+                if not self._write_volume(writer, volume_data):
+                    raise ValueError("没有有效的章节内容")
+
+            self.size_report = writer.size_report()
+            self._log_size_report(volume_title)
+            if base_path:
+                stats = writer.stats
+                logger.info(f"增量更新: 复用 {stats['reused']} 个条目 ({stats['reused_bytes'] / 1024:.0f} KB)，"
+                            f"写入 {stats['written']} 个条目 ({stats['written_bytes'] / 1024:.0f} KB)")
+            logger.info(f"EPUB生成完成: {output_path}")
+            return output_path
+        except Exception as e:
+            logger.error(f"EPUB写入失败: {str(e)}")
+            raise
+
+    def create_omnibus(self, volumes: Iterable[Dict], title: Optional[str] = None) -> str:
+        """流式生成整个系列（或所选卷册）的合集EPUB
+
+        volumes可以是从章节存储按需读取卷册的迭代器，内存中同时只保留一卷的数据。
+        目录按卷册嵌套，样式只保存一份，内容相同的图片只写入一次。
+        """
+        title = title or "合集"
+        output_path = Config.get_output_path(self._safe_filename(title))
+        logger.info(f"开始生成合集EPUB: {title}")
+
+        try:
+            writer = StreamingEPUBWriter(output_path, self._build_metadata(title))
+            with writer:
+                for asset in self.assets.assets:
+                    writer.add_precompressed(asset['uid'], asset['href'], asset['media_type'],
+                                             asset['payload'], asset['crc'], asset['size'])
+
+                image_hashes = {}
+                volume_count = 0
+                for index, volume_data in enumerate(volumes, 1):
+                    # 本卷的目录项收拢为卷册节点下的子项
+                    start = len(writer.toc)
+                    if not self._write_volume(writer, volume_data, f"v{index:02d}_", image_hashes):
+                        logger.warning(f"卷册没有有效内容，跳过: {volume_data['title']}")
+                        continue
+                    children = writer.toc[start:]
+                    del writer.toc[start:]
+                    writer.toc.append({'title': volume_data['title'], 'href': children[0]['href'],
+                                       'children': children})
+                    volume_count += 1
+                    logger.info(f"合集已写入卷册: {volume_data['title']}")
+
+                if not volume_count:
+                    raise ValueError("没有有效的卷册内容")
+
+            self.size_report = writer.size_report()
+            self._log_size_report(title)
+            logger.info(f"合集EPUB生成完成: {output_path}（{volume_count} 卷，图片 {len(image_hashes)} 张）")
+            return output_path
+        except Exception as e:
+            logger.error(f"EPUB写入失败: {str(e)}")
+            raise
+
+    def _write_volume(self, writer: StreamingEPUBWriter, volume_data: Dict, prefix: str = '',
+                      image_hashes: Optional[Dict[str, str]] = None) -> int:
+        """写入一卷的图片、插图页面和章节，返回写入的文档数（合集中各卷使用不同前缀）"""
+        volume_title = volume_data['title']
+
+        # 图片直接从磁盘分块写入
+        image_mapping = self._write_images(writer, volume_data['images'], prefix, image_hashes)
+
+        # 插图页面
+        if image_mapping:
+            writer.add_document(
+                f"{prefix}illustrations",
+                f"{prefix}illustrations.xhtml",
+                self._create_illustrations_overview(image_mapping, volume_title),
+                title=f"{volume_title} 插图"
+            )
+            logger.info(f"创建插图页面，包含 {len(image_mapping)} 张图片")
+
+        # 章节逐个生成并写入
+        chapter_count = self._write_chapters(writer, volume_data['chapters'], prefix)
+        return chapter_count + (1 if image_mapping else 0)
+
+    def _log_size_report(self, volume_title: str):
+        """输出卷册的体积构成"""
+        report = self.size_report
+        assets = self.assets.summary()
+        logger.info(
+            f"体积 {volume_title}: 共 {report['total'] / 1024:.0f} KB，"
+            f"正文 {report['text'] / 1024:.0f} KB，图片 {report['images'] / 1024:.0f} KB，"
+            f"样式 {report['styles']} 字节（原始 {assets['original']} 字节，压缩后 {assets['minified']} 字节），"
+            f"其他 {report['other'] / 1024:.0f} KB"
+        )
+
+    def _write_images(self, writer: StreamingEPUBWriter, image_paths: List[str], prefix: str = '',
+                      image_hashes: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """流式写入图片并返回图片映射（给出image_hashes时按内容去重）"""
+        image_mapping = {}
+
+        for i, image_path in enumerate(image_paths):
+            if not os.path.exists(image_path):
+                continue
+            try:
+                digest = file_sha256(image_path) if image_hashes is not None else None
+                if digest and digest in image_hashes:
+                    image_mapping[image_path] = image_hashes[digest]
+                    logger.debug("图片内容重复，复用: %s", os.path.basename(image_path))
+                    continue
+
+                epub_img_path = f"images/{prefix}{os.path.basename(image_path)}"
+                writer.add_image(f"{prefix}img_{i+1:03d}", epub_img_path, image_path)
+                image_mapping[image_path] = epub_img_path
+                if digest:
+                    image_hashes[digest] = epub_img_path
+                logger.debug("添加图片: %s", os.path.basename(image_path))
+            except Exception as e:
+                logger.error(f"添加图片失败 {image_path}: {str(e)}")
+
+        return image_mapping
+
+    def _write_chapters(self, writer: StreamingEPUBWriter, chapters_data: List[Dict], prefix: str = '') -> int:
+        """逐章生成XHTML并写入，返回写入的章节数"""
+        count = 0
+        profile = Config.get_device_profile()
+
+        for i, chapter_data in enumerate(chapters_data):
+            chapter_title = chapter_data['title']
+            chapter_content = chapter_data['content']
+
+            rendered = chapter_data.get('rendered')
+            if rendered is None and (not chapter_content or len(chapter_content.strip()) < 10):
+                logger.warning(f"章节内容为空或过短，跳过: {chapter_title}")
+                continue
+
+            pages = self._chapter_pages(chapter_title, chapter_content, profile, rendered)
+            for part, (uid, href) in enumerate(self._chapter_files(i, len(pages), prefix)):
+                writer.add_document(uid, href, pages[part], title=chapter_title if part == 0 else None)
+            count += 1
+
+            logger.debug("添加章节: %s (内容长度: %d)", chapter_title, len(chapter_content))
+
+        return count
+
+    def _chapter_pages(self, chapter_title: str, chapter_content: str, profile: Dict,
+                       rendered: Optional[List[str]] = None) -> List[str]:
+        """按设备配置生成章节的一个或多个XHTML文档（rendered为已处理好的段落HTML时直接使用）"""
+        limits = (profile['chapter_max_bytes'], profile['chapter_max_paragraphs'])
+        if rendered is not None:
+            pages = self.content_processor.create_pages_from_html(chapter_title, rendered, *limits)
+        else:
+            pages = self.content_processor.create_chapter_pages(chapter_title, chapter_content, *limits)
+        if len(pages) > 1:
+            logger.debug("章节过长，切分为 %d 个文档: %s", len(pages), chapter_title)
+        return pages
+
+    @staticmethod
+    def _chapter_files(index: int, count: int, prefix: str = '') -> List[tuple]:
+        """章节各文档的 (uid, 文件名)，第一个文档保持 chapter_NNN.xhtml，后续为 chapter_NNN_partK.xhtml"""
+        base = f"{prefix}chapter_{index+1:03d}"
+        files = [(base, f"{base}.xhtml")]
+        files.extend((f"{base}_part{k}", f"{base}_part{k}.xhtml") for k in range(2, count + 1))
+        return files
+
+    def _build_metadata(self, volume_title: str) -> Dict:
+        """生成EPUB元数据（标识符和修改时间由小说和卷册确定，相同输入得到相同输出）"""
+        modified = datetime.fromtimestamp(Config.EPUB_BUILD_TIMESTAMP, timezone.utc)
+        return {
+            'identifier': f"urn:uuid:{uuid.uuid5(uuid.NAMESPACE_URL, f'{Config.NOVEL_URL}#{volume_title}')}",
+            'title': f"{Config.EPUB_TITLE} - {volume_title}",
+            'language': Config.EPUB_LANGUAGE,
+            'creator': Config.EPUB_AUTHOR,
+            'publisher': Config.EPUB_PUBLISHER,
+            'description': f"轻小说《{Config.EPUB_TITLE}》{volume_title}，作者：{Config.EPUB_AUTHOR}",
+            'modified': modified.strftime('%Y-%m-%dT%H:%M:%SZ')
+        }
+
     def _set_metadata(self, volume_title: str):
         """设置EPUB元数据"""
-        # 设置标识符
-        self.book.set_identifier(str(uuid.uuid4()))
-        
-        # 设置标题
-        full_title = f"{Config.EPUB_TITLE} - {volume_title}"
-        self.book.set_title(full_title)
-        
-        # 设置作者
-        self.book.add_author(Config.EPUB_AUTHOR)
-        
-        # 设置语言
-        self.book.set_language(Config.EPUB_LANGUAGE)
-        
-        # 设置出版商
-        self.book.add_metadata('DC', 'publisher', Config.EPUB_PUBLISHER)
-        
-        # 设置描述
-        description = f"轻小说《{Config.EPUB_TITLE}》{volume_title}，作者：{Config.EPUB_AUTHOR}"
-        self.book.add_metadata('DC', 'description', description)
+        metadata = self._build_metadata(volume_title)
+
+        self.book.set_identifier(metadata['identifier'])
+        self.book.set_title(metadata['title'])
+        self.book.add_author(metadata['creator'])
+        self.book.set_language(metadata['language'])
+        self.book.add_metadata('DC', 'publisher', metadata['publisher'])
+        self.book.add_metadata('DC', 'description', metadata['description'])
 
     def _add_styles(self):
         """添加CSS样式"""
@@ -94,7 +300,7 @@ class EPUBGenerator:
             uid="main_css",
             file_name="style/main.css",
             media_type="text/css",
-            content=EnhancedStyles.get_main_css()
+            content=self.assets.get('main_css')['data']
         )
         self.book.add_item(main_css)
 
@@ -103,45 +309,49 @@ class EPUBGenerator:
             uid="nav_css",
             file_name="style/nav.css",
             media_type="text/css",
-            content=EnhancedStyles.get_navigation_css()
+            content=self.assets.get('nav_css')['data']
         )
         self.book.add_item(nav_css)
     
-    def _add_chapters(self, chapters_data: List[Dict]) -> List[epub.EpubHtml]:
-        """添加章节到EPUB"""
+    def _add_chapters(self, chapters_data: List[Dict]) -> List[List['epub.EpubHtml']]:
+        """添加章节到EPUB，返回每章的文档列表（过长的章节切分为多个文档）"""
         epub_chapters = []
+        profile = Config.get_device_profile()
 
         for i, chapter_data in enumerate(chapters_data):
             chapter_title = chapter_data['title']
             chapter_content = chapter_data['content']
 
             # 检查章节内容是否为空
-            if not chapter_content or len(chapter_content.strip()) < 10:
+            rendered = chapter_data.get('rendered')
+            if rendered is None and (not chapter_content or len(chapter_content.strip()) < 10):
                 logger.warning(f"章节内容为空或过短，跳过: {chapter_title}")
                 continue
 
-            # 创建章节文件名
-            chapter_filename = f"chapter_{i+1:03d}.xhtml"
+            pages = self._chapter_pages(chapter_title, chapter_content, profile, rendered)
+            chapter_pages = []
+            for part, (uid, chapter_filename) in enumerate(self._chapter_files(i, len(pages))):
+                # 创建EPUB章节
+                chapter = epub.EpubHtml(
+                    uid=uid,
+                    title=chapter_title,
+                    file_name=chapter_filename,
+                    lang=Config.EPUB_LANGUAGE
+                )
 
-            # 创建EPUB章节
-            chapter = epub.EpubHtml(
-                title=chapter_title,
-                file_name=chapter_filename,
-                lang=Config.EPUB_LANGUAGE
-            )
+                # 设置章节内容
+                chapter.content = pages[part]
 
-            # 设置章节内容
-            html_content = self.content_processor.create_chapter_html(chapter_title, chapter_content)
-            chapter.content = html_content
+                # 添加CSS样式引用
+                chapter.add_item(self.book.get_item_with_id("main_css"))
 
-            # 添加CSS样式引用
-            chapter.add_item(self.book.get_item_with_id("main_css"))
+                # 添加到书籍
+                self.book.add_item(chapter)
+                chapter_pages.append(chapter)
 
-            # 添加到书籍
-            self.book.add_item(chapter)
-            epub_chapters.append(chapter)
+            epub_chapters.append(chapter_pages)
 
-            logger.debug(f"添加章节: {chapter_title} (内容长度: {len(chapter_content)})")
+            logger.debug("添加章节: %s (内容长度: %d)", chapter_title, len(chapter_content))
 
         return epub_chapters
     
@@ -174,14 +384,14 @@ class EPUBGenerator:
                     # 添加到映射
                     image_mapping[image_path] = epub_img_path
 
-                    logger.debug(f"添加图片: {img_filename}")
+                    logger.debug("添加图片: %s", img_filename)
 
                 except Exception as e:
                     logger.error(f"添加图片失败 {image_path}: {str(e)}")
 
         return image_mapping
 
-    def _create_illustration_pages(self, image_mapping: Dict[str, str], volume_title: str) -> List[epub.EpubHtml]:
+    def _create_illustration_pages(self, image_mapping: Dict[str, str], volume_title: str) -> List['epub.EpubHtml']:
         """创建插图页面"""
         illustration_chapters = []
 
@@ -221,7 +431,7 @@ class EPUBGenerator:
     
 
     
-    def _create_toc(self, chapters: List[epub.EpubHtml]):
+    def _create_toc(self, chapters: List['epub.EpubHtml']):
         """创建目录"""
         # 创建目录结构
         toc_items = []
@@ -230,7 +440,7 @@ class EPUBGenerator:
 
         self.book.toc = toc_items
     
-    def _add_navigation(self, chapters: List[epub.EpubHtml]):
+    def _add_navigation(self, chapters: List['epub.EpubHtml']):
         """添加导航文件"""
         # 添加NCX和导航文档
         self.book.add_item(epub.EpubNcx())
@@ -243,23 +453,28 @@ class EPUBGenerator:
 
         self.book.spine = spine_items
     
-    def _safe_filename(self, filename: str) -> str:
+    @staticmethod
+    def _safe_filename(filename: str) -> str:
         """生成安全的文件名"""
-        unsafe_chars = '<>:"/\\|?*'
-        for char in unsafe_chars:
-            filename = filename.replace(char, '_')
-        return filename.strip()
+        return safe_filename(filename)
     
-    def create_all_epubs(self, volumes_data: List[Dict]) -> List[str]:
-        """为所有卷册创建EPUB文件"""
-        epub_files = []
-        
-        for volume_data in volumes_data:
-            try:
-                epub_path = self.create_epub(volume_data)
-                epub_files.append(epub_path)
-            except Exception as e:
-                logger.error(f"EPUB生成失败 {volume_data['title']}: {str(e)}")
-        
+    def create_all_epubs(self, volumes_data: List[Dict], parallel: bool = False,
+                         force: bool = False) -> List[str]:
+        """为所有卷册创建EPUB文件（parallel为True时分发到进程池，输入未变化的卷册跳过）"""
+        from epub.batch_builder import ParallelEPUBBuilder, build_volume
+        from epub.build_manifest import BuildManifest
+
+        if parallel:
+            with ParallelEPUBBuilder(force=force) as builder:
+                results = builder.build_volumes(volumes_data)
+        else:
+            results = []
+            for volume_data in volumes_data:
+                result = build_volume(volume_data, force)
+                ParallelEPUBBuilder.log_result(result)
+                results.append(result)
+            BuildManifest().record_results(results)
+
+        epub_files = [result['path'] for result in results if not result['error']]
         logger.info(f"共生成 {len(epub_files)} 个EPUB文件")
         return epub_files
@@ -0,0 +1,378 @@
+"""
+流式EPUB写入模块
+Streaming EPUB writer - entries go straight into the zip as they are produced
+"""
+
+import os
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
+from html import escape as _escape_html
+
+from utils.config import Config
+from epub.zip_writer import ZIP_DEFLATED, ZIP_STORED, ZipWriter, deflate
+
+CONTAINER_XML = """<?xml version="1.0" encoding="utf-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="EPUB/content.opf" media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>
+"""
+
+XML_DECLARATION = '<?xml version="1.0" encoding="utf-8"?>\n'
+
+# 图片扩展名对应的媒体类型
+IMAGE_MEDIA_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp',
+    '.svg': 'image/svg+xml',
+}
+
+def escape(text: str) -> str:
+    """转义XML文本中的 & < >（与xml.sax.saxutils.escape相同，但不导入urllib）"""
+    return _escape_html(text, quote=False)
+
+class StreamingEPUBWriter:
+    """流式EPUB写入器
+
+    mimetype和container在打开时写入，章节和图片在生成时立即写入zip，
+    只在内存中保留清单信息，OPF、导航文档和NCX在关闭时写入。
+    文本条目在线程池中并行压缩，按提交顺序写入；已压缩的媒体直接存储。
+
+    指定base_path（同一卷册之前生成的EPUB）时进行增量更新：内容未变化的条目
+    从旧文件原样复制压缩数据，只有变化的章节和OPF、导航文档、NCX重新生成。
+    图片只按名称和大小判断，调用方需确认图片输入未变化。
+    """
+
+    ROOT = 'EPUB/'
+
+    def __init__(self, output_path: str, metadata: Dict, compresslevel: Optional[int] = None,
+                 compress_workers: Optional[int] = None, base_path: Optional[str] = None):
+        self.output_path = output_path
+        self.metadata = metadata
+        self.compresslevel = Config.EPUB_COMPRESSLEVEL if compresslevel is None else compresslevel
+
+        workers = Config.EPUB_COMPRESS_WORKERS if compress_workers is None else compress_workers
+        self.compress_workers = workers or os.cpu_count() or 1
+        self._pool: Optional[ThreadPoolExecutor] = None
+        # 等待写入的条目，保证写入顺序与提交顺序一致
+        self._pending = deque()
+        self._max_pending = self.compress_workers * 2
+
+        self.manifest: List[Dict] = []
+        self.spine: List[str] = []
+        self.toc: List[Dict] = []
+
+        self.base_path = base_path
+        self._base_entries: Dict[str, zipfile.ZipInfo] = {}
+        self._base_file = None
+        # 写入统计：复用的条目和新写入的条目
+        self.stats = {'reused': 0, 'reused_bytes': 0, 'written': 0, 'written_bytes': 0}
+
+        self._tmp_path = output_path + '.part'
+        self._file = None
+        self.zip: Optional[ZipWriter] = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def open(self):
+        """创建临时文件并写入mimetype和container"""
+        os.makedirs(os.path.dirname(self.output_path) or '.', exist_ok=True)
+        self._file = open(self._tmp_path, 'wb')
+        self.zip = ZipWriter(self._file, self.compresslevel, Config.EPUB_BUILD_TIMESTAMP)
+        if self.compress_workers > 1:
+            self._pool = ThreadPoolExecutor(self.compress_workers, thread_name_prefix='epub-deflate')
+        if self.base_path:
+            with zipfile.ZipFile(self.base_path) as base:
+                self._base_entries = {info.filename: info for info in base.infolist()}
+            self._base_file = open(self.base_path, 'rb')
+
+        # mimetype必须是第一个条目且不压缩
+        self.zip.write_bytes('mimetype', b'application/epub+zip', compress=False)
+        self.zip.write_bytes('META-INF/container.xml', CONTAINER_XML.encode('utf-8'))
+
+    def add_item(self, uid: str, href: str, media_type: str, content: Union[str, bytes],
+                 properties: Optional[str] = None, compress: bool = True):
+        """写入任意条目"""
+        data = content.encode('utf-8') if isinstance(content, str) else content
+        compress = compress and self.is_compressible(media_type)
+        name = self.ROOT + href
+        base = self._base_entries.get(name)
+
+        if base and self._same_entry(base, compress, len(data)) and base.CRC == zlib.crc32(data):
+            self._pending.append(('raw', name, base))
+        elif compress and self._pool:
+            future = self._pool.submit(deflate, data, self.compresslevel)
+            self._pending.append(('deflate', name, future))
+        else:
+            self._pending.append(('bytes', name, data, compress))
+        self._drain()
+
+        self._register(uid, href, media_type, properties)
+
+    def add_css(self, uid: str, href: str, content: Union[str, bytes]):
+        """写入CSS样式表"""
+        self.add_item(uid, href, 'text/css', content)
+
+    def add_precompressed(self, uid: str, href: str, media_type: str, payload: bytes, crc: int, size: int):
+        """写入已预先deflate的条目（如共享资源包），不再重新压缩"""
+        name = self.ROOT + href
+        base = self._base_entries.get(name)
+
+        if base and self._same_entry(base, True, size) and base.CRC == crc:
+            self._pending.append(('raw', name, base))
+        else:
+            self._pending.append(('compressed', name, payload, crc, size))
+        self._drain()
+        self._register(uid, href, media_type)
+
+    def add_document(self, uid: str, href: str, content: Union[str, bytes],
+                     title: Optional[str] = None, in_spine: bool = True):
+        """写入XHTML文档，带标题时同时加入目录"""
+        if isinstance(content, str):
+            if not content.startswith('<?xml'):
+                content = XML_DECLARATION + content
+            content = content.encode('utf-8')
+
+        self.add_item(uid, href, 'application/xhtml+xml', content)
+        if in_spine:
+            self.spine.append(uid)
+        if title is not None:
+            self.toc.append({'title': title, 'href': href, 'children': []})
+
+    def add_image(self, uid: str, href: str, path: str, media_type: Optional[str] = None):
+        """从磁盘分块写入图片"""
+        if media_type is None:
+            media_type = self.image_media_type(path)
+        name = self.ROOT + href
+        compress = self.is_compressible(media_type)
+        base = self._base_entries.get(name)
+
+        if base and self._same_entry(base, compress, os.path.getsize(path)):
+            self._pending.append(('raw', name, base))
+        else:
+            self._pending.append(('file', name, path, compress))
+        self._drain()
+        self._register(uid, href, media_type)
+
+    @staticmethod
+    def is_compressible(media_type: str) -> bool:
+        """已压缩的媒体（JPEG/PNG等）不再deflate"""
+        return media_type not in Config.EPUB_STORED_MEDIA_TYPES
+
+    @staticmethod
+    def _same_entry(info: zipfile.ZipInfo, compress: bool, size: int) -> bool:
+        """旧条目的压缩方式和原始大小与新内容一致"""
+        return info.compress_type == (ZIP_DEFLATED if compress else ZIP_STORED) and info.file_size == size
+
+    def _drain(self, wait: bool = False):
+        """按提交顺序写出已就绪的条目；队列过长或wait为True时等待队首完成"""
+        while self._pending:
+            head = self._pending[0]
+            if (head[0] == 'deflate' and not head[2].done()
+                    and not wait and len(self._pending) <= self._max_pending):
+                break
+            self._pending.popleft()
+
+            kind, name = head[0], head[1]
+            if kind == 'raw':
+                entry = self.zip.copy_entry(name, self._base_file, head[2])
+            elif kind == 'deflate':
+                payload, crc, size = head[2].result()
+                entry = self.zip.write_compressed(name, payload, crc, size)
+            elif kind == 'compressed':
+                entry = self.zip.write_compressed(name, head[2], head[3], head[4])
+            elif kind == 'bytes':
+                entry = self.zip.write_bytes(name, head[2], compress=head[3])
+            else:
+                entry = self.zip.write_file(name, head[2], compress=head[3])
+
+            prefix = 'reused' if kind == 'raw' else 'written'
+            self.stats[prefix] += 1
+            self.stats[prefix + '_bytes'] += entry.compressed_size
+
+    @staticmethod
+    def image_media_type(path: str) -> str:
+        """根据扩展名推断图片媒体类型"""
+        return IMAGE_MEDIA_TYPES.get(os.path.splitext(path)[1].lower(), 'image/jpeg')
+
+    def set_toc(self, toc: List[Dict]):
+        """设置（可嵌套的）目录：[{'title', 'href', 'children': [...]}]"""
+        self.toc = toc
+
+    def size_report(self) -> Dict[str, int]:
+        """按类别统计已写入条目的压缩后字节数（关闭后调用）"""
+        media_types = {self.ROOT + item['href']: item['media_type'] for item in self.manifest}
+        report = {'text': 0, 'images': 0, 'styles': 0, 'other': 0}
+        for entry in self.zip.entries:
+            media_type = media_types.get(entry.name, '')
+            if media_type == 'application/xhtml+xml':
+                category = 'text'
+            elif media_type.startswith('image/'):
+                category = 'images'
+            elif media_type == 'text/css':
+                category = 'styles'
+            else:
+                category = 'other'
+            report[category] += entry.compressed_size
+        report['total'] = sum(report.values())
+        return report
+
+    def _register(self, uid: str, href: str, media_type: str, properties: Optional[str] = None):
+        """记录清单条目"""
+        self.manifest.append({
+            'id': uid,
+            'href': href,
+            'media_type': media_type,
+            'properties': properties
+        })
+
+    def close(self):
+        """写入导航文档、NCX和OPF，并完成文件"""
+        self.add_item('nav', 'nav.xhtml', 'application/xhtml+xml', self._build_nav(), properties='nav')
+        self.spine.insert(0, 'nav')
+        self.add_item('ncx', 'toc.ncx', 'application/x-dtbncx+xml', self._build_ncx())
+        self._pending.append(('bytes', self.ROOT + 'content.opf', self._build_opf().encode('utf-8'), True))
+        self._drain(wait=True)
+
+        self._shutdown_pool()
+        self._close_base()
+        self.zip.close()
+        self._file.close()
+        os.replace(self._tmp_path, self.output_path)
+
+    def _shutdown_pool(self):
+        """关闭压缩线程池"""
+        if self._pool:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def _close_base(self):
+        """关闭增量更新的源文件（替换输出文件之前）"""
+        if self._base_file:
+            self._base_file.close()
+            self._base_file = None
+
+    def abort(self):
+        """放弃写入并删除临时文件"""
+        self._pending.clear()
+        self._shutdown_pool()
+        self._close_base()
+        if self._file and not self._file.closed:
+            self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def _build_opf(self) -> str:
+        """生成OPF包文件"""
+        meta = self.metadata
+        lines = [
+            XML_DECLARATION.rstrip(),
+            f'<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="id" '
+            f'xml:lang="{escape(meta["language"])}">',
+            '  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">',
+            f'    <dc:identifier id="id">{escape(meta["identifier"])}</dc:identifier>',
+            f'    <dc:title>{escape(meta["title"])}</dc:title>',
+            f'    <dc:language>{escape(meta["language"])}</dc:language>',
+        ]
+        for key in ('creator', 'publisher', 'description'):
+            if meta.get(key):
+                lines.append(f'    <dc:{key}>{escape(meta[key])}</dc:{key}>')
+        lines.append(f'    <meta property="dcterms:modified">{escape(meta["modified"])}</meta>')
+        lines.append('  </metadata>')
+
+        lines.append('  <manifest>')
+        for item in self.manifest:
+            properties = f' properties="{item["properties"]}"' if item['properties'] else ''
+            lines.append(f'    <item id="{escape(item["id"])}" href="{escape(item["href"])}" '
+                         f'media-type="{item["media_type"]}"{properties}/>')
+        lines.append('  </manifest>')
+
+        lines.append('  <spine toc="ncx">')
+        for uid in self.spine:
+            lines.append(f'    <itemref idref="{escape(uid)}"/>')
+        lines.append('  </spine>')
+        lines.append('</package>')
+        return '\n'.join(lines) + '\n'
+
+    def _build_nav(self) -> str:
+        """生成EPUB3导航文档"""
+        title = escape(self.metadata['title'])
+        language = escape(self.metadata['language'])
+        stylesheet = ''
+        if any(item['href'] == 'style/nav.css' for item in self.manifest):
+            stylesheet = '  <link rel="stylesheet" type="text/css" href="style/nav.css"/>\n'
+        return (
+            f'{XML_DECLARATION}<!DOCTYPE html>\n'
+            f'<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" '
+            f'lang="{language}" xml:lang="{language}">\n'
+            f'<head>\n  <title>{title}</title>\n'
+            f'{stylesheet}</head>\n'
+            f'<body>\n  <nav epub:type="toc" id="toc">\n    <h1>{title}</h1>\n'
+            f'{self._nav_list(self.toc, 4)}'
+            f'  </nav>\n</body>\n</html>\n'
+        )
+
+    def _nav_list(self, entries: List[Dict], indent: int) -> str:
+        """生成嵌套的导航列表"""
+        pad = ' ' * indent
+        parts = [f'{pad}<ol>\n']
+        for entry in entries:
+            parts.append(f'{pad}  <li><a href="{escape(entry["href"])}">{escape(entry["title"])}</a>')
+            if entry.get('children'):
+                parts.append('\n' + self._nav_list(entry['children'], indent + 4) + f'{pad}  ')
+            parts.append('</li>\n')
+        parts.append(f'{pad}</ol>\n')
+        return ''.join(parts)
+
+    def _build_ncx(self) -> str:
+        """生成NCX目录（兼容EPUB2阅读器）"""
+        counter = [0]
+
+        def nav_points(entries: List[Dict], indent: int) -> str:
+            pad = ' ' * indent
+            parts = []
+            for entry in entries:
+                counter[0] += 1
+                parts.append(
+                    f'{pad}<navPoint id="navpoint-{counter[0]}">\n'
+                    f'{pad}  <navLabel><text>{escape(entry["title"])}</text></navLabel>\n'
+                    f'{pad}  <content src="{escape(entry["href"])}"/>\n'
+                )
+                if entry.get('children'):
+                    parts.append(nav_points(entry['children'], indent + 2))
+                parts.append(f'{pad}</navPoint>\n')
+            return ''.join(parts)
+
+        points = nav_points(self.toc, 4)
+        return (
+            f'{XML_DECLARATION}<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">\n'
+            f'  <head>\n'
+            f'    <meta name="dtb:uid" content="{escape(self.metadata["identifier"])}"/>\n'
+            f'    <meta name="dtb:depth" content="{self._toc_depth(self.toc)}"/>\n'
+            f'    <meta name="dtb:totalPageCount" content="0"/>\n'
+            f'    <meta name="dtb:maxPageNumber" content="0"/>\n'
+            f'  </head>\n'
+            f'  <docTitle><text>{escape(self.metadata["title"])}</text></docTitle>\n'
+            f'  <navMap>\n{points}  </navMap>\n</ncx>\n'
+        )
+
+    def _toc_depth(self, entries: List[Dict]) -> int:
+        """目录嵌套深度"""
+        if not entries:
+            return 1
+        return 1 + max((self._toc_depth(e['children']) if e.get('children') else 0) for e in entries)
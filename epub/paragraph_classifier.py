@@ -0,0 +1,189 @@
+"""
+段落分类引擎模块
+Paragraph classification engine - compiled single-pass scanner
+"""
+
+import re
+from typing import Dict, List, Sequence, Tuple
+
+# 强调规则：(类型, 模式, 起始标记长度, 结束标记长度)
+EMPHASIS_RULES = [
+    ('bold', r'\*\*[^*]+\*\*', 2, 2),        # **粗体**
+    ('bold', r'__[^_]+__', 2, 2),            # __粗体__
+    ('italic', r'\*[^*]+\*', 1, 1),          # *斜体*
+    ('italic', r'_[^_]+_', 1, 1),            # _斜体_
+    ('book', r'《[^》]+》', 1, 1),            # 《书名》
+    ('special', r'【[^】]+】', 1, 1),          # 【特殊强调】
+]
+
+# 强调类型对应的HTML标签
+EMPHASIS_TAGS = {
+    'bold': ('<strong>', '</strong>'),
+    'italic': ('<em>', '</em>'),
+    'book': ('<em class="book-title">《', '》</em>'),
+    'special': ('<strong class="special">', '</strong>'),
+}
+
+# 段落类型优先级（数值越小优先级越高）
+TYPE_RANK = {'dialogue': 0, 'thought': 1, 'narrator': 2}
+RANK_TYPE = {rank: name for name, rank in TYPE_RANK.items()}
+
+# 批量扫描时的段落分隔符（不会出现在正文中）
+SEPARATOR = '\x00'
+
+# 强调片段：(起点, 终点, 类型, 内容起点, 内容终点)
+Span = Tuple[int, int, str, int, int]
+
+class ParagraphClassifier:
+    """段落分类器：所有规则预编译并按起始字符分派，一次扫描得到段落类型和强调片段"""
+
+    def __init__(self, dialogue_patterns: Sequence[str], thought_patterns: Sequence[str],
+                 narrator_patterns: Sequence[str], subtitle_patterns: Sequence[str]):
+        # 起始字符 → [(预编译规则, 规则信息)]，规则信息为 ('type', 优先级)
+        # 或 ('emphasis', 类型, 起始标记长度, 结束标记长度)
+        self._rules: Dict[str, List[Tuple]] = {}
+
+        for category, patterns in (('dialogue', dialogue_patterns),
+                                   ('thought', thought_patterns),
+                                   ('narrator', narrator_patterns)):
+            for pattern in patterns:
+                self._add_rule(pattern, ('type', TYPE_RANK[category]))
+
+        for kind, pattern, open_len, close_len in EMPHASIS_RULES:
+            self._add_rule(pattern, ('emphasis', kind, open_len, close_len))
+
+        # 所有规则起始字符组成的字符集，用于快速定位候选位置
+        self._trigger = re.compile('[' + ''.join(re.escape(char) for char in self._rules) + ']')
+        self._subtitle = re.compile('|'.join(f"(?:{pattern})" for pattern in subtitle_patterns))
+
+    def _add_rule(self, pattern: str, info: Tuple):
+        """按起始字符登记规则"""
+        self._rules.setdefault(self._leading_char(pattern), []).append((re.compile(pattern), info))
+
+    @staticmethod
+    def _leading_char(pattern: str) -> str:
+        """规则的起始字面字符"""
+        if len(pattern) > 1 and pattern[0] == '\\' and not pattern[1].isalnum():
+            return pattern[1]
+        if pattern and pattern[0] not in '.^$*+?{}[]\\|()':
+            return pattern[0]
+        raise ValueError(f"分类规则必须以字面字符开头: {pattern}")
+
+    def _scan_batch(self, paragraphs: Sequence[str], with_types: bool = True) -> Tuple[list, list]:
+        """整章只扫描一次，返回每段最高优先级的类型和互不重叠的强调片段"""
+        count = len(paragraphs)
+        ranks = [None] * count
+        spans: List[List[Span]] = [None] * count
+        if not count:
+            return ranks, spans
+
+        text = SEPARATOR.join(paragraphs)
+        rules = self._rules
+        index = 0
+        para_start = 0
+        para_end = len(paragraphs[0])
+        emphasis_end = 0
+
+        # 同一位置按规则顺序取第一个匹配，与合并的正则交替式语义一致；
+        # 类型规则检查每个候选起点，强调片段则与从左到右的替换一样互不重叠；
+        # 所有匹配都以段落结尾为界，不会跨段
+        for trigger in self._trigger.finditer(text):
+            start = trigger.start()
+            while start > para_end:
+                index += 1
+                para_start = para_end + 1
+                para_end = para_start + len(paragraphs[index])
+                emphasis_end = 0
+
+            for pattern, info in rules[text[start]]:
+                if info[0] == 'type':
+                    if not with_types:
+                        continue
+                    if pattern.match(text, start, para_end):
+                        rank = ranks[index]
+                        if rank is None or info[1] < rank:
+                            ranks[index] = info[1]
+                        break
+                elif start >= emphasis_end:
+                    match = pattern.match(text, start, para_end)
+                    if match:
+                        end = match.end()
+                        local = start - para_start
+                        span = (local, end - para_start, info[1], local + info[2], end - para_start - info[3])
+                        if spans[index] is None:
+                            spans[index] = [span]
+                        else:
+                            spans[index].append(span)
+                        emphasis_end = end
+                        break
+
+        return ranks, spans
+
+    def classify(self, paragraph: str) -> Tuple[str, List[Span]]:
+        """一次扫描返回段落类型和强调片段"""
+        return self.classify_batch([paragraph])[0]
+
+    def classify_batch(self, paragraphs: Sequence[str]) -> List[Tuple[str, List[Span]]]:
+        """批量分类一章的所有段落"""
+        ranks, spans = self._scan_batch(paragraphs)
+        subtitle = self._subtitle.match
+        results = []
+
+        for paragraph, rank, para_spans in zip(paragraphs, ranks, spans):
+            if len(paragraph) <= 50 and subtitle(paragraph):
+                para_type = 'title'
+            elif rank is None:
+                para_type = 'normal'
+            else:
+                para_type = RANK_TYPE[rank]
+            results.append((para_type, para_spans or []))
+
+        return results
+
+    def render_batch(self, paragraphs: Sequence[str]) -> List[Tuple[str, str]]:
+        """批量分类并生成每段的 (类型, HTML内容)"""
+        classified = self.classify_batch(paragraphs)
+
+        # 无强调片段的段落整章一次转义
+        escaped = escape_html(SEPARATOR.join(paragraphs)).split(SEPARATOR)
+        if len(escaped) != len(paragraphs):
+            escaped = [escape_html(paragraph) for paragraph in paragraphs]
+
+        return [
+            (para_type, self.render(paragraph, spans) if spans else html)
+            for paragraph, html, (para_type, spans) in zip(paragraphs, escaped, classified)
+        ]
+
+    def render(self, text: str, spans: List[Span], escape: bool = True) -> str:
+        """按强调片段生成HTML，其余文本按需转义"""
+        if not spans:
+            return escape_html(text) if escape else text
+
+        parts = []
+        pos = 0
+        for start, end, kind, inner_start, inner_end in spans:
+            if start > pos:
+                parts.append(escape_html(text[pos:start]) if escape else text[pos:start])
+            open_tag, close_tag = EMPHASIS_TAGS[kind]
+            parts.append(open_tag)
+            parts.append(self.render_emphasis(text[inner_start:inner_end], escape))
+            parts.append(close_tag)
+            pos = end
+
+        if pos < len(text):
+            parts.append(escape_html(text[pos:]) if escape else text[pos:])
+        return ''.join(parts)
+
+    def render_emphasis(self, text: str, escape: bool = True) -> str:
+        """仅处理强调格式（用于嵌套内容）"""
+        return self.render(text, self._scan_batch([text], with_types=False)[1][0] or [], escape)
+
+def escape_html(text: str) -> str:
+    """转义HTML特殊字符"""
+    if not text:
+        return ""
+    return (text.replace('&', '&amp;')
+                .replace('<', '&lt;')
+                .replace('>', '&gt;')
+                .replace('"', '&quot;')
+                .replace("'", '&#x27;'))
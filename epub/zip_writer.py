@@ -0,0 +1,216 @@
+"""
+ZIP写入模块
+Minimal streaming ZIP writer used by the EPUB packagers
+"""
+
+import os
+import struct
+import time
+import zipfile
+import zlib
+from typing import BinaryIO, List, Optional, Tuple
+
+# ZIP格式常量
+_LOCAL_HEADER = struct.Struct('<4sHHHHHIIIHH')
+_CENTRAL_HEADER = struct.Struct('<4sHHHHHHIIIHHHHHII')
+_END_RECORD = struct.Struct('<4sHHHHIIH')
+_LOCAL_SIGNATURE = b'PK\x03\x04'
+_CENTRAL_SIGNATURE = b'PK\x01\x02'
+_END_SIGNATURE = b'PK\x05\x06'
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+
+_VERSION = 20           # 2.0: deflate
+_FLAG_UTF8 = 0x800      # 文件名为UTF-8
+_ZIP32_LIMIT = 0xFFFFFFFF
+_CHUNK_SIZE = 1024 * 1024
+
+def deflate(data: bytes, level: int) -> Tuple[bytes, int, int]:
+    """生成ZIP使用的原始deflate流，返回 (压缩数据, CRC32, 原始大小)
+
+    zlib在压缩和计算CRC时释放GIL，可在线程池中并行调用。
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(), zlib.crc32(data), len(data)
+
+class ZipEntry:
+    """已写入条目的中央目录信息"""
+
+    __slots__ = ('name', 'method', 'crc', 'compressed_size', 'size', 'offset', 'dos_time', 'dos_date')
+
+    def __init__(self, name: str, method: int, dos_time: int, dos_date: int):
+        self.name = name
+        self.method = method
+        self.dos_time = dos_time
+        self.dos_date = dos_date
+        self.crc = 0
+        self.compressed_size = 0
+        self.size = 0
+        self.offset = 0
+
+class ZipWriter:
+    """顺序写入ZIP条目，内存占用与单个数据块大小相当"""
+
+    def __init__(self, fileobj: BinaryIO, compresslevel: int = 6, timestamp: Optional[float] = None):
+        self.fp = fileobj
+        self.compresslevel = compresslevel
+        # 指定时间戳时所有条目使用同一UTC时间，输出与构建时间无关
+        self.timestamp = timestamp
+        self.entries: List[ZipEntry] = []
+        self._names = set()
+        self._closed = False
+
+    def _dos_datetime(self):
+        """DOS格式的时间和日期"""
+        t = time.localtime() if self.timestamp is None else time.gmtime(self.timestamp)
+        year = max(t.tm_year, 1980)
+        dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+        dos_date = ((year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+        return dos_time, dos_date
+
+    def _new_entry(self, name: str, method: int) -> ZipEntry:
+        """在当前位置创建新条目"""
+        if self._closed:
+            raise ValueError("ZIP已关闭")
+        if name in self._names:
+            raise ValueError(f"重复的ZIP条目: {name}")
+        self._names.add(name)
+
+        entry = ZipEntry(name, method, *self._dos_datetime())
+        entry.offset = self.fp.tell()
+        return entry
+
+    def _begin_entry(self, name: str, method: int) -> ZipEntry:
+        """写入本地文件头（大小和CRC待回填）"""
+        entry = self._new_entry(name, method)
+        self._write_local_header(entry)
+        return entry
+
+    def _write_local_header(self, entry: ZipEntry):
+        """写入本地文件头"""
+        name = entry.name.encode('utf-8')
+        self.fp.write(_LOCAL_HEADER.pack(
+            _LOCAL_SIGNATURE, _VERSION, _FLAG_UTF8, entry.method,
+            entry.dos_time, entry.dos_date, entry.crc,
+            entry.compressed_size, entry.size, len(name), 0
+        ))
+        self.fp.write(name)
+
+    def _finish_entry(self, entry: ZipEntry, patch_header: bool = True):
+        """回填本地文件头中的CRC和大小"""
+        if entry.compressed_size > _ZIP32_LIMIT or entry.size > _ZIP32_LIMIT or entry.offset > _ZIP32_LIMIT:
+            raise ValueError(f"ZIP条目超过4GB限制: {entry.name}")
+
+        if patch_header:
+            end = self.fp.tell()
+            self.fp.seek(entry.offset)
+            self._write_local_header(entry)
+            self.fp.seek(end)
+        self.entries.append(entry)
+
+    def write_bytes(self, name: str, data: bytes, compress: bool = True) -> ZipEntry:
+        """写入内存中的数据"""
+        if compress:
+            payload, crc, size = deflate(data, self.compresslevel)
+            return self.write_compressed(name, payload, crc, size)
+        return self.write_compressed(name, data, zlib.crc32(data), len(data), ZIP_STORED)
+
+    def write_compressed(self, name: str, payload: bytes, crc: int, size: int,
+                         method: int = ZIP_DEFLATED) -> ZipEntry:
+        """写入已压缩（或按原样存储）的数据，CRC和大小由调用方提供"""
+        entry = self._new_entry(name, method)
+        entry.crc = crc
+        entry.size = size
+        entry.compressed_size = len(payload)
+
+        self._write_local_header(entry)
+        self.fp.write(payload)
+        self._finish_entry(entry, patch_header=False)
+        return entry
+
+    def copy_entry(self, name: str, source: BinaryIO, info: zipfile.ZipInfo) -> ZipEntry:
+        """从另一个ZIP原样复制已压缩的条目数据，不解压也不重新压缩"""
+        if info.compress_type not in (ZIP_STORED, ZIP_DEFLATED):
+            raise ValueError(f"不支持的压缩方式 {info.compress_type}: {info.filename}")
+
+        entry = self._new_entry(name, info.compress_type)
+        entry.crc = info.CRC
+        entry.size = info.file_size
+        entry.compressed_size = info.compress_size
+        self._write_local_header(entry)
+
+        # 跳过源条目的本地文件头（文件名和扩展字段长度以本地头为准）
+        source.seek(info.header_offset)
+        fields = _LOCAL_HEADER.unpack(source.read(_LOCAL_HEADER.size))
+        if fields[0] != _LOCAL_SIGNATURE:
+            raise ValueError(f"无效的本地文件头: {info.filename}")
+        source.seek(fields[9] + fields[10], os.SEEK_CUR)
+
+        remaining = info.compress_size
+        while remaining:
+            chunk = source.read(min(_CHUNK_SIZE, remaining))
+            if not chunk:
+                raise ValueError(f"源ZIP条目数据不完整: {info.filename}")
+            self.fp.write(chunk)
+            remaining -= len(chunk)
+
+        self._finish_entry(entry, patch_header=False)
+        return entry
+
+    def write_file(self, name: str, path: str, compress: bool = True) -> ZipEntry:
+        """分块写入磁盘文件，不整体读入内存"""
+        entry = self._begin_entry(name, ZIP_DEFLATED if compress else ZIP_STORED)
+        compressor = zlib.compressobj(self.compresslevel, zlib.DEFLATED, -15) if compress else None
+        crc = 0
+        size = 0
+        compressed_size = 0
+
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(_CHUNK_SIZE)
+                if not chunk:
+                    break
+                crc = zlib.crc32(chunk, crc)
+                size += len(chunk)
+                if compressor:
+                    chunk = compressor.compress(chunk)
+                self.fp.write(chunk)
+                compressed_size += len(chunk)
+
+        if compressor:
+            tail = compressor.flush()
+            self.fp.write(tail)
+            compressed_size += len(tail)
+
+        entry.crc = crc
+        entry.size = size
+        entry.compressed_size = compressed_size
+        self._finish_entry(entry)
+        return entry
+
+    def close(self):
+        """写入中央目录和结束记录"""
+        if self._closed:
+            return
+
+        directory_offset = self.fp.tell()
+        for entry in self.entries:
+            name = entry.name.encode('utf-8')
+            self.fp.write(_CENTRAL_HEADER.pack(
+                _CENTRAL_SIGNATURE, _VERSION, _VERSION, _FLAG_UTF8, entry.method,
+                entry.dos_time, entry.dos_date, entry.crc,
+                entry.compressed_size, entry.size, len(name),
+                0, 0, 0, 0, 0, entry.offset
+            ))
+            self.fp.write(name)
+        directory_size = self.fp.tell() - directory_offset
+
+        if len(self.entries) > 0xFFFF or directory_offset > _ZIP32_LIMIT:
+            raise ValueError("ZIP条目数量或大小超过限制")
+
+        self.fp.write(_END_RECORD.pack(
+            _END_SIGNATURE, 0, 0, len(self.entries), len(self.entries),
+            directory_size, directory_offset, 0
+        ))
+        self._closed = True
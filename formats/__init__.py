@@ -0,0 +1 @@
+# Formats package
@@ -0,0 +1,57 @@
+"""
+格式无关的中间文档模块
+Format-neutral intermediate document built from one processing pass
+"""
+
+import os
+from typing import Dict, Optional
+
+from epub.content_processor import ContentProcessor
+
+def build_document(volume_data: Dict, processor: Optional[ContentProcessor] = None) -> Dict:
+    """处理卷册数据，生成各输出格式共用的中间文档
+
+    结构:
+        {'title', 'images': [本地路径],
+         'chapters': [{'title', 'paragraphs': [{'type', 'text', 'html'}] 或 None}]}
+
+    段落类型和带强调标记的HTML由ContentProcessor一次算出；内容为空或过短的
+    章节paragraphs为None（各格式都跳过，但保留位置以保证EPUB文件编号不变）。
+    """
+    processor = processor or ContentProcessor()
+    chapters = []
+
+    for chapter_data in volume_data['chapters']:
+        content = chapter_data['content']
+        if not content or len(content.strip()) < 10:
+            chapters.append({'title': chapter_data['title'], 'paragraphs': None})
+            continue
+
+        chapters.append({
+            'title': chapter_data['title'],
+            'paragraphs': [
+                {'type': para_type, 'text': text, 'html': html}
+                for para_type, text, html in processor.process_paragraphs(content)
+            ],
+        })
+
+    return {
+        'title': volume_data['title'],
+        'images': [path for path in volume_data['images'] if os.path.exists(path)],
+        'chapters': chapters,
+    }
+
+def to_volume_data(document: Dict) -> Dict:
+    """转换为EPUBGenerator使用的卷册数据，章节带已生成的段落HTML，不再重复处理"""
+    templates = ContentProcessor.PARAGRAPH_TEMPLATES
+    chapters = []
+    for chapter in document['chapters']:
+        if chapter['paragraphs'] is None:
+            chapters.append({'title': chapter['title'], 'content': ''})
+        else:
+            chapters.append({
+                'title': chapter['title'],
+                'content': '',
+                'rendered': [templates[p['type']].format(p['html']) for p in chapter['paragraphs']],
+            })
+    return {'title': document['title'], 'images': document['images'], 'chapters': chapters}
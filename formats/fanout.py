@@ -0,0 +1,68 @@
+"""
+多格式并行输出模块
+Multi-format fan-out - one processing pass, all writers run concurrently
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+from utils.config import Config
+from utils.logger import logger
+from epub.build_manifest import BuildManifest, file_sha256, output_key, volume_inputs
+from formats.document import build_document
+from formats.writers import WRITERS
+
+class FormatFanout:
+    """从同一份中间文档并行写出多种格式，按输入哈希缓存
+
+    所有格式都已是最新时不做任何处理；否则只处理一次正文，再由各格式的
+    写入函数在线程池中同时写出。某个格式写入失败只记录在该格式的结果中，
+    不影响其他格式。构建清单只读，结果由调用方记录。
+    """
+
+    def __init__(self, formats: Optional[Iterable[str]] = None, force: bool = False):
+        self.formats = list(formats or Config.OUTPUT_FORMATS)
+        unknown = [fmt for fmt in self.formats if fmt not in WRITERS]
+        if unknown:
+            raise ValueError(f"不支持的输出格式: {', '.join(unknown)}")
+        self.force = force
+
+    def run(self, volume_data: Dict, inputs: Optional[Dict[str, str]] = None) -> Dict[str, Dict]:
+        """生成所有格式，返回 {格式: {'path', 'sha256', 'skipped', 'error'}}"""
+        title = volume_data['title']
+        inputs = inputs or volume_inputs(volume_data)
+        manifest = BuildManifest()
+
+        outputs = {}
+        pending = []
+        for fmt in self.formats:
+            key = output_key(title, fmt)
+            if not self.force and manifest.is_current(key, inputs):
+                outputs[fmt] = {'path': manifest.get(key)['output']['path'], 'sha256': None, 'skipped': True,
+                                'error': None}
+            else:
+                pending.append(fmt)
+
+        if not pending:
+            logger.info(f"所有格式均未变化，跳过: {title}")
+            return outputs
+
+        # 一次处理，多处写出
+        document = build_document(volume_data)
+        base_path = None
+        if 'epub' in pending and not self.force:
+            base_path = manifest.patch_base(output_key(title, 'epub'), inputs)
+
+        with ThreadPoolExecutor(len(pending), thread_name_prefix='format-writer') as pool:
+            futures = {fmt: pool.submit(WRITERS[fmt], document, base_path) for fmt in pending}
+
+        for fmt, future in futures.items():
+            try:
+                path = future.result()
+                outputs[fmt] = {'path': path, 'sha256': file_sha256(path), 'skipped': False, 'error': None}
+                logger.info(f"{fmt} 输出完成: {path}")
+            except Exception as e:
+                outputs[fmt] = {'path': None, 'sha256': None, 'skipped': False, 'error': str(e)}
+                logger.error(f"{fmt} 输出失败 {title}: {str(e)}")
+
+        return {fmt: outputs[fmt] for fmt in self.formats}
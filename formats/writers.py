@@ -0,0 +1,101 @@
+"""
+输出格式写入模块
+Output format writers - EPUB, single-file HTML, Markdown and plain TXT
+"""
+
+import base64
+import os
+from typing import Callable, Dict, Optional
+
+from utils.config import Config
+from epub.asset_bundle import AssetBundle
+from epub.content_processor import ContentProcessor
+from epub.epub_generator import EPUBGenerator, safe_filename
+from epub.paragraph_classifier import escape_html as escape
+from epub.epub_writer import StreamingEPUBWriter
+from formats.document import to_volume_data
+
+def _output_path(document: Dict, extension: str) -> str:
+    """与EPUB相同命名规则的输出路径"""
+    return Config.get_output_path(safe_filename(document['title']), extension)
+
+def _chapters(document: Dict):
+    """有内容的章节及其序号"""
+    for index, chapter in enumerate(document['chapters'], 1):
+        if chapter['paragraphs'] is not None:
+            yield index, chapter
+
+def write_epub(document: Dict, base_path: Optional[str] = None) -> str:
+    """EPUB：使用中间文档中已生成的段落HTML"""
+    return EPUBGenerator().create_epub(to_volume_data(document), base_path)
+
+def write_html(document: Dict, base_path: Optional[str] = None) -> str:
+    """单文件HTML：样式内联，图片以data URI嵌入"""
+    path = _output_path(document, 'html')
+    templates = ContentProcessor.PARAGRAPH_TEMPLATES
+    title = escape(document['title'])
+    css = AssetBundle.load().get('main_css')['data'].decode('utf-8')
+
+    with open(path + '.part', 'w', encoding='utf-8') as f:
+        f.write(f'<!DOCTYPE html>\n<html lang="{Config.EPUB_LANGUAGE}">\n<head>\n'
+                f'<meta charset="utf-8"/>\n<title>{escape(Config.EPUB_TITLE)} - {title}</title>\n'
+                f'<style>{css}</style>\n</head>\n<body>\n<h1>{title}</h1>\n<nav>\n<ol>\n')
+        for index, chapter in _chapters(document):
+            f.write(f'<li><a href="#chapter-{index}">{escape(chapter["title"])}</a></li>\n')
+        f.write('</ol>\n</nav>\n')
+
+        for i, image_path in enumerate(document['images'], 1):
+            media_type = StreamingEPUBWriter.image_media_type(image_path)
+            with open(image_path, 'rb') as image:
+                data = base64.b64encode(image.read()).decode('ascii')
+            f.write(f'<div class="illustration"><img src="data:{media_type};base64,{data}" alt="插图 {i}"/></div>\n')
+
+        for index, chapter in _chapters(document):
+            f.write(f'<section id="chapter-{index}">\n<h1>{escape(chapter["title"])}</h1>\n')
+            for paragraph in chapter['paragraphs']:
+                f.write(templates[paragraph['type']].format(paragraph['html']) + '\n')
+            f.write('</section>\n')
+        f.write('</body>\n</html>\n')
+
+    os.replace(path + '.part', path)
+    return path
+
+def write_markdown(document: Dict, base_path: Optional[str] = None) -> str:
+    """Markdown：小标题为三级标题，旁白为引用，图片引用本地文件"""
+    path = _output_path(document, 'md')
+    prefixes = {'title': '### ', 'narrator': '> '}
+
+    with open(path + '.part', 'w', encoding='utf-8') as f:
+        f.write(f'# {document["title"]}\n\n')
+        for i, image_path in enumerate(document['images'], 1):
+            relative = os.path.relpath(image_path, os.path.dirname(path)).replace(os.sep, '/')
+            f.write(f'![插图 {i}]({relative})\n\n')
+        for _, chapter in _chapters(document):
+            f.write(f'## {chapter["title"]}\n\n')
+            for paragraph in chapter['paragraphs']:
+                f.write(f'{prefixes.get(paragraph["type"], "")}{paragraph["text"]}\n\n')
+
+    os.replace(path + '.part', path)
+    return path
+
+def write_txt(document: Dict, base_path: Optional[str] = None) -> str:
+    """纯文本：段首全角缩进，章节之间空行分隔"""
+    path = _output_path(document, 'txt')
+
+    with open(path + '.part', 'w', encoding='utf-8') as f:
+        f.write(f'{Config.EPUB_TITLE} {document["title"]}\n\n')
+        for _, chapter in _chapters(document):
+            f.write(f'\n{chapter["title"]}\n\n')
+            for paragraph in chapter['paragraphs']:
+                f.write(f'　　{paragraph["text"]}\n')
+
+    os.replace(path + '.part', path)
+    return path
+
+# 格式名 -> 写入函数（base_path只有EPUB使用，用于增量更新）
+WRITERS: Dict[str, Callable[[Dict, Optional[str]], str]] = {
+    'epub': write_epub,
+    'html': write_html,
+    'markdown': write_markdown,
+    'txt': write_txt,
+}
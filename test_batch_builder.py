@@ -0,0 +1,76 @@
+"""
+测试多卷并行生成（结果顺序与错误传递）
+"""
+
+import os
+import tempfile
+
+from utils.config import Config
+from utils.chapter_store import ChapterStore
+from epub.batch_builder import ParallelEPUBBuilder
+from epub.build_manifest import BuildManifest
+
+def _chapters(volume: str):
+    return [{'title': f'第{i}章', 'content': f'{volume}第{i}章的正文内容，足够长的一段叙述。' * 20,
+             'url': f'https://example.com/{volume}/{i}.htm'} for i in range(1, 4)]
+
+def _configure(directory: str):
+    original = {key: getattr(Config, key) for key in ('OUTPUT_DIR', 'CHAPTER_DB_PATH', 'ASSET_CACHE_DIR')}
+    Config.OUTPUT_DIR = os.path.join(directory, 'output')
+    Config.CHAPTER_DB_PATH = os.path.join(directory, 'chapters.db')
+    Config.ASSET_CACHE_DIR = os.path.join(directory, 'assets')
+    return original
+
+def _restore(original: dict):
+    for key, value in original.items():
+        setattr(Config, key, value)
+
+def test_build_stored_reports_errors_in_order():
+    """测试卷册缺失或生成失败时只有该卷报告错误，其余卷正常生成，清单只记录成功的卷"""
+    with tempfile.TemporaryDirectory() as directory:
+        original = _configure(directory)
+        try:
+            store = ChapterStore()
+            for index, title in enumerate(('第一卷', '第二卷')):
+                volume_id = store.volume_id(title, index)
+                for position, chapter in enumerate(_chapters(title)):
+                    store.put_chapter(volume_id, position, chapter)
+                store.set_images(volume_id, [])
+            # 第二卷的插图路径是目录，计算输入哈希时失败
+            broken = os.path.join(directory, 'broken.jpg')
+            os.makedirs(broken)
+            store.set_images(store.volume_id('第二卷', 1), [broken])
+            store.close()
+
+            with ParallelEPUBBuilder(max_workers=2) as builder:
+                results = builder.build_stored(['第一卷', '不存在的卷', '第二卷'])
+
+            assert [result['title'] for result in results] == ['第一卷', '不存在的卷', '第二卷']
+            assert results[0]['error'] is None and os.path.exists(results[0]['path'])
+            assert results[1]['error'] == "章节存储中没有该卷册" and results[1]['path'] is None
+            assert results[2]['error'] and 'broken.jpg' in results[2]['error']
+
+            manifest = BuildManifest()
+            assert manifest.get('第一卷') is not None
+            assert manifest.get('不存在的卷') is None and manifest.get('第二卷') is None
+        finally:
+            _restore(original)
+
+def test_worker_exception_reported_per_volume():
+    """测试工作进程中未捕获的异常只作为该卷的错误结果，其余卷照常生成并记录构建清单"""
+    with tempfile.TemporaryDirectory() as directory:
+        original = _configure(directory)
+        try:
+            good = {'title': '第一卷', 'chapters': _chapters('第一卷'), 'images': []}
+            with ParallelEPUBBuilder(max_workers=2) as builder:
+                results = builder.build_volumes([{'chapters': []}, good])
+            assert results[0]['title'] == '' and results[0]['error'] == "KeyError: 'title'"
+            assert results[1]['error'] is None and os.path.exists(results[1]['path'])
+            assert BuildManifest().get('第一卷') is not None
+        finally:
+            _restore(original)
+
+if __name__ == "__main__":
+    test_build_stored_reports_errors_in_order()
+    test_worker_exception_reported_per_volume()
+    print("所有测试通过")
@@ -0,0 +1,92 @@
+"""
+测试常驻浏览器的启动、复用和重新启动
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import textwrap
+
+from crawler import browser_daemon
+from crawler.browser_daemon import BrowserDaemon, _pid_alive
+
+# 代替Chromium的本地进程：在--remote-debugging-port上提供/json/version
+STAND_IN = textwrap.dedent('''
+    import json, sys
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    port = int(next(arg.split('=', 1)[1] for arg in sys.argv if arg.startswith('--remote-debugging-port=')))
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = json.dumps({'Browser': 'StandIn/1.0', 'webSocketDebuggerUrl': f'ws://127.0.0.1:{port}/devtools'}).encode()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        def log_message(self, *args):
+            pass
+    HTTPServer(('127.0.0.1', port), Handler).serve_forever()
+''')
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def test_launch_reuse_and_relaunch():
+    """测试首次启动、健康时复用、进程退出后自动重新启动和停止"""
+    with tempfile.TemporaryDirectory() as directory:
+        script = os.path.join(directory, 'stand_in.py')
+        with open(script, 'w', encoding='utf-8') as f:
+            f.write(STAND_IN)
+        executable = os.path.join(directory, 'chromium')
+        with open(executable, 'w', encoding='utf-8') as f:
+            f.write(f'#!/bin/sh\nexec {sys.executable} {script} "$@"\n')
+        os.chmod(executable, 0o755)
+
+        daemon = BrowserDaemon(os.path.join(directory, 'browser'), _free_port())
+        assert daemon.status() is None
+        try:
+            first = daemon.ensure(executable, 'TestAgent/1.0')
+            assert daemon.status()['browser'] == 'StandIn/1.0'
+            assert daemon.ensure(executable, 'OtherAgent/2.0')['pid'] == first['pid']
+
+            # 浏览器崩溃后重新启动，用户数据目录不变
+            os.kill(first['pid'], 9)
+            while _pid_alive(first['pid']):
+                pass
+            second = daemon.ensure(executable, 'OtherAgent/2.0')
+            assert second['pid'] != first['pid'] and second['profile'] == first['profile']
+            assert second['user_agent'] == 'OtherAgent/2.0'
+        finally:
+            stopped = daemon.stop()
+        assert stopped and daemon.status() is None
+        assert not _pid_alive(second['pid'])
+
+def test_terminate_refuses_foreign_process():
+    """进程号被其他进程复用或无法读取命令行时，不结束该进程"""
+    with tempfile.TemporaryDirectory() as directory:
+        daemon = BrowserDaemon(os.path.join(directory, 'browser'), _free_port())
+        other = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])
+        command_line = browser_daemon._command_line
+        try:
+            assert _pid_alive(other.pid) and not daemon._owns(other.pid)
+            daemon._terminate(other.pid, timeout=0.5)
+            assert other.poll() is None
+
+            # 无法确认归属时同样不结束
+            browser_daemon._command_line = lambda pid: None
+            assert not daemon._owns(other.pid)
+            daemon._terminate(other.pid, timeout=0.5)
+            assert other.poll() is None
+        finally:
+            browser_daemon._command_line = command_line
+            other.kill()
+            other.wait()
+        assert not _pid_alive(other.pid)
+
+if __name__ == "__main__":
+    test_launch_reuse_and_relaunch()
+    test_terminate_refuses_foreign_process()
+    print("所有测试通过")
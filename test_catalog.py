@@ -0,0 +1,68 @@
+"""
+测试目录索引与目录缓存
+"""
+
+import os
+import tempfile
+
+from crawler.catalog import Catalog, CatalogStore
+
+NOVEL_URL = 'https://www.wenku8.net/novel/1/1213/index.htm'
+
+VOLUME_LIST = [
+    {'title': '第一卷', 'vid': '41000', 'chapters': [{'title': '第一章', 'url': '41001.htm'},
+                                                   {'title': '第二章', 'url': '41002.htm'}],
+     'images': [{'title': '插图', 'url': '41003.htm'}]},
+    {'title': '第二卷', 'vid': None, 'chapters': [{'title': '序章', 'url': '41005.htm'}], 'images': []},
+    {'title': '外传', 'vid': None, 'chapters': [{'title': '番外', 'url': 'extra.htm'}], 'images': []},
+    {'title': '空卷', 'vid': None, 'chapters': [], 'images': []},
+]
+
+def test_catalog_index():
+    """测试章节ID、顺序、卷册ID（页面vid、首章ID减一、无法推算）和查找索引"""
+    catalog = Catalog.from_volume_list(NOVEL_URL, 'abc', VOLUME_LIST)
+    first, second, extra, empty = catalog.volumes
+
+    assert [volume['id'] for volume in catalog.volumes] == [41000, 41004, None, None]
+    assert first['chapters'][1] == {'id': 41002, 'title': '第二章', 'order': 1, 'volume': 0,
+                                    'url': 'https://www.wenku8.net/novel/1/1213/41002.htm'}
+    assert second['chapters'][0]['order'] == 2
+    assert extra['chapters'][0]['id'] == Catalog.chapter_id(extra['chapters'][0]['url'])
+
+    assert catalog.get_chapter(41003)['title'] == '插图'
+    assert catalog.volume_of(41005) is second
+    assert catalog.get_volume('外传') is extra and catalog.get_volume(3) is empty
+    assert catalog.get_volume_by_id(41004) is second and catalog.get_volume_by_id(1) is None
+
+def test_fingerprint():
+    """测试指纹忽略脚本、样式、注释和空白变化，正文变化时改变"""
+    page = '<html> <body> <table><tr><td>第一章</td></tr></table> </body></html>'
+    noisy = ('<html><script>var t = 123;</script>\n<body><!-- ad 42 -->\t\t'
+             '<table><tr><td>第一章</td></tr></table>\r\n<style>td{}</style></body></html>')
+    assert CatalogStore.fingerprint(page) == CatalogStore.fingerprint(noisy)
+    assert CatalogStore.fingerprint(page) != CatalogStore.fingerprint(page.replace('第一章', '第二章'))
+
+def test_store_round_trip():
+    """测试目录缓存的保存、读取和按指纹复用"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = CatalogStore(directory)
+        catalog = Catalog.from_volume_list(NOVEL_URL, 'abc', VOLUME_LIST)
+        store.save(catalog)
+        assert os.path.basename(store.path_for(NOVEL_URL)) == '1213.json'
+
+        loaded = store.load(NOVEL_URL)
+        assert loaded.to_dict() == catalog.to_dict()
+        assert loaded.get_chapter(41005)['title'] == '序章'
+        assert store.load_if_unchanged(NOVEL_URL, 'abc') is not None
+        assert store.load_if_unchanged(NOVEL_URL, 'changed') is None
+        assert store.load('https://example.com/other/') is None
+
+        with open(store.path_for(NOVEL_URL), 'w', encoding='utf-8') as f:
+            f.write('{broken')
+        assert store.load(NOVEL_URL) is None
+
+if __name__ == "__main__":
+    test_catalog_index()
+    test_fingerprint()
+    test_store_round_trip()
+    print("所有测试通过")
@@ -0,0 +1,306 @@
+"""
+测试章节存储
+"""
+
+import asyncio
+import os
+import pickle
+import sqlite3
+import tempfile
+import zlib
+
+from utils.config import Config
+from utils.chapter_store import ChapterStore
+from utils.search_index import decode_postings, encode_postings
+from utils.text_codec import TextCodec
+from crawler.novel_crawler import NovelCrawler
+from epub.build_manifest import volume_inputs
+
+CHAPTERS = [
+    {'title': f'第{i}章', 'content': f'第{i}章的正文内容。' * 50, 'url': f'https://example.com/{i}.htm'}
+    for i in range(1, 6)
+]
+
+def test_lazy_volume_roundtrip():
+    """测试写入后惰性读取，内容和输入哈希与内存中的卷册数据一致"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = ChapterStore(os.path.join(directory, 'chapters.db'), novel='test')
+        volume_id = store.volume_id('第一卷', 1)
+        for position, chapter in reversed(list(enumerate(CHAPTERS))):
+            store.put_chapter(volume_id, position, chapter)
+        store.set_images(volume_id, [])
+
+        volume = store.load_volume('第一卷')
+        assert len(volume['chapters']) == 5
+        assert list(volume['chapters']) == CHAPTERS
+        assert volume['chapters'][2] == CHAPTERS[2]
+
+        # 可以传给其他进程
+        restored = pickle.loads(pickle.dumps(volume))
+        assert list(restored['chapters']) == CHAPTERS
+
+        plain = {'title': '第一卷', 'chapters': CHAPTERS, 'images': []}
+        assert volume_inputs(volume)['hash'] == volume_inputs(plain)['hash']
+        assert store.volumes()[0]['chapter_count'] == 5
+        store.close()
+
+def test_crawl_volume_resumes_from_store():
+    """测试中断后重新爬取只请求未存储的章节"""
+    with tempfile.TemporaryDirectory() as directory:
+        crawler = NovelCrawler(parse_executor=object())
+        crawler._owns_executor = False
+        crawler.chapter_store = ChapterStore(os.path.join(directory, 'chapters.db'), novel='test')
+
+        requested = []
+        fail_at = {'https://example.com/3.htm'}
+
+        async def fake_crawl_chapter(url):
+            requested.append(url)
+            if url in fail_at:
+                raise RuntimeError("连接中断")
+            return next(c for c in CHAPTERS if c['url'] == url)
+
+        async def no_images(volume):
+            return []
+
+        crawler.crawl_chapter = fake_crawl_chapter
+        crawler._crawl_volume_images = no_images
+        volume = {'title': '第一卷', 'index': 1, 'chapters': CHAPTERS, 'images': []}
+
+        first = asyncio.run(crawler.crawl_volume(volume))
+        assert len(first['chapters']) == 4
+        assert not first['complete'] and not crawler.chapter_store.volumes()[0]['complete']
+
+        fail_at.clear()
+        requested.clear()
+        second = asyncio.run(crawler.crawl_volume(volume))
+        assert requested == ['https://example.com/3.htm']
+        assert list(second['chapters']) == CHAPTERS
+        assert second['complete']
+        crawler.chapter_store.close()
+
+def test_catalog_changes_keep_chapters():
+    """测试目录中间插入或删除章节后，已存储章节不被覆盖，位置随目录更新"""
+    with tempfile.TemporaryDirectory() as directory:
+        crawler = NovelCrawler(parse_executor=object())
+        crawler._owns_executor = False
+        crawler.chapter_store = ChapterStore(os.path.join(directory, 'chapters.db'), novel='test')
+
+        inserted = {'title': '第2.5章', 'content': '插入的章节。' * 50, 'url': 'https://example.com/2-5.htm'}
+        requested = []
+
+        async def fake_crawl_chapter(url):
+            requested.append(url)
+            return next(c for c in CHAPTERS + [inserted] if c['url'] == url)
+
+        async def no_images(volume):
+            return []
+
+        crawler.crawl_chapter = fake_crawl_chapter
+        crawler._crawl_volume_images = no_images
+        asyncio.run(crawler.crawl_volume({'title': '第一卷', 'index': 1, 'chapters': CHAPTERS, 'images': []}))
+
+        # 新目录：第3章前插入一章，删除第4章
+        catalog = CHAPTERS[:2] + [inserted, CHAPTERS[2], CHAPTERS[4]]
+        requested.clear()
+        result = asyncio.run(crawler.crawl_volume({'title': '第一卷', 'index': 1, 'chapters': catalog, 'images': []}))
+        assert requested == [inserted['url']]
+        assert list(result['chapters']) == catalog and result['complete']
+        assert crawler.chapter_store.chapter_count() == 5
+
+        crawler.chapter_store.search_index.flush()
+        assert crawler.chapter_store.search_index.missing() == []
+        assert [hit['chapter'] for hit in crawler.chapter_store.search('插入')] == ['第2.5章']
+        assert crawler.chapter_store.search('第4章的正文') == []
+        crawler.chapter_store.close()
+
+def test_dictionary_compression():
+    """测试训练字典后新旧章节都能单独解压，重新压缩后体积变小"""
+    chapters = [
+        {'title': f'第{i}章', 'url': f'https://example.com/d{i}.htm',
+         'content': f'比企谷八幡看着雪之下雪乃和由比滨结衣。\n侍奉部的活动室里很安静。\n这是第{i}章独有的内容{i * 7}。' * 3}
+        for i in range(30)
+    ]
+    original = (Config.TEXT_DICT_MIN_SAMPLES, Config.TEXT_DICT_RETRAIN_EVERY)
+    Config.TEXT_DICT_MIN_SAMPLES, Config.TEXT_DICT_RETRAIN_EVERY = 10, 10
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            store = ChapterStore(os.path.join(directory, 'chapters.db'), novel='test')
+            volume_id = store.volume_id('第一卷', 1)
+            for position, chapter in enumerate(chapters[:10]):
+                store.put_chapter(volume_id, position, chapter)
+            store.codec.wait()
+            assert store.codec.current_dictionary() > 0
+
+            for position, chapter in enumerate(chapters[10:], 10):
+                store.put_chapter(volume_id, position, chapter)
+            store.codec.wait()
+
+            dict_ids = {row[0] for row in store.conn.execute('SELECT dict_id FROM chapters')}
+            assert dict_ids == {store.codec.current_dictionary()}
+            plain = sum(len(zlib.compress(c['content'].encode('utf-8'), 6)) for c in chapters)
+            assert store.storage_stats()['compressed_bytes'] < plain
+
+            volume = store.load_volume('第一卷')
+            assert volume['chapters'][17] == chapters[17]
+            assert list(volume['chapters']) == chapters
+            store.close()
+    finally:
+        Config.TEXT_DICT_MIN_SAMPLES, Config.TEXT_DICT_RETRAIN_EVERY = original
+
+def test_recompress_keeps_rewritten_chapter():
+    """测试重新压缩读取章节后该章被重新写入时，不用旧正文覆盖新正文"""
+    chapters = [
+        {'title': f'第{i}章', 'url': f'https://example.com/c{i}.htm', 'content': f'侍奉部的活动室。第{i}章。\n' * 20}
+        for i in range(6)
+    ]
+    original = Config.TEXT_DICT_MIN_SAMPLES
+    Config.TEXT_DICT_MIN_SAMPLES = 5
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'chapters.db')
+            store = ChapterStore(path, novel='test')
+            volume_id = store.volume_id('第一卷', 1)
+            for position, chapter in enumerate(chapters):
+                store.put_chapter(volume_id, position, chapter)
+            store.codec.wait()
+
+            worker = TextCodec(sqlite3.connect(path), path, 'test')
+            dict_id = worker.train()
+            decode = worker.decode
+            rewritten = {'title': '第0章', 'url': chapters[0]['url'], 'content': '重新爬取的新正文。'}
+
+            def decode_then_rewrite(blob, codec, dict_id):
+                # 后台线程读取第一章后，主线程重新写入了这一章
+                text = decode(blob, codec, dict_id)
+                if worker.decode is decode_then_rewrite:
+                    worker.decode = decode
+                    store.put_chapter(volume_id, 0, rewritten)
+                return text
+
+            worker.decode = decode_then_rewrite
+            worker.recompress(dict_id)
+            worker.conn.close()
+
+            assert store.load_volume('第一卷')['chapters'][0] == rewritten
+            assert list(store.load_volume('第一卷')['chapters'])[1:] == chapters[1:]
+            store.close()
+    finally:
+        Config.TEXT_DICT_MIN_SAMPLES = original
+
+def test_full_text_search():
+    """测试增量索引、按相关度排序、整句确认和摘要"""
+    chapters = [
+        {'title': '第1章', 'url': 'https://example.com/s1.htm', 'content': '雪之下雪乃推开门。' + '风很冷。' * 100},
+        {'title': '第2章', 'url': 'https://example.com/s2.htm', 'content': '雪之下说：雪之下家的事。雪之下。'},
+        {'title': '第3章', 'url': 'https://example.com/s3.htm', 'content': '下雪之后，他去了侍奉部。'},
+        {'title': '第4章', 'url': 'https://example.com/s4.htm', 'content': '由比滨结衣打了招呼。'},
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        store = ChapterStore(os.path.join(directory, 'chapters.db'), novel='test')
+        volume_id = store.volume_id('第一卷', 1)
+        for position, chapter in enumerate(chapters[:3]):
+            store.put_chapter(volume_id, position, chapter)
+
+        hits = store.search('雪之下')
+        assert [hit['chapter'] for hit in hits] == ['第2章', '第1章']
+        assert hits[0]['count'] == 3
+        assert '【雪之下】' in hits[1]['snippet']
+
+        # 新章节加入后无需重建即可搜索到
+        store.put_chapter(volume_id, 3, chapters[3])
+        assert [hit['chapter'] for hit in store.search('结衣')] == ['第4章']
+        assert len(store.search('侍')) == 1
+        # 单字出现在片段末尾（只在以它结尾的二字组中）也能找到
+        assert [hit['chapter'] for hit in store.search('部')] == ['第3章']
+        assert [hit['chapter'] for hit in store.search('衣')] == ['第4章']
+        assert store.search('不存在的人名') == []
+        store.close()
+
+        # 已存储但未索引的章节在搜索时补建索引
+        store = ChapterStore(os.path.join(directory, 'chapters.db'), novel='test')
+        store.conn.execute('DELETE FROM search_docs')
+        store.conn.execute('DELETE FROM search_terms')
+        assert [hit['chapter'] for hit in store.search('结衣')] == ['第4章']
+        store.close()
+
+def test_search_whole_library():
+    """测试默认搜索章节存储中的所有小说，结果标出所属小说"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'chapters.db')
+        for novel, content in (('novel-a', '雪之下在看书。'), ('novel-b', '雪之下在喝茶。')):
+            store = ChapterStore(path, novel=novel)
+            store.put_chapter(store.volume_id('第一卷', 1), 0,
+                              {'title': '第1章', 'url': f'https://example.com/{novel}.htm', 'content': content})
+            store.close()
+
+        store = ChapterStore(path, novel='novel-a')
+        assert sorted(hit['novel'] for hit in store.search('雪之下')) == ['novel-a', 'novel-b']
+        assert [hit['novel'] for hit in store.search('雪之下', novel='novel-b')] == ['novel-b']
+        hit = store.search('喝茶')[0]
+        assert (hit['novel'], hit['volume'], hit['chapter']) == ('novel-b', '第一卷', '第1章')
+        store.close()
+
+def test_unflushed_index_recovered():
+    """测试进程在索引写入前中断时，重新打开后搜索会补建这些章节的索引"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'chapters.db')
+        store = ChapterStore(path, novel='test')
+        volume_id = store.volume_id('第一卷', 1)
+        for position, chapter in enumerate(CHAPTERS[:2]):
+            store.put_chapter(volume_id, position, chapter)
+        assert store.search_index.missing() == []
+
+        # 倒排项还在内存中时直接关闭连接（模拟进程中断）
+        store.put_chapter(volume_id, 2, CHAPTERS[2])
+        assert store.conn.execute('SELECT COUNT(*) FROM search_docs').fetchone()[0] == 2
+        store.codec.wait()
+        store.conn.close()
+
+        store = ChapterStore(path, novel='test')
+        assert len(store.search_index.missing()) == 1
+        assert [hit['chapter'] for hit in store.search('第3章的正文')] == ['第3章']
+        store.close()
+
+def test_removed_pending_doc_postings_dropped():
+    """测试尚未写入的章节被删除后，它的倒排项不会归到之后加入的章节名下"""
+    chapters = [
+        {'title': '第1章', 'url': 'https://example.com/r1.htm', 'content': '苹果和香蕉。'},
+        {'title': '第2章', 'url': 'https://example.com/r2.htm', 'content': '只有这章有葡萄。'},
+        {'title': '第3章', 'url': 'https://example.com/r3.htm', 'content': '西瓜很甜。'},
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        store = ChapterStore(os.path.join(directory, 'chapters.db'), novel='test')
+        volume_id = store.volume_id('第一卷', 1)
+        for position, chapter in enumerate(chapters[:2]):
+            store.put_chapter(volume_id, position, chapter)
+        store.sync_catalog(volume_id, [chapters[0]['url']])
+        store.search_index.flush()
+        store.put_chapter(volume_id, 1, chapters[2])
+        store.search_index.flush()
+
+        assert store.search_index.candidates('葡萄') == []
+        assert [hit['chapter'] for hit in store.search('西瓜')] == ['第3章']
+        store.close()
+
+def test_posting_list_encoding():
+    """测试倒排表定长编码的往返，超出范围的词频被截断"""
+    postings = [(1, 3), (5, 1), (300, 2), (70000, 129), (2 ** 32 - 1, 70000)]
+    blob = encode_postings(postings)
+    assert len(blob) == 6 * len(postings)
+    docs, tfs = decode_postings(blob)
+    assert list(zip(docs, tfs)) == postings[:-1] + [(2 ** 32 - 1, 0xffff)]
+    assert [list(values) for values in decode_postings(b'')] == [[], []]
+
+if __name__ == "__main__":
+    test_lazy_volume_roundtrip()
+    test_dictionary_compression()
+    test_recompress_keeps_rewritten_chapter()
+    test_full_text_search()
+    test_search_whole_library()
+    test_unflushed_index_recovered()
+    test_removed_pending_doc_postings_dropped()
+    test_posting_list_encoding()
+    test_crawl_volume_resumes_from_store()
+    test_catalog_changes_keep_chapters()
+    print("所有测试通过")
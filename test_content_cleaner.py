@@ -0,0 +1,44 @@
+"""
+测试正文清理功能
+"""
+
+from crawler.content_cleaner import ContentCleaner
+from crawler.page_parser import PageParser
+
+def test_paragraphs_preserved():
+    """测试段落边界在清理后得以保留"""
+    cleaner = ContentCleaner.for_site('https://www.wenku8.net/novel/1/1213/index.htm')
+    text = (
+        '　　第一段内容，  包含多余空白。\r\n\r\n'
+        '　　本文来自 轻小说文库(http://www.wenku8.com)\n'
+        '　　第二段内容。\n'
+        '\xa0\xa0第三段\n跨越\n'
+        '添加书签 | 推荐本书 | 返回书目\n'
+    )
+    paragraphs = list(cleaner.iter_paragraphs(text))
+    assert paragraphs == ['第一段内容， 包含多余空白。', '第二段内容。', '第三段', '跨越']
+    assert cleaner.clean(text) == '\n\n'.join(paragraphs)
+
+def test_site_rules():
+    """测试按站点选择规则集"""
+    assert ContentCleaner.for_site('wenku8.net').rules
+    assert ContentCleaner.for_site('https://example.com/a.htm').rules == []
+    assert ContentCleaner.for_site('example.com').clean('背景颜色 保存设置') == '背景颜色 保存设置'
+
+def test_parse_chapter_content_keeps_br():
+    """测试<br>分隔的正文被解析为多个段落"""
+    html = (
+        '<html><body><div id="content">'
+        + '&nbsp;&nbsp;&nbsp;&nbsp;这是第一段比较长的正文内容，用来满足最短长度检查。' * 3
+        + '<br /><br />&nbsp;&nbsp;&nbsp;&nbsp;这是第二段正文。<br />'
+        + '<p>段落标签内的第三段</p><p>第四段</p>'
+        '</div></body></html>'
+    )
+    content = PageParser().parse_chapter_content(html)
+    assert content.split('\n\n')[1:] == ['这是第二段正文。', '段落标签内的第三段', '第四段']
+
+if __name__ == "__main__":
+    test_paragraphs_preserved()
+    test_site_rules()
+    test_parse_chapter_content_keeps_br()
+    print("正文清理测试通过")
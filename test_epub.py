@@ -37,5 +37,76 @@ def test_epub_generation():
         traceback.print_exc()
         return False
 
+def test_long_chapter_split():
+    """测试过长章节在段落边界切分，单页时输出不变"""
+    from epub.content_processor import ContentProcessor
+    
+    processor = ContentProcessor()
+    content = '\n\n'.join(f'第{i}段正文内容，用来测试章节切分。' for i in range(100))
+    
+    assert processor.create_chapter_pages('第一章', content) == [processor.create_chapter_html('第一章', content)]
+    
+    pages = processor.create_chapter_pages('第一章', content, max_bytes=1024, max_paragraphs=30)
+    assert len(pages) > 3
+    assert pages[0].count('<h1>') == 1 and all('<h1>' not in page for page in pages[1:])
+    assert sum(page.count('<p>') for page in pages) == 100
+    assert all(page.count('<p>') <= 30 for page in pages)
+    assert [f for _, f in EPUBGenerator._chapter_files(0, 3)] == [
+        'chapter_001.xhtml', 'chapter_001_part2.xhtml', 'chapter_001_part3.xhtml'
+    ]
+
+def test_asset_bundle_cache():
+    """测试样式压缩和资源包磁盘缓存"""
+    import tempfile
+    import zlib
+    from epub.asset_bundle import AssetBundle, minify_css
+    
+    assert minify_css('a , b > i { content: "x ; }" ; /* 注释 */ color:  red ; }') == 'a,b>i{content:"x ; }";color:red}'
+    
+    with tempfile.TemporaryDirectory() as directory:
+        built = AssetBundle.load(directory)
+        AssetBundle._loaded.clear()
+        cached = AssetBundle.load(directory)
+        assert cached is not built and cached.digest() == built.digest()
+        
+        asset = cached.get('main_css')
+        assert zlib.decompress(asset['payload'], -15) == asset['data']
+        assert zlib.crc32(asset['data']) == asset['crc']
+        assert cached.summary()['minified'] < cached.summary()['original']
+    AssetBundle._loaded.clear()
+
+def test_omnibus_dedup_and_nested_toc():
+    """测试合集中相同图片只写入一次，目录按卷册嵌套"""
+    import os
+    import tempfile
+    import zipfile
+    from utils.config import Config
+    
+    output_dir = Config.OUTPUT_DIR
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            Config.OUTPUT_DIR = directory
+            image_path = os.path.join(directory, 'cover.jpg')
+            with open(image_path, 'wb') as f:
+                f.write(os.urandom(4096))
+            volumes = [
+                {'title': f'第{i}卷', 'images': [image_path],
+                 'chapters': [{'title': '第一章', 'content': '这是一段足够长的正文内容。', 'url': ''}]}
+                for i in (1, 2)
+            ]
+            path = EPUBGenerator().create_omnibus(iter(volumes), '合集')
+            with zipfile.ZipFile(path) as z:
+                names = z.namelist()
+                nav = z.read('EPUB/nav.xhtml').decode('utf-8')
+            assert [n for n in names if n.startswith('EPUB/images/')] == ['EPUB/images/v01_cover.jpg']
+            assert names.count('EPUB/style/main.css') == 1
+            assert 'v02_chapter_001.xhtml' in ''.join(names)
+            assert nav.count('<ol>') == 3 and '第2卷</a>' in nav
+    finally:
+        Config.OUTPUT_DIR = output_dir
+
 if __name__ == "__main__":
     test_epub_generation()
+    test_long_chapter_split()
+    test_asset_bundle_cache()
+    test_omnibus_dedup_and_nested_toc()
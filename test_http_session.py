@@ -0,0 +1,102 @@
+"""
+测试浏览器会话移交给HTTP客户端
+"""
+
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from crawler.anti_crawler import AntiCrawlerStrategy
+from crawler.http_session import HttpSession, SessionExpired
+
+IMAGE = bytes(range(256)) * 64
+
+class ChallengeHandler(BaseHTTPRequestHandler):
+    """没有验证cookie时返回验证页面的本地站点"""
+
+    def do_GET(self):
+        if 'cf_clearance=ok' not in self.headers.get('Cookie', ''):
+            body = '<html><title>Just a moment...</title></html>'.encode('utf-8')
+            self._reply(503, 'text/html', body)
+        elif self.path == '/image.jpg':
+            self._reply(200 if self.headers.get('Referer') else 403, 'image/jpeg', IMAGE)
+        else:
+            html = (f'<html><head><meta http-equiv="Content-Type" content="text/html; charset=gbk"></head>'
+                    f'<body><div id="content">第一章 {self.headers.get("User-Agent")}</div></body></html>')
+            self._reply(200, 'text/html', html.encode('gbk'))
+
+    def _reply(self, status: int, content_type: str, body: bytes):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def _cookie(value: str, expires: float) -> dict:
+    return {'name': 'cf_clearance', 'value': value, 'domain': '127.0.0.1', 'path': '/', 'expires': expires}
+
+async def _exercise(base: str, directory: str) -> dict:
+    headers = AntiCrawlerStrategy().get_playwright_options()['extra_http_headers']
+    results = {}
+
+    # 其他cookie即将过期不影响会话
+    session = HttpSession()
+    tracking = {'name': '_ga', 'value': '1', 'domain': '127.0.0.1', 'path': '/', 'expires': time.time() + 10}
+    await session.load([_cookie('ok', time.time() + 3600), tracking], 'TestAgent/1.0', headers)
+    results['text'] = await session.get_text(f'{base}/1.htm')
+    results['image'] = await session.download(f'{base}/image.jpg', os.path.join(directory, 'a.jpg'), referer=f'{base}/1.htm')
+
+    # 验证页面不重试，直接交给调用方
+    attempts = []
+    async def fetch():
+        attempts.append(1)
+        return await session.get_text(f'{base}/2.htm')
+    await session.load([_cookie('stale', time.time() + 3600)], 'TestAgent/1.0', headers)
+    try:
+        await AntiCrawlerStrategy().handle_request_with_retry(fetch)
+        results['challenge'] = False
+    except SessionExpired:
+        results['challenge'] = True
+    results['attempts'] = len(attempts)
+
+    # 验证cookie即将过期时不发请求
+    await session.load([_cookie('ok', time.time() + 10)], 'TestAgent/1.0', headers)
+    try:
+        await session.get_text(f'{base}/3.htm')
+        results['expiring'] = False
+    except SessionExpired:
+        results['expiring'] = True
+    results['requests'] = session.requests
+    results['handoffs'] = session.handoffs
+    await session.close()
+    return results
+
+def test_handoff_and_invalidation():
+    """测试移交后的cookie和User-Agent生效、GBK页面解码、图片下载，以及会话失效检测"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ChallengeHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            results = asyncio.run(_exercise(f'http://127.0.0.1:{server.server_address[1]}', directory))
+            with open(os.path.join(directory, 'a.jpg'), 'rb') as f:
+                image = f.read()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert '第一章 TestAgent/1.0' in results['text']
+    assert results['image'] and image == IMAGE
+    assert results['challenge'] and results['attempts'] == 1
+    assert results['expiring']
+    assert results['requests'] == 3 and results['handoffs'] == 3
+
+if __name__ == "__main__":
+    test_handoff_and_invalidation()
+    print("所有测试通过")
@@ -0,0 +1,64 @@
+"""
+测试日志记录
+"""
+
+import gzip
+import json
+import os
+import tempfile
+
+from utils.config import Config
+from utils.logger import log_context, logger
+
+def _reconfigure(**settings):
+    """修改日志配置并重新设置，返回原配置"""
+    original = {key: getattr(Config, key) for key in settings}
+    for key, value in settings.items():
+        setattr(Config, key, value)
+    logger.reconfigure()
+    return original
+
+def test_json_lines_with_context():
+    """测试JSON Lines格式包含运行ID和卷册/章节字段，低于级别的日志不写出"""
+    with tempfile.TemporaryDirectory() as directory:
+        original = _reconfigure(LOG_DIR=directory, LOG_FORMAT='json', LOG_FILE_LEVEL='INFO')
+        try:
+            with log_context(volume='第一卷'):
+                with log_context(chapter='第1章'):
+                    logger.info("完成章节: %s", '第1章')
+                logger.debug("不会写出")
+                logger.warning("卷册警告")
+            logger.shutdown()
+
+            with open(os.path.join(directory, Config.LOG_FILE_NAME), encoding='utf-8') as f:
+                entries = [json.loads(line) for line in f]
+        finally:
+            _reconfigure(**original)
+
+    assert [entry['message'] for entry in entries] == ['完成章节: 第1章', '卷册警告']
+    assert entries[0]['volume'] == '第一卷' and entries[0]['chapter'] == '第1章'
+    assert 'chapter' not in entries[1]
+    assert entries[0]['run'] == logger.run_id
+    assert entries[0]['module'] == 'test_logger'
+
+def test_rotation_compresses_old_files():
+    """测试超过大小后轮转，旧文件gzip压缩"""
+    with tempfile.TemporaryDirectory() as directory:
+        original = _reconfigure(LOG_DIR=directory, LOG_MAX_BYTES=2048, LOG_BACKUP_COUNT=2)
+        try:
+            for i in range(200):
+                logger.debug(f"第{i}条调试日志")
+            logger.shutdown()
+            files = sorted(os.listdir(directory))
+            with gzip.open(os.path.join(directory, Config.LOG_FILE_NAME + '.1.gz'), 'rt', encoding='utf-8') as f:
+                rotated = f.read()
+        finally:
+            _reconfigure(**original)
+
+    assert files == [Config.LOG_FILE_NAME, Config.LOG_FILE_NAME + '.1.gz', Config.LOG_FILE_NAME + '.2.gz']
+    assert '调试日志' in rotated
+
+if __name__ == "__main__":
+    test_json_lines_with_context()
+    test_rotation_compresses_old_files()
+    print("所有测试通过")
@@ -0,0 +1,34 @@
+"""
+测试事件循环阻塞检测
+"""
+
+import asyncio
+import time
+
+from utils.loop_watchdog import LoopWatchdog
+
+def blocking_call():
+    time.sleep(0.3)
+
+async def _watched():
+    async with LoopWatchdog(threshold=0.1, interval=0.02) as watchdog:
+        await asyncio.sleep(0.1)
+        blocking_call()
+        await asyncio.sleep(0.1)
+        await asyncio.sleep(0.05)
+    return watchdog
+
+def test_blocking_call_site():
+    """测试阻塞被记录到调用点，非阻塞的等待不计入"""
+    watchdog = asyncio.run(_watched())
+    assert watchdog.stalls == 1
+    assert 0.25 < watchdog.total_blocked < 0.5
+
+    top = watchdog.report()[0]
+    assert top['site'].startswith('test_loop_watchdog.py:') and top['site'].endswith('(blocking_call)')
+    assert top['total'] > 0.2
+    assert any('time.sleep(0.3)' in line for line in top['stack'])
+
+if __name__ == "__main__":
+    test_blocking_call_site()
+    print("所有测试通过")
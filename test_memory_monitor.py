@@ -0,0 +1,56 @@
+"""
+测试内存受限模式
+"""
+
+import asyncio
+
+from utils.config import Config
+from utils.memory_monitor import MemoryMonitor, process_rss
+
+def _allocate(size: int) -> int:
+    data = bytearray(size)
+    return len(data)
+
+def test_stage_peaks():
+    """测试嵌套阶段的Python分配峰值，内层峰值同时计入外层，外部上报的峰值合并"""
+    with MemoryMonitor(limit_mb=100000) as monitor:
+        with monitor.track('crawl', '第一卷'):
+            with monitor.track('content', '第一卷'):
+                _allocate(20 * 1024 * 1024)
+            _allocate(5 * 1024 * 1024)
+        with monitor.track('crawl', '第二卷'):
+            _allocate(1024 * 1024)
+        monitor.record('packaging', '第一卷', {'rss': 123, 'traced': 456})
+
+    content = monitor.peak('content', '第一卷')
+    assert content['traced'] >= 20 * 1024 * 1024
+    assert monitor.peak('crawl', '第一卷')['traced'] >= content['traced']
+    assert monitor.peak('crawl', '第二卷')['traced'] < 10 * 1024 * 1024
+    assert monitor.peak('crawl', '第一卷')['rss'] > 0
+    assert monitor.peak('packaging', '第一卷') == {'rss': 123, 'traced': 456}
+    assert monitor.peak_total >= process_rss() // 2
+
+def test_throttle():
+    """测试未启用时不做任何事，超过上限时暂停到最长等待时间"""
+    disabled = MemoryMonitor(limit_mb=0)
+    with disabled.track('crawl'):
+        pass
+    assert not disabled.peaks and not disabled.over_limit()
+
+    original = (Config.MEMORY_THROTTLE_MAX_WAIT, Config.MEMORY_THROTTLE_POLL)
+    Config.MEMORY_THROTTLE_MAX_WAIT, Config.MEMORY_THROTTLE_POLL = 0.2, 0.05
+    try:
+        low = MemoryMonitor(limit_mb=1)
+        asyncio.run(low.throttle())
+        high = MemoryMonitor(limit_mb=100000)
+        asyncio.run(high.throttle())
+    finally:
+        Config.MEMORY_THROTTLE_MAX_WAIT, Config.MEMORY_THROTTLE_POLL = original
+
+    assert low.throttled == 1 and 0.2 <= low.throttled_seconds < 1.0
+    assert high.throttled == 0
+
+if __name__ == "__main__":
+    test_stage_peaks()
+    test_throttle()
+    print("所有测试通过")
@@ -0,0 +1,65 @@
+"""
+测试预编译段落分类器（输出应与逐模式匹配的旧规则一致）
+"""
+
+from benchmarks.bench_content_processor import SAMPLE_TEXT, LegacyContentProcessor
+from epub.content_processor import ContentProcessor
+
+# 覆盖各段落类型、优先级、强调嵌套与HTML转义的固定语料
+CORPUS = [
+    '「你好。」她说。',
+    '他想（也许不是这样），然后说「走吧」。',
+    '"English quotes" and "中文引号" together',
+    '『书中的引号』里面有（括号）',
+    '——破折号独白——',
+    '……省略号开头…中间…',
+    '※ 注释 ※ 以及 [方括号] 旁白',
+    '＊全角星号＊',
+    '☆ 没有闭合的空心星',
+    '1. 第一节',
+    '十、第十节',
+    '第三章 标题',
+    '第三章 ' + '很长的标题' * 12,
+    '** 标题 **',
+    '== 分隔 ==',
+    '**粗体**与*斜体*，__粗__与_斜_',
+    '**粗体里有*斜体***',
+    '*斜体里有《书名》*和【特殊】',
+    '《书名里有**粗体**》',
+    '未闭合的**粗体和*斜体',
+    'a_b_c 与 snake_case_name',
+    '<script>alert("x")</script> & \'单引号\'',
+    '「<b>标签</b>」与 **<i>强调</i>**',
+    '[*方括号里的强调*]',
+    '普通段落，没有任何特殊标记。',
+    '',
+]
+
+def test_matches_legacy_rules():
+    """测试逐段与整章处理的输出都与旧规则一致"""
+    legacy = LegacyContentProcessor()
+    compiled = ContentProcessor()
+
+    for paragraph in CORPUS:
+        if paragraph:
+            assert compiled._process_paragraph(paragraph) == legacy._process_paragraph(paragraph), paragraph
+
+    for content in ('\n\n'.join(CORPUS), SAMPLE_TEXT, '\n\n'.join(reversed(CORPUS))):
+        assert compiled.process_content(content) == legacy.process_content(content)
+
+def test_classify():
+    """测试段落类型优先级和强调片段位置"""
+    classifier = ContentProcessor().classifier
+    assert classifier.classify('他想（也许不是这样），然后说「走吧」。')[0] == 'dialogue'
+    assert classifier.classify('※ 注释 ※ （独白）')[0] == 'thought'
+    assert classifier.classify('第三章 ' + '很长的标题' * 12)[0] == 'normal'
+
+    para_type, spans = classifier.classify('**粗**和《书》')
+    assert para_type == 'normal'
+    assert spans == [(0, 5, 'bold', 2, 3), (6, 9, 'book', 7, 8)]
+    assert classifier.render('**粗**和《书》', spans) == '<strong>粗</strong>和<em class="book-title">《书》</em>'
+
+if __name__ == "__main__":
+    test_matches_legacy_rules()
+    test_classify()
+    print("所有测试通过")
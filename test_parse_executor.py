@@ -0,0 +1,60 @@
+"""
+测试解析进程池（结果应与直接调用PageParser一致）
+"""
+
+import asyncio
+
+from crawler.page_parser import PageParser
+from crawler.parse_executor import ParseExecutor, parse_page
+
+def _chapter_page(number: int) -> str:
+    body = '<br /><br />'.join(f'&nbsp;&nbsp;&nbsp;&nbsp;第{number}章的第{i}段正文，内容足够长以通过最短长度检查。' for i in range(6))
+    return (
+        f'<html><head><title>测试小说 - 第{number}章 标题{number} - 轻小说文库</title></head><body>'
+        f'<div id="title">第{number}章 标题{number}</div>'
+        f'<div id="content">{body}'
+        f'<img src="http://pic.777743.xyz/{number}/1.jpg" /><a href="http://example.com/{number}.jpg">插图</a>'
+        f'</div></body></html>'
+    )
+
+VOLUME_PAGE = (
+    '<html><body><table>'
+    '<tr><td class="vcss" vid="101">第一卷</td></tr>'
+    '<tr><td><a href="102.htm">第一章</a></td><td><a href="103.htm">第二章</a></td></tr>'
+    '<tr><td><a href="104.htm">插图</a></td></tr>'
+    '<tr><td class="vcss" vid="105">第二卷</td></tr>'
+    '<tr><td><a href="106.htm">序章</a></td></tr>'
+    '</table></body></html>'
+)
+
+def test_executor_matches_parser():
+    """测试进程池解析（字节输入、精简字典输出）与PageParser结果一致"""
+    pages = [_chapter_page(i) for i in range(1, 9)]
+    expected = [PageParser().parse_chapter_page(html) for html in pages]
+    assert expected[0]['title'] == '第1章 标题1' and len(expected[0]['paragraphs']) == 6
+    assert len(expected[0]['image_urls']) == 2
+
+    with ParseExecutor(max_workers=2) as executor:
+        encoded = [html.encode('utf-8') for html in pages]
+        assert executor.parse_batch_sync(encoded) == expected
+        assert asyncio.run(executor.parse_batch(encoded)) == expected
+        volumes = asyncio.run(executor.parse(VOLUME_PAGE.encode('utf-8'), 'volumes'))['volumes']
+        images = asyncio.run(executor.parse(pages[2], 'images'))['image_urls']
+
+    assert volumes == PageParser().parse_volume_list(VOLUME_PAGE)
+    assert [volume['vid'] for volume in volumes] == ['101', '105']
+    assert images == PageParser().parse_image_urls(pages[2])
+    assert parse_page(encoded[0]) == expected[0]
+
+def test_parser_session_is_lazy():
+    """测试解析不会创建图片下载会话"""
+    parser = PageParser()
+    parser.parse_chapter_page(_chapter_page(1))
+    parser.set_user_agent('TestAgent/1.0')
+    assert parser._session is None
+    assert parser.session.headers['User-Agent'] == 'TestAgent/1.0'
+
+if __name__ == "__main__":
+    test_executor_matches_parser()
+    test_parser_session_is_lazy()
+    print("所有测试通过")
@@ -0,0 +1,152 @@
+"""
+测试可复现EPUB和构建清单
+"""
+
+import os
+import tempfile
+
+from utils.config import Config
+from epub.batch_builder import build_volume
+from epub.build_manifest import BuildManifest, file_sha256
+from formats.writers import WRITERS
+
+VOLUME_DATA = {
+    'title': '第一卷',
+    'chapters': [
+        {'title': '第一章', 'content': '「这是一段对话。」\n\n这是一段足够长的普通正文内容。', 'url': ''},
+        {'title': '第二章', 'content': '（内心独白）\n\n另一段足够长的普通正文内容。', 'url': ''},
+    ],
+    'images': [],
+}
+
+def _build_in(directory: str, volume_data: dict) -> dict:
+    """在指定输出目录中生成EPUB并记录构建清单"""
+    Config.OUTPUT_DIR = directory
+    result = build_volume(volume_data)
+    assert result['error'] is None, result['error']
+    BuildManifest().record_results([result])
+    return result
+
+def test_identical_input_identical_bytes():
+    """测试相同输入在不同时间、不同目录生成的EPUB逐字节相同"""
+    output_dir = Config.OUTPUT_DIR
+    try:
+        with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+            a = _build_in(first, VOLUME_DATA)
+            b = _build_in(second, VOLUME_DATA)
+            assert file_sha256(a['path']) == file_sha256(b['path'])
+            assert a['inputs'] == b['inputs']
+    finally:
+        Config.OUTPUT_DIR = output_dir
+
+def test_manifest_skips_unchanged_volume():
+    """测试输入未变化时跳过，章节变化时重新生成"""
+    output_dir = Config.OUTPUT_DIR
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            first = _build_in(directory, VOLUME_DATA)
+            assert not first['skipped']
+            entry = BuildManifest().get('第一卷')
+            assert entry['output']['sha256'] == file_sha256(first['path'])
+
+            second = _build_in(directory, VOLUME_DATA)
+            assert second['skipped'] and second['path'] == first['path']
+
+            changed = dict(VOLUME_DATA, chapters=VOLUME_DATA['chapters'] + [
+                {'title': '第三章', 'content': '新追加的章节内容，长度足够。', 'url': ''}
+            ])
+            third = _build_in(directory, changed)
+            assert not third['skipped']
+            assert BuildManifest().get('第一卷')['inputs']['hash'] == third['inputs']['hash']
+
+            # 输出文件被删除后重新生成
+            os.remove(third['path'])
+            assert not _build_in(directory, changed)['skipped']
+    finally:
+        Config.OUTPUT_DIR = output_dir
+
+def test_appended_chapter_patches_in_place():
+    """测试追加章节时复用图片条目，结果与完整重新生成逐字节相同"""
+    output_dir = Config.OUTPUT_DIR
+    try:
+        with tempfile.TemporaryDirectory() as directory, tempfile.TemporaryDirectory() as full:
+            image_path = os.path.join(directory, 'cover.jpg')
+            with open(image_path, 'wb') as f:
+                f.write(os.urandom(256 * 1024))
+            volume = dict(VOLUME_DATA, images=[image_path])
+            _build_in(directory, volume)
+
+            appended = dict(volume, chapters=volume['chapters'] + [
+                {'title': '第三章', 'content': '新追加的章节内容，长度足够。', 'url': ''}
+            ])
+            patched = _build_in(directory, appended)
+            assert patched['patched']
+
+            rebuilt = _build_in(full, appended)
+            assert not rebuilt['patched']
+            assert file_sha256(patched['path']) == file_sha256(rebuilt['path'])
+    finally:
+        Config.OUTPUT_DIR = output_dir
+
+def test_format_fanout_shares_one_pass():
+    """测试多格式输出：EPUB与单独生成的相同，再次运行时全部跳过"""
+    output_dir = Config.OUTPUT_DIR
+    formats = Config.OUTPUT_FORMATS
+    try:
+        with tempfile.TemporaryDirectory() as directory, tempfile.TemporaryDirectory() as single:
+            epub_only = _build_in(single, VOLUME_DATA)
+
+            Config.OUTPUT_FORMATS = ('epub', 'html', 'markdown', 'txt')
+            first = _build_in(directory, VOLUME_DATA)
+            assert set(first['formats']) == {'epub', 'html', 'markdown', 'txt'}
+            assert file_sha256(first['formats']['epub']['path']) == file_sha256(epub_only['path'])
+
+            with open(first['formats']['markdown']['path'], encoding='utf-8') as f:
+                assert '## 第二章' in f.read()
+            with open(first['formats']['txt']['path'], encoding='utf-8') as f:
+                assert '　　「这是一段对话。」' in f.read()
+
+            second = _build_in(directory, VOLUME_DATA)
+            assert second['skipped'] and all(o['skipped'] for o in second['formats'].values())
+    finally:
+        Config.OUTPUT_DIR = output_dir
+        Config.OUTPUT_FORMATS = formats
+
+def test_failed_format_recorded_separately():
+    """测试一个格式写入失败时其他格式照常输出并记录，下次只重新生成失败的格式"""
+    output_dir = Config.OUTPUT_DIR
+    formats = Config.OUTPUT_FORMATS
+    writer = WRITERS['markdown']
+
+    def broken(document, base_path=None):
+        raise OSError("磁盘已满")
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            Config.OUTPUT_DIR = directory
+            Config.OUTPUT_FORMATS = ('epub', 'markdown', 'txt')
+            WRITERS['markdown'] = broken
+            first = build_volume(VOLUME_DATA)
+            BuildManifest().record_results([first])
+            assert first['error'] == "markdown: 磁盘已满" and not first['skipped']
+            assert first['path'] == first['formats']['epub']['path'] and os.path.exists(first['path'])
+            assert first['formats']['txt']['error'] is None
+            manifest = BuildManifest()
+            assert manifest.get('第一卷') and manifest.get('第一卷#txt') and manifest.get('第一卷#markdown') is None
+
+            WRITERS['markdown'] = writer
+            second = build_volume(VOLUME_DATA)
+            assert second['error'] is None
+            assert [fmt for fmt, output in second['formats'].items() if not output['skipped']] == ['markdown']
+    finally:
+        WRITERS['markdown'] = writer
+        Config.OUTPUT_DIR = output_dir
+        Config.OUTPUT_FORMATS = formats
+
+if __name__ == "__main__":
+    test_identical_input_identical_bytes()
+    test_manifest_skips_unchanged_volume()
+    test_appended_chapter_patches_in_place()
+    test_format_fanout_shares_one_pass()
+    test_failed_format_recorded_separately()
+    print("所有测试通过")
@@ -0,0 +1,67 @@
+"""
+测试采样分析
+"""
+
+import json
+import os
+import tempfile
+import threading
+
+from utils.sampling_profiler import PROFILE_ENV, SamplingProfiler
+from epub.content_processor import ContentProcessor
+from crawler.parse_executor import ParseExecutor
+
+def _sample_page(index: int) -> str:
+    paragraphs = '<br/>'.join(f'第{index}章第{i}段，「对话内容」以及较长的叙述文字。' for i in range(400))
+    return f'<html><body><div id="title">第{index}章</div><div id="content">{paragraphs}</div></body></html>'
+
+def test_stages_and_outputs():
+    """测试线程和工作进程的样本按阶段归类，输出collapsed、speedscope和自身时间汇总"""
+    content = '\n\n'.join(f'「第{i}段对话」以及叙述文字。' * 5 for i in range(3000))
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ[PROFILE_ENV] = directory
+        profiler = SamplingProfiler(interval=0.002, output_dir=directory)
+        profiler.start()
+        try:
+            worker = threading.Thread(target=ContentProcessor().process_content, args=(content,), name='content-thread')
+            worker.start()
+            worker.join()
+            with ParseExecutor(max_workers=1) as executor:
+                executor.parse_batch_sync([_sample_page(i) for i in range(20)])
+        finally:
+            del os.environ[PROFILE_ENV]
+            profiler.stop()
+        profiler.merge_workers()
+        profiler.write()
+
+        files = sorted(os.listdir(directory))
+        with open(os.path.join(directory, 'content.collapsed'), encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        with open(os.path.join(directory, 'profile.speedscope.json'), encoding='utf-8') as f:
+            speedscope = json.load(f)
+
+    assert 'content.collapsed' in files and 'parse.collapsed' in files and 'summary.txt' in files
+    assert 'workers' not in files
+
+    # collapsed格式：线程名开头、分号分隔的栈，末尾为样本数
+    stack, count = lines[0].rsplit(' ', 1)
+    assert stack.startswith('content-thread;') and int(count) > 0
+    assert all('epub/content_processor.py' in line or 'epub/paragraph_classifier.py' in line
+               for line in lines if line.startswith('content-thread;'))
+
+    # 解析进程的样本带有进程前缀
+    assert any(stack.startswith('worker-') for stack in profiler.stacks['parse'])
+
+    names = [profile['name'] for profile in speedscope['profiles']]
+    assert 'content' in names and 'parse' in names
+    frame_count = len(speedscope['shared']['frames'])
+    for profile in speedscope['profiles']:
+        assert len(profile['samples']) == len(profile['weights'])
+        assert all(0 <= index < frame_count for sample in profile['samples'] for index in sample)
+
+    label, seconds = profiler.self_times('content')[0]
+    assert seconds > 0 and '(' in label and ':' in label
+
+if __name__ == "__main__":
+    test_stages_and_outputs()
+    print("所有测试通过")
@@ -0,0 +1,75 @@
+"""
+测试整卷TXT拆分与校验
+"""
+
+from crawler.content_cleaner import ContentCleaner
+from crawler.txt_ingest import TxtVolumeIngest
+
+VOLUME = {
+    'title': '第一卷',
+    'id': 41000,
+    'chapters': [
+        {'id': 41001, 'title': '序章　春天', 'url': 'https://www.wenku8.net/novel/1/1213/41001.htm'},
+        {'id': 41002, 'title': '第一章 相遇', 'url': 'https://www.wenku8.net/novel/1/1213/41002.htm'},
+        {'id': 41003, 'title': '第二章 离别', 'url': 'https://www.wenku8.net/novel/1/1213/41003.htm'},
+        {'id': 41004, 'title': '第三章 重逢', 'url': 'https://www.wenku8.net/novel/1/1213/41004.htm'},
+        {'id': 41005, 'title': '后记', 'url': 'https://www.wenku8.net/novel/1/1213/41005.htm'},
+    ],
+    'images': [{'id': 41006, 'title': '插图', 'url': 'https://www.wenku8.net/novel/1/1213/41006.htm'}],
+}
+
+# 第二章在TXT中缺失，后记只有标题没有正文
+TXT = '\r\n'.join([
+    '第一卷',
+    '',
+    '序章 春天',
+    '　　樱花开了。',
+    '　　本文来自 轻小说文库(http://www.wenku8.com)',
+    '',
+    '第一章　相遇',
+    '　　他们在车站相遇。',
+    '　　雨下个不停。',
+    '第三章 重逢',
+    '　　多年以后。',
+    '插图',
+    'http://pic.777743.xyz/1.jpg',
+    '后记',
+    '',
+])
+
+def _ingest() -> TxtVolumeIngest:
+    return TxtVolumeIngest('TestAgent/1.0', ContentCleaner.for_site('https://www.wenku8.net/'))
+
+def test_split_chapters():
+    """测试按目录标题拆分（忽略空白差异），插图页截断，缺失或为空的章节返回给调用方补全"""
+    chapters, missing = _ingest().split_chapters(TXT, VOLUME)
+
+    assert [chapter['id'] for chapter in chapters] == [41001, 41002, 41004]
+    assert chapters[0] == {'id': 41001, 'title': '序章　春天', 'content': '樱花开了。',
+                           'url': VOLUME['chapters'][0]['url']}
+    assert chapters[1]['content'] == '他们在车站相遇。\n\n雨下个不停。'
+    assert chapters[2]['content'] == '多年以后。'
+    assert [entry['id'] for entry in missing] == [41003, 41005]
+
+def test_split_out_of_order_title():
+    """测试目录顺序之前出现的标题不会被匹配（只向后查找）"""
+    volume = {**VOLUME, 'chapters': [VOLUME['chapters'][3], VOLUME['chapters'][1]], 'images': []}
+    chapters, missing = _ingest().split_chapters(TXT, volume)
+    assert [chapter['id'] for chapter in chapters] == [41004]
+    assert [entry['id'] for entry in missing] == [41002]
+
+def test_matches():
+    """测试TXT内容与HTML内容的比对"""
+    ingest = _ingest()
+    text = '他们在车站相遇。\n\n雨下个不停。'
+    assert ingest.matches(text, '他们在车站相遇。 雨下个不停。')
+    assert not ingest.matches(text, '完全不同的另一段内容，和前文没有关系。')
+    assert not ingest.matches(text, '')
+    # 字符相同但顺序打乱的文本不算一致
+    assert not ingest.matches(text, text[::-1])
+
+if __name__ == "__main__":
+    test_split_chapters()
+    test_split_out_of_order_title()
+    test_matches()
+    print("所有测试通过")
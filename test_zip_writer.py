@@ -0,0 +1,117 @@
+"""
+测试流式ZIP写入（用标准库zipfile校验）
+"""
+
+import os
+import tempfile
+import time
+import zipfile
+
+from utils.config import Config
+from epub.epub_writer import StreamingEPUBWriter
+from epub.zip_writer import ZIP_STORED, ZipWriter
+
+METADATA = {'identifier': 'urn:test', 'title': '测试', 'language': 'zh-CN', 'modified': '1980-01-01T00:00:00Z'}
+
+def _chapters(count: int):
+    return [(f'chapter_{i:03d}.xhtml', f'<html><body><p>第{i}章 ' + '正文内容，' * (50 + i * 37) + '</p></body></html>')
+            for i in range(count)]
+
+def _write_epub(path: str, image: str, compress_workers: int = 1, base_path: str = None) -> StreamingEPUBWriter:
+    with StreamingEPUBWriter(path, METADATA, compress_workers=compress_workers, base_path=base_path) as writer:
+        writer.add_css('style', 'style/main.css', 'body { margin: 0; }')
+        for href, content in _chapters(40):
+            writer.add_document(href[:-6], href, content, title=href)
+        writer.add_image('image', 'images/cover.jpg', image)
+    return writer
+
+def test_epub_archive_is_valid():
+    """测试写出的EPUB能被zipfile完整读取：mimetype在首位且不压缩，条目内容一致"""
+    with tempfile.TemporaryDirectory() as directory:
+        image = os.path.join(directory, 'cover.jpg')
+        image_data = os.urandom(3 * 1024 * 1024 + 123)  # 超过一个写入块
+        with open(image, 'wb') as f:
+            f.write(image_data)
+
+        path = os.path.join(directory, 'book.epub')
+        _write_epub(path, image)
+
+        with zipfile.ZipFile(path) as archive:
+            assert archive.testzip() is None
+            infos = archive.infolist()
+            assert infos[0].filename == 'mimetype' and infos[0].compress_type == ZIP_STORED
+            assert infos[1].filename == 'META-INF/container.xml'
+            assert archive.read('mimetype') == b'application/epub+zip'
+            assert archive.getinfo('EPUB/images/cover.jpg').compress_type == ZIP_STORED
+            assert archive.read('EPUB/images/cover.jpg') == image_data
+            assert archive.read('EPUB/style/main.css') == b'body { margin: 0; }'
+            for href, content in _chapters(40):
+                assert archive.read('EPUB/' + href).decode('utf-8').endswith(content)
+            assert {'EPUB/content.opf', 'EPUB/nav.xhtml', 'EPUB/toc.ncx'} <= set(archive.namelist())
+
+        # EPUB阅读器要求文件以无扩展字段的mimetype本地头开始
+        with open(path, 'rb') as f:
+            head = f.read(58)
+        assert head[:4] == b'PK\x03\x04' and head[30:38] == b'mimetype' and head[38:] == b'application/epub+zip'
+
+def test_zip_writer_entries():
+    """测试分块写入文件、复制已压缩条目和重复条目检查"""
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'source.zip')
+        with zipfile.ZipFile(source, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('a.txt', '复制的条目' * 1000)
+
+        data = os.path.join(directory, 'data.bin')
+        with open(data, 'wb') as f:
+            f.write(b'0123456789' * 300000)
+
+        path = os.path.join(directory, 'out.zip')
+        with open(path, 'wb') as f, open(source, 'rb') as src, zipfile.ZipFile(source) as archive:
+            writer = ZipWriter(f, timestamp=Config.EPUB_BUILD_TIMESTAMP)
+            writer.write_bytes('empty', b'')
+            writer.write_file('data.bin', data)
+            writer.copy_entry('copied.txt', src, archive.getinfo('a.txt'))
+            try:
+                writer.write_bytes('empty', b'x')
+                assert False, "重复条目应抛出异常"
+            except ValueError:
+                pass
+            writer.close()
+
+        with zipfile.ZipFile(path) as archive:
+            assert archive.testzip() is None
+            assert archive.namelist() == ['empty', 'data.bin', 'copied.txt']
+            assert archive.read('empty') == b''
+            assert archive.read('data.bin') == b'0123456789' * 300000
+            assert archive.read('copied.txt').decode('utf-8') == '复制的条目' * 1000
+            built = time.gmtime(Config.EPUB_BUILD_TIMESTAMP)
+            assert archive.getinfo('data.bin').date_time == (*built[:5], built.tm_sec // 2 * 2)
+
+def test_parallel_compression_identical():
+    """测试并行压缩与串行压缩的输出逐字节相同"""
+    with tempfile.TemporaryDirectory() as directory:
+        image = os.path.join(directory, 'cover.jpg')
+        with open(image, 'wb') as f:
+            f.write(os.urandom(50000))
+
+        outputs = []
+        for workers in (1, 2, 4):
+            path = os.path.join(directory, f'book_{workers}.epub')
+            writer = _write_epub(path, image, compress_workers=workers)
+            assert writer.compress_workers == workers
+            with open(path, 'rb') as f:
+                outputs.append(f.read())
+        assert outputs[0] == outputs[1] == outputs[2]
+
+        # 增量更新时复制旧条目，输出同样不变
+        path = os.path.join(directory, 'book_incremental.epub')
+        writer = _write_epub(path, image, compress_workers=4, base_path=os.path.join(directory, 'book_1.epub'))
+        assert writer.stats['written'] == 1  # 只有OPF重新写入
+        with open(path, 'rb') as f:
+            assert f.read() == outputs[0]
+
+if __name__ == "__main__":
+    test_epub_archive_is_valid()
+    test_zip_writer_entries()
+    test_parallel_compression_identical()
+    print("所有测试通过")
@@ -0,0 +1,297 @@
+"""
+章节存储模块
+Persistent SQLite chapter store - crawled text is written as it arrives and read back lazily
+"""
+
+import json
+import os
+import sqlite3
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Union
+
+from utils.config import Config
+from utils.logger import logger
+from utils.search_index import SearchIndex
+from utils.text_codec import TextCodec, dictionary_scope
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS volumes (
+    id INTEGER PRIMARY KEY,
+    novel TEXT NOT NULL,
+    title TEXT NOT NULL,
+    position INTEGER NOT NULL DEFAULT 0,
+    images TEXT NOT NULL DEFAULT '[]',
+    complete INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (novel, title)
+);
+CREATE TABLE IF NOT EXISTS chapters (
+    id INTEGER PRIMARY KEY,
+    volume_id INTEGER NOT NULL REFERENCES volumes (id),
+    url TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    content BLOB NOT NULL,
+    length INTEGER NOT NULL,
+    codec TEXT NOT NULL DEFAULT 'zlib',
+    dict_id INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (volume_id, url)
+);
+CREATE INDEX IF NOT EXISTS chapters_position ON chapters (volume_id, position);
+"""
+
+_CHAPTER_COLUMNS = 'volume_id, url, position, title, content, length, codec, dict_id'
+
+def _connect(path: str) -> sqlite3.Connection:
+    """打开数据库（WAL模式：生成EPUB的进程读取时爬虫可以继续写入）"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.executescript(_SCHEMA)
+    return conn
+
+class StoredChapters:
+    """卷册章节的惰性序列，逐章读取并解压，内存中不保留整卷正文
+
+    只保存数据库路径和卷册ID，可以传给其他进程，在使用时各自打开连接。
+    """
+
+    def __init__(self, path: str, volume_id: int):
+        self.path = path
+        self.volume_id = volume_id
+        self._conn: Optional[sqlite3.Connection] = None
+        self._codec: Optional[TextCodec] = None
+        self._ids: Optional[List[int]] = None
+
+    def __getstate__(self):
+        return {'path': self.path, 'volume_id': self.volume_id}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'], state['volume_id'])
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = _connect(self.path)
+        return self._conn
+
+    @property
+    def codec(self) -> TextCodec:
+        """只用于解压，字典按ID读取，与范围无关"""
+        if self._codec is None:
+            self._codec = TextCodec(self.conn, self.path, '')
+        return self._codec
+
+    @property
+    def ids(self) -> List[int]:
+        """已存储章节的ID（按目录顺序）"""
+        if self._ids is None:
+            rows = self.conn.execute(
+                'SELECT id FROM chapters WHERE volume_id = ? ORDER BY position, id', (self.volume_id,)
+            )
+            self._ids = [row[0] for row in rows]
+        return self._ids
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, index: int) -> Dict:
+        row = self.conn.execute(
+            'SELECT title, url, content, codec, dict_id FROM chapters WHERE id = ?', (self.ids[index],)
+        ).fetchone()
+        return self._chapter(row)
+
+    def __iter__(self) -> Iterator[Dict]:
+        rows = self.conn.execute(
+            'SELECT title, url, content, codec, dict_id FROM chapters WHERE volume_id = ? ORDER BY position, id',
+            (self.volume_id,)
+        )
+        for row in rows:
+            yield self._chapter(row)
+
+    def _chapter(self, row) -> Dict:
+        title, url, content, codec, dict_id = row
+        return {'title': title, 'content': self.codec.decode(content, codec, dict_id), 'url': url}
+
+class ChapterStore:
+    """按小说和卷册保存爬取的章节（正文用训练字典压缩，见TextCodec）
+
+    爬虫每得到一章就写入，中断后重新运行会跳过已存储的章节；
+    打包阶段通过load_volume惰性读取，不需要重新爬取。
+    """
+
+    def __init__(self, path: Optional[str] = None, novel: Optional[str] = None):
+        self.path = path or Config.CHAPTER_DB_PATH
+        self.novel = novel or Config.NOVEL_URL
+        self._conn: Optional[sqlite3.Connection] = None
+        self._codec: Optional[TextCodec] = None
+        self._search_index: Optional[SearchIndex] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = _connect(self.path)
+        return self._conn
+
+    @property
+    def codec(self) -> TextCodec:
+        if self._codec is None:
+            self._codec = TextCodec(self.conn, self.path, dictionary_scope(self.novel))
+        return self._codec
+
+    @property
+    def search_index(self) -> SearchIndex:
+        if self._search_index is None:
+            self._search_index = SearchIndex(self.conn)
+        return self._search_index
+
+    def close(self):
+        """写入未提交的索引、等待后台字典训练结束并关闭数据库连接"""
+        if self._search_index is not None:
+            self._search_index.compact()
+            self._search_index = None
+        if self._codec is not None:
+            self._codec.wait()
+            self._codec = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def volume_id(self, title: str, position: int = 0) -> int:
+        """获取（或创建）卷册记录"""
+        with self.conn:
+            self.conn.execute(
+                'INSERT INTO volumes (novel, title, position) VALUES (?, ?, ?) '
+                'ON CONFLICT (novel, title) DO UPDATE SET position = excluded.position',
+                (self.novel, title, position)
+            )
+        row = self.conn.execute(
+            'SELECT id FROM volumes WHERE novel = ? AND title = ?', (self.novel, title)
+        ).fetchone()
+        return row[0]
+
+    def stored_urls(self, volume_id: int) -> Set[str]:
+        """已存储章节的URL"""
+        rows = self.conn.execute('SELECT url FROM chapters WHERE volume_id = ?', (volume_id,))
+        return {row[0] for row in rows}
+
+    def sync_catalog(self, volume_id: int, urls: List[str]) -> int:
+        """按当前目录更新已存储章节的位置，删除已不在目录中的章节，返回删除的章节数"""
+        if not urls:
+            return 0
+        positions: Dict[str, int] = {}
+        for position, url in enumerate(urls):
+            positions.setdefault(url, position)
+
+        rows = self.conn.execute('SELECT id, url FROM chapters WHERE volume_id = ?', (volume_id,)).fetchall()
+        removed = [chapter_id for chapter_id, url in rows if url not in positions]
+        with self.conn:
+            self.conn.executemany(
+                'UPDATE chapters SET position = ? WHERE id = ?',
+                ((positions[url], chapter_id) for chapter_id, url in rows if url in positions)
+            )
+            self.conn.executemany('DELETE FROM chapters WHERE id = ?', ((chapter_id,) for chapter_id in removed))
+        if removed:
+            self.search_index.remove(removed)
+            logger.info(f"删除 {len(removed)} 个已不在目录中的章节")
+        return len(removed)
+
+    def put_chapter(self, volume_id: int, position: int, chapter_data: Dict):
+        """写入（或替换）一章，同一卷册中按URL识别章节"""
+        content = chapter_data['content']
+        blob, codec, dict_id = self.codec.encode(content)
+        with self.conn:
+            self.conn.execute(
+                f'INSERT INTO chapters ({_CHAPTER_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (volume_id, url) DO UPDATE SET position = excluded.position, title = excluded.title, '
+                'content = excluded.content, length = excluded.length, codec = excluded.codec, dict_id = excluded.dict_id',
+                (volume_id, chapter_data['url'], position, chapter_data['title'],
+                 blob, len(content), codec, dict_id)
+            )
+        self.codec.maybe_retrain(self.chapter_count)
+        if Config.SEARCH_INDEX:
+            row = self.conn.execute(
+                'SELECT id FROM chapters WHERE volume_id = ? AND url = ?', (volume_id, chapter_data['url'])
+            ).fetchone()
+            self.search_index.add(row[0], chapter_data['title'], content)
+
+    def search(self, query: str, limit: Optional[int] = None,
+               volume_ids: Optional[Iterable[int]] = None, novel: Optional[str] = None) -> List[Dict]:
+        """全文搜索整个书库（或指定小说、指定卷册）的章节，先为尚未索引的章节补建索引"""
+        missing = self.search_index.missing()
+        if missing:
+            logger.info(f"为 {len(missing)} 个章节补建搜索索引...")
+            for chapter_id in missing:
+                row = self.conn.execute(
+                    'SELECT title, content, codec, dict_id FROM chapters WHERE id = ?', (chapter_id,)
+                ).fetchone()
+                self.search_index.add(chapter_id, row[0], self.codec.decode(row[1], row[2], row[3]))
+        rows = self.conn.execute('SELECT id, novel, title FROM volumes')
+        volumes = {row[0]: (row[1], row[2]) for row in rows if novel is None or row[1] == novel}
+        if volume_ids is not None:
+            volumes = {volume_id: volumes[volume_id] for volume_id in volume_ids if volume_id in volumes}
+        return self.search_index.search(query, volumes, self.codec.decode, limit)
+
+    def chapter_count(self) -> int:
+        """当前小说已存储的章节数"""
+        row = self.conn.execute(
+            'SELECT COUNT(*) FROM chapters c JOIN volumes v ON c.volume_id = v.id WHERE v.novel = ?', (self.novel,)
+        ).fetchone()
+        return row[0]
+
+    def storage_stats(self) -> Dict:
+        """正文原始长度与压缩后大小"""
+        row = self.conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(c.length), 0), COALESCE(SUM(LENGTH(c.content)), 0) '
+            'FROM chapters c JOIN volumes v ON c.volume_id = v.id WHERE v.novel = ?', (self.novel,)
+        ).fetchone()
+        return {'chapters': row[0], 'characters': row[1], 'compressed_bytes': row[2]}
+
+    def images(self, volume_id: int) -> List[str]:
+        """卷册的本地图片路径"""
+        row = self.conn.execute('SELECT images FROM volumes WHERE id = ?', (volume_id,)).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def set_images(self, volume_id: int, images: List[str]):
+        """记录卷册的本地图片路径"""
+        with self.conn:
+            self.conn.execute('UPDATE volumes SET images = ? WHERE id = ?',
+                              (json.dumps(images, ensure_ascii=False), volume_id))
+
+    def mark_complete(self, volume_id: int, complete: bool = True):
+        """标记卷册爬取完成"""
+        with self.conn:
+            self.conn.execute('UPDATE volumes SET complete = ? WHERE id = ?', (int(complete), volume_id))
+
+    def volumes(self) -> List[Dict]:
+        """当前小说的所有卷册（按目录顺序）"""
+        rows = self.conn.execute(
+            'SELECT v.id, v.title, v.position, v.complete, COUNT(c.id), COALESCE(SUM(c.length), 0) '
+            'FROM volumes v LEFT JOIN chapters c ON c.volume_id = v.id '
+            'WHERE v.novel = ? GROUP BY v.id ORDER BY v.position, v.id',
+            (self.novel,)
+        )
+        return [
+            {'id': row[0], 'title': row[1], 'position': row[2], 'complete': bool(row[3]),
+             'chapter_count': row[4], 'length': row[5]}
+            for row in rows
+        ]
+
+    def load_volume(self, volume: Union[int, str]) -> Optional[Dict]:
+        """按卷册ID或标题读取卷册数据，章节为惰性序列"""
+        if isinstance(volume, str):
+            row = self.conn.execute(
+                'SELECT id, title, complete FROM volumes WHERE novel = ? AND title = ?', (self.novel, volume)
+            ).fetchone()
+        else:
+            row = self.conn.execute('SELECT id, title, complete FROM volumes WHERE id = ?', (volume,)).fetchone()
+
+        if row is None:
+            logger.warning(f"章节存储中没有卷册: {volume}")
+            return None
+
+        volume_id, title, complete = row
+        return {
+            'title': title,
+            'chapters': StoredChapters(self.path, volume_id),
+            'images': self.images(volume_id),
+            'complete': bool(complete),
+        }
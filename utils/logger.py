@@ -1,85 +1,217 @@
 """
 日志记录模块
-Logging module
+Logging module - records are queued on the calling thread and written by a background listener
 """
 
+import atexit
+import contextvars
+import gzip
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import shutil
+import sys
+from contextlib import contextmanager
 from datetime import datetime
 from typing import Optional
 
+from utils.config import Config
+
+# 当前卷册和章节（asyncio任务各自继承一份上下文，并发爬取时互不干扰）
+log_volume: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('log_volume', default=None)
+log_chapter: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('log_chapter', default=None)
+
+@contextmanager
+def log_context(volume: Optional[str] = None, chapter: Optional[str] = None):
+    """在代码块内为日志附加卷册/章节字段"""
+    tokens = []
+    if volume is not None:
+        tokens.append((log_volume, log_volume.set(volume)))
+    if chapter is not None:
+        tokens.append((log_chapter, log_chapter.set(chapter)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+class LazyFileHandler(logging.handlers.RotatingFileHandler):
+    """按大小轮转的日志文件，轮转出的旧文件用gzip压缩
+
+    第一次写入日志时才创建日志目录和文件，只导入模块或查看帮助时不产生空日志文件。
+    """
+
+    def __init__(self, filename: str, max_bytes: int, backup_count: int, encoding: Optional[str] = None):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding, delay=True)
+        self.namer = lambda name: name + '.gz'
+        self.rotator = self._compress
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename) or '.', exist_ok=True)
+        return super()._open()
+
+    @staticmethod
+    def _compress(source: str, dest: str):
+        with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.remove(source)
+
+class ChildFileHandler(logging.handlers.WatchedFileHandler):
+    """子进程使用的日志文件处理器：只追加不轮转，主进程轮转后自动重新打开"""
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename) or '.', exist_ok=True)
+        return super()._open()
+
+class ContextFilter(logging.Filter):
+    """在调用线程中为日志记录附加运行ID和当前卷册/章节"""
+
+    def __init__(self, run_id: str):
+        super().__init__()
+        self.run_id = run_id
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.run = self.run_id
+        record.volume = log_volume.get()
+        record.chapter = log_chapter.get()
+        return True
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """把日志记录放入队列，消息格式化留给后台监听线程
+
+    队列只在本进程内使用，记录不需要序列化，调用线程只做一次入队。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+class JSONFormatter(logging.Formatter):
+    """JSON Lines格式：每条日志一行，包含运行ID、卷册和章节字段"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'message': record.getMessage(),
+            'run': getattr(record, 'run', None),
+            'process': record.process,
+            'module': record.module,
+            'line': record.lineno,
+        }
+        for field in ('volume', 'chapter'):
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
 class Logger:
-    """日志记录器类"""
-    
+    """日志记录器类
+
+    调用方只把记录放入队列，文件和控制台输出在QueueListener线程中完成，
+    不在事件循环线程上做磁盘I/O。低于输出级别的日志在创建记录前就被丢弃；
+    热点路径可以使用 logger.debug("访问页面: %s", url) 推迟字符串格式化。
+    """
+
     _instance: Optional['Logger'] = None
     _logger: Optional[logging.Logger] = None
-    
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
         return cls._instance
-    
+
     def __init__(self):
         if self._logger is None:
+            self._listener: Optional[logging.handlers.QueueListener] = None
+            self.run_pid = os.getpid()
+            self.run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{self.run_pid}"
             self._setup_logger()
-    
+            atexit.register(self.shutdown)
+            if hasattr(os, 'register_at_fork'):
+                os.register_at_fork(after_in_child=self._setup_logger)
+
     def _setup_logger(self):
-        """设置日志记录器"""
-        # 确保日志目录存在
-        log_dir = "logs"
-        os.makedirs(log_dir, exist_ok=True)
-        
-        # 创建日志文件名（包含时间戳）
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        log_file = os.path.join(log_dir, f"novel_crawler_{timestamp}.log")
-        
-        # 创建logger
-        self._logger = logging.getLogger("NovelCrawler")
-        self._logger.setLevel(logging.DEBUG)
-        
-        # 清除已有的处理器
-        self._logger.handlers.clear()
-        
-        # 创建文件处理器
-        file_handler = logging.FileHandler(log_file, encoding='utf-8')
-        file_handler.setLevel(logging.DEBUG)
-        
+        """设置日志记录器（fork出的子进程中会重新设置，监听线程不会被继承）"""
+        # spawn方式启动的子进程在导入本模块前已经导入了multiprocessing
+        mp = sys.modules.get('multiprocessing')
+        child = (mp is not None and mp.parent_process() is not None) or os.getpid() != self.run_pid
+        self._listener = None
+        log_file = os.path.join(Config.LOG_DIR, Config.LOG_FILE_NAME)
+
+        # 创建文件处理器（主进程负责轮转，子进程只追加）
+        if child:
+            file_handler = ChildFileHandler(log_file, encoding='utf-8')
+        else:
+            file_handler = LazyFileHandler(log_file, Config.LOG_MAX_BYTES, Config.LOG_BACKUP_COUNT, encoding='utf-8')
+        file_handler.setLevel(Config.LOG_FILE_LEVEL)
+
         # 创建控制台处理器
         console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.INFO)
-        
+        console_handler.setLevel(Config.LOG_CONSOLE_LEVEL)
+
         # 创建格式器
         formatter = logging.Formatter(
             '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
             datefmt='%Y-%m-%d %H:%M:%S'
         )
-        
-        file_handler.setFormatter(formatter)
+        file_handler.setFormatter(JSONFormatter() if Config.LOG_FORMAT == 'json' else formatter)
         console_handler.setFormatter(formatter)
-        
-        # 添加处理器到logger
-        self._logger.addHandler(file_handler)
-        self._logger.addHandler(console_handler)
-    
-    def debug(self, message: str):
+
+        # 创建logger，级别取两个输出中较低者，更低级别的调用直接返回
+        self._logger = logging.getLogger("NovelCrawler")
+        self._logger.setLevel(min(file_handler.level, console_handler.level))
+        self._logger.handlers.clear()
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = DeferredQueueHandler(log_queue)
+        queue_handler.addFilter(ContextFilter(self.run_id))
+        self._logger.addHandler(queue_handler)
+
+        self._listener = logging.handlers.QueueListener(
+            log_queue, file_handler, console_handler, respect_handler_level=True
+        )
+        self._listener.start()
+
+    def shutdown(self):
+        """写出队列中剩余的日志并停止监听线程"""
+        if self._listener is not None:
+            self._listener.stop()
+            for handler in self._listener.handlers:
+                handler.close()
+            self._listener = None
+
+    def reconfigure(self):
+        """写出已有日志后按当前配置重新设置（命令行修改日志配置后调用）"""
+        self.shutdown()
+        self._setup_logger()
+
+    def is_enabled(self, level: int) -> bool:
+        """该级别的日志是否会被输出（用于跳过代价较高的消息构造）"""
+        return self._logger.isEnabledFor(level)
+
+    def debug(self, message: str, *args):
         """记录调试信息"""
-        self._logger.debug(message)
-    
-    def info(self, message: str):
+        self._logger.debug(message, *args, stacklevel=2)
+
+    def info(self, message: str, *args):
         """记录一般信息"""
-        self._logger.info(message)
-    
-    def warning(self, message: str):
+        self._logger.info(message, *args, stacklevel=2)
+
+    def warning(self, message: str, *args):
         """记录警告信息"""
-        self._logger.warning(message)
-    
-    def error(self, message: str):
+        self._logger.warning(message, *args, stacklevel=2)
+
+    def error(self, message: str, *args):
         """记录错误信息"""
-        self._logger.error(message)
-    
-    def critical(self, message: str):
+        self._logger.error(message, *args, stacklevel=2)
+
+    def critical(self, message: str, *args):
         """记录严重错误信息"""
-        self._logger.critical(message)
+        self._logger.critical(message, *args, stacklevel=2)
 
 # 创建全局logger实例
 logger = Logger()
@@ -0,0 +1,166 @@
+"""
+事件循环阻塞检测模块
+Event-loop lag watchdog - samples the loop thread's stack while it is blocked
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from utils.config import Config
+from utils.logger import logger
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _call_site(frame) -> Tuple[str, List[str]]:
+    """从被阻塞的栈中找出调用点：最内层的项目代码帧（没有时取最内层帧），并返回完整栈"""
+    stack = traceback.extract_stack(frame)
+    site = None
+    for entry in reversed(stack):
+        if entry.filename.startswith('<'):
+            continue
+        filename = os.path.abspath(entry.filename)
+        if filename.startswith(_PROJECT_ROOT + os.sep) and 'site-packages' not in filename \
+                and filename != os.path.abspath(__file__):
+            site = entry
+            break
+    site = site or stack[-1]
+    key = f"{os.path.relpath(site.filename, _PROJECT_ROOT)}:{site.lineno} ({site.name})"
+    return key, traceback.format_list(stack[-Config.LOOP_WATCHDOG_STACK_DEPTH:])
+
+class LoopWatchdog:
+    """检测asyncio事件循环阻塞，按调用点汇总阻塞时间
+
+    事件循环中每隔interval秒执行一次心跳回调；监视线程发现心跳逾期时，用
+    sys._current_frames()取得事件循环线程当前的栈，并在阻塞期间持续采样。
+    心跳恢复后，若延迟超过threshold秒，把这次阻塞的时间按采样次数分摊到各调用点。
+
+    用法:
+        async with LoopWatchdog() as watchdog:
+            ...
+        watchdog.log_report()
+    """
+
+    def __init__(self, threshold: Optional[float] = None, interval: Optional[float] = None):
+        self.threshold = threshold or Config.LOOP_WATCHDOG_THRESHOLD
+        self.interval = interval or Config.LOOP_WATCHDOG_INTERVAL
+        self.sites: Dict[str, Dict] = {}
+        self.stalls = 0
+        self.total_blocked = 0.0
+        self.max_lag = 0.0
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._last_beat = 0.0
+        self._samples: List[Tuple[str, List[str]]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+
+    async def __aenter__(self) -> 'LoopWatchdog':
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        """开始检测（需在事件循环线程中调用）"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        self._stop.clear()
+        self._handle = self._loop.call_later(self.interval, self._beat)
+        self._thread = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._thread.start()
+        logger.info(f"事件循环阻塞检测已启动（阈值 {self.threshold * 1000:.0f}ms）")
+
+    def stop(self):
+        """停止检测（在事件循环线程中调用时结算最后一次阻塞）"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+            if threading.get_ident() == self._loop_thread:
+                self._settle(max(time.perf_counter() - self._last_beat - self.interval, 0.0))
+
+    def _beat(self):
+        """心跳（在事件循环中执行），结算上一次阻塞"""
+        now = time.perf_counter()
+        lag = now - self._last_beat - self.interval
+        self._last_beat = now
+        self._settle(lag)
+
+        if not self._stop.is_set():
+            self._handle = self._loop.call_later(self.interval, self._beat)
+
+    def _settle(self, lag: float):
+        """取出阻塞期间的采样，延迟超过阈值时记录"""
+        with self._lock:
+            samples, self._samples = self._samples, []
+        if lag >= self.threshold:
+            self._record(lag, samples)
+
+    def _watch(self):
+        """监视线程：心跳超时期间对事件循环线程采样"""
+        # 心跳一旦逾期就开始采样，短于阈值的阻塞在心跳恢复时丢弃
+        poll = min(self.interval, self.threshold) / 2
+        while not self._stop.wait(poll):
+            if time.perf_counter() - self._last_beat - self.interval < poll:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            sample = _call_site(frame)
+            with self._lock:
+                self._samples.append(sample)
+
+    def _record(self, lag: float, samples: List[Tuple[str, List[str]]]):
+        """把一次阻塞的时间按采样分摊到调用点"""
+        self.stalls += 1
+        self.total_blocked += lag
+        self.max_lag = max(self.max_lag, lag)
+        samples = samples or [('<阻塞时间短于采样间隔>', [])]
+
+        stacks = dict(samples)
+        counts = Counter(key for key, _ in samples)
+        for key, count in counts.items():
+            blocked = lag * count / len(samples)
+            site = self.sites.setdefault(key, {'site': key, 'count': 0, 'total': 0.0, 'max': 0.0,
+                                               'stack': stacks[key]})
+            site['count'] += 1
+            site['total'] += blocked
+            site['max'] = max(site['max'], blocked)
+
+        if lag >= Config.LOOP_WATCHDOG_WARN:
+            logger.warning(f"事件循环阻塞 {lag * 1000:.0f}ms: {counts.most_common(1)[0][0]}")
+
+    def report(self) -> List[Dict]:
+        """按累计阻塞时间排序的调用点汇总"""
+        return sorted(self.sites.values(), key=lambda site: site['total'], reverse=True)
+
+    def log_report(self, top: int = 10):
+        """输出汇总"""
+        if not self.stalls:
+            logger.info("事件循环阻塞检测: 没有超过阈值的阻塞")
+            return
+
+        lines = [f"事件循环阻塞检测: {self.stalls} 次阻塞，合计 {self.total_blocked:.2f}秒，"
+                 f"最长 {self.max_lag * 1000:.0f}ms"]
+        for site in self.report()[:top]:
+            lines.append(f"  {site['total'] * 1000:9.0f}ms  {site['count']:>4}次  最长 {site['max'] * 1000:6.0f}ms  "
+                         f"{site['site']}")
+        worst = self.report()[0]
+        if worst['stack']:
+            lines.append("  阻塞最久的调用栈:")
+            lines.extend('    ' + line.rstrip().replace('\n', '\n    ') for line in worst['stack'])
+        logger.info('\n'.join(lines))
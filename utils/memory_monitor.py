@@ -0,0 +1,208 @@
+"""
+内存监控模块
+Memory accounting - tracemalloc and RSS peaks per stage and volume, with a soft ceiling that throttles fetching
+"""
+
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from utils.config import Config
+from utils.logger import logger
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def process_rss(pid: Optional[int] = None) -> int:
+    """进程当前的常驻内存（字节），无法读取时为0"""
+    try:
+        with open(f"/proc/{pid or 'self'}/statm", 'r') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        pass
+    if pid is None:
+        try:
+            import resource
+            # 没有/proc时只能取得峰值（Linux为KB，macOS为字节）
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if sys.platform == 'darwin' else peak * 1024
+        except (ImportError, OSError):
+            pass
+    return 0
+
+def total_rss() -> int:
+    """本进程与解析、打包工作进程的常驻内存之和"""
+    total = process_rss()
+    multiprocessing = sys.modules.get('multiprocessing')
+    if multiprocessing is not None:
+        for child in multiprocessing.active_children():
+            total += process_rss(child.pid)
+    return total
+
+def _mb(size: int) -> str:
+    return f"{size / 1024 / 1024:.1f} MB"
+
+class MemoryMonitor:
+    """内存受限模式：按阶段和卷册记录内存峰值，接近上限时让爬取等待
+
+    tracemalloc记录Python对象分配的峰值，后台线程定时读取/proc中的RSS；
+    track()可以嵌套，内层的峰值同时计入外层。limit_mb为0时不启用，所有方法都是空操作。
+    工作进程中的峰值由工作进程自己测量，随生成结果返回后用record()汇总。
+    """
+
+    def __init__(self, limit_mb: Optional[int] = None, interval: Optional[float] = None):
+        self.limit = (Config.MEMORY_LIMIT_MB if limit_mb is None else limit_mb) * 1024 * 1024
+        self.enabled = self.limit > 0
+        self.interval = interval or Config.MEMORY_SAMPLE_INTERVAL
+        # (阶段, 卷册) -> {'rss': 峰值, 'traced': 峰值}
+        self.peaks: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self.peak_total = 0
+        self.throttled = 0
+        self.throttled_seconds = 0.0
+
+        self._active: List[Tuple[str, str]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._owns_tracing = False
+
+    def start(self):
+        """开始记录（未启用时不做任何事）"""
+        if not self.enabled:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracing = True
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='memory-monitor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止记录"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._owns_tracing:
+            tracemalloc.stop()
+            self._owns_tracing = False
+
+    def __enter__(self) -> 'MemoryMonitor':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        """把当前RSS计入所有进行中的阶段"""
+        rss = process_rss()
+        total = total_rss()
+        with self._lock:
+            self.peak_total = max(self.peak_total, total)
+            for key in self._active:
+                peak = self.peaks[key]
+                peak['rss'] = max(peak['rss'], rss)
+
+    @contextmanager
+    def track(self, stage: str, volume: str = ''):
+        """记录一个阶段（可指定卷册）期间的内存峰值"""
+        if not self.enabled:
+            yield
+            return
+
+        key = (stage, volume)
+        with self._lock:
+            self.peaks.setdefault(key, {'rss': 0, 'traced': 0})
+            self._active.append(key)
+        self._fold_traced()
+        self._sample()
+        try:
+            yield
+        finally:
+            self._sample()
+            self._fold_traced()
+            with self._lock:
+                self._active.remove(key)
+
+    def _fold_traced(self):
+        """把上次重置以来的tracemalloc峰值计入进行中的阶段，然后重置峰值"""
+        if not tracemalloc.is_tracing():
+            return
+        traced = tracemalloc.get_traced_memory()[1]
+        with self._lock:
+            for key in self._active:
+                peak = self.peaks[key]
+                peak['traced'] = max(peak['traced'], traced)
+        if hasattr(tracemalloc, 'reset_peak'):  # Python 3.9+
+            tracemalloc.reset_peak()
+
+    def peak(self, stage: str, volume: str = '') -> Optional[Dict[str, int]]:
+        """某个阶段的峰值"""
+        peak = self.peaks.get((stage, volume))
+        return dict(peak) if peak else None
+
+    def record(self, stage: str, volume: str, peak: Optional[Dict[str, int]]):
+        """汇总工作进程返回的峰值"""
+        if not self.enabled or not peak:
+            return
+        with self._lock:
+            current = self.peaks.setdefault((stage, volume), {'rss': 0, 'traced': 0})
+            current['rss'] = max(current['rss'], peak['rss'])
+            current['traced'] = max(current['traced'], peak['traced'])
+
+    def over_limit(self) -> bool:
+        """内存是否接近上限（本进程加工作进程）"""
+        return self.enabled and total_rss() >= self.limit * Config.MEMORY_THROTTLE_RATIO
+
+    async def throttle(self):
+        """接近上限时先回收垃圾，仍然超出则等待工作进程完成生成后再继续爬取"""
+        if not self.over_limit():
+            return
+
+        gc.collect()
+        if not self.over_limit():
+            return
+
+        import asyncio
+        
+        self.throttled += 1
+        start = time.perf_counter()
+        logger.warning(f"内存 {_mb(total_rss())} 接近上限 {_mb(self.limit)}，暂停爬取")
+        while self.over_limit() and time.perf_counter() - start < Config.MEMORY_THROTTLE_MAX_WAIT:
+            await asyncio.sleep(Config.MEMORY_THROTTLE_POLL)
+        waited = time.perf_counter() - start
+        self.throttled_seconds += waited
+        if self.over_limit():
+            logger.warning(f"等待 {waited:.1f}秒后内存仍未降到上限以下，继续爬取")
+        else:
+            logger.info(f"内存已降至 {_mb(total_rss())}，恢复爬取（等待 {waited:.1f}秒）")
+
+    def release(self):
+        """卷册处理完成后回收已释放的正文和图片对象"""
+        if self.enabled:
+            gc.collect()
+
+    def report(self) -> List[Dict]:
+        """按卷册和阶段列出的峰值"""
+        return [{'stage': stage, 'volume': volume, **peak} for (stage, volume), peak in self.peaks.items()]
+
+    def log_report(self):
+        """输出峰值汇总"""
+        if not self.enabled:
+            return
+        lines = [f"=== 内存峰值（上限 {_mb(self.limit)}）==="]
+        for entry in self.report():
+            name = f"{entry['volume']} / {entry['stage']}" if entry['volume'] else entry['stage']
+            lines.append(f"  {name}: RSS {_mb(entry['rss'])}，Python分配 {_mb(entry['traced'])}")
+        lines.append(f"  全部进程RSS峰值 {_mb(self.peak_total)}，暂停爬取 {self.throttled} 次"
+                     f"（共 {self.throttled_seconds:.1f}秒）")
+        logger.info('\n'.join(lines))
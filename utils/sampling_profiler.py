@@ -0,0 +1,218 @@
+"""
+采样分析器模块
+Low-overhead sampling profiler - per-stage collapsed stacks, speedscope output and a self-time summary
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from utils.config import Config
+from utils.logger import logger
+
+# 工作进程通过该环境变量得知需要采样以及结果写到哪里（fork和spawn启动的进程都会继承）
+PROFILE_ENV = 'NOVEL_CRAWLER_PROFILE_DIR'
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 线程在这些函数中表示处于空闲等待，不计入采样
+_IDLE_FRAMES = {
+    ('threading.py', 'wait'), ('selectors.py', 'select'), ('queue.py', 'get'),
+    ('handlers.py', 'dequeue'), ('thread.py', '_worker'), ('connection.py', '_recv'),
+    ('connection.py', 'wait'), ('popen_fork.py', 'poll'), ('queues.py', '_feed'),
+    ('threading.py', '_wait_for_tstate_lock'),
+}
+
+def _relative(filename: str) -> str:
+    """项目内文件显示相对路径，第三方库从包名开始显示"""
+    if filename.startswith(_PROJECT_ROOT + os.sep):
+        return os.path.relpath(filename, _PROJECT_ROOT).replace(os.sep, '/')
+    marker = 'site-packages' + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1].replace(os.sep, '/')
+    return os.path.basename(filename)
+
+class SamplingProfiler:
+    """对进程内所有线程定时采样调用栈
+
+    后台线程每隔interval秒读取一次 sys._current_frames()，事件循环线程（异步任务）和
+    线程池线程都会被采样。每个样本按最内层匹配PROFILER_STAGES的帧归入一个阶段
+    （爬取、解析、内容处理、打包），解析和打包所在的工作进程各自采样后写入临时文件，
+    由主进程在结束时合并输出。
+    """
+
+    def __init__(self, interval: Optional[float] = None, output_dir: Optional[str] = None):
+        self.interval = interval or Config.PROFILER_INTERVAL
+        self.output_dir = output_dir or Config.PROFILER_DIR
+        # 阶段 -> {调用栈(从外到内): 样本数}
+        self.stacks: Dict[str, Counter] = defaultdict(Counter)
+        self.samples = 0
+        self._labels: Dict[Tuple[str, str, int], Tuple[str, str]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+
+    def start(self):
+        """开始采样"""
+        self._stop.clear()
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止采样"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    self._sample(frame, names.get(ident, str(ident)))
+
+    def _label(self, code) -> Tuple[str, str]:
+        """帧的显示名和所在文件（按代码对象缓存）"""
+        key = (code.co_filename, code.co_name, code.co_firstlineno)
+        label = self._labels.get(key)
+        if label is None:
+            path = _relative(code.co_filename)
+            label = (f"{code.co_name} ({path}:{code.co_firstlineno})", path)
+            self._labels[key] = label
+        return label
+
+    def _sample(self, frame, thread_name: str):
+        code = frame.f_code
+        if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+            return
+
+        stack = []
+        stage = None
+        while frame is not None:
+            label, path = self._label(frame.f_code)
+            stack.append(label)
+            if stage is None:
+                stage = self._stage(path)
+            frame = frame.f_back
+        stack.append(thread_name)
+        stack.reverse()
+
+        self.stacks[stage or 'other'][';'.join(stack)] += 1
+        self.samples += 1
+
+    @staticmethod
+    def _stage(path: str) -> Optional[str]:
+        for stage, prefixes in Config.PROFILER_STAGES:
+            if path.startswith(prefixes):
+                return stage
+        return None
+
+    def dump_worker(self):
+        """工作进程：把采样结果写到共享目录，由主进程合并"""
+        self.stop()
+        directory = os.path.join(self.output_dir, 'workers')
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        with open(path + '.part', 'w', encoding='utf-8') as f:
+            json.dump({'interval': self.interval, 'stacks': self.stacks}, f, ensure_ascii=False)
+        os.replace(path + '.part', path)
+
+    def merge_workers(self):
+        """合并工作进程的采样结果"""
+        directory = os.path.join(self.output_dir, 'workers')
+        if not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for stage, stacks in data['stacks'].items():
+                for stack, count in stacks.items():
+                    self.stacks[stage][f'worker-{name[:-5]};{stack}'] += count
+                    self.samples += count
+            os.remove(path)
+        os.rmdir(directory)
+
+    def self_times(self, stage: Optional[str] = None) -> List[Tuple[str, float]]:
+        """按自身时间（样本中位于栈顶的时间）排序的函数"""
+        counts = Counter()
+        for name, stacks in self.stacks.items():
+            if stage is None or name == stage:
+                for stack, count in stacks.items():
+                    counts[stack.rsplit(';', 1)[-1]] += count
+        return [(label, count * self.interval) for label, count in counts.most_common()]
+
+    def write(self) -> str:
+        """写出各阶段的collapsed栈、speedscope文件和自身时间汇总，返回输出目录"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        for stage, stacks in self.stacks.items():
+            with open(os.path.join(self.output_dir, f'{stage}.collapsed'), 'w', encoding='utf-8') as f:
+                for stack, count in sorted(stacks.items()):
+                    f.write(f'{stack} {count}\n')
+
+        with open(os.path.join(self.output_dir, 'profile.speedscope.json'), 'w', encoding='utf-8') as f:
+            json.dump(self._speedscope(), f, ensure_ascii=False)
+
+        with open(os.path.join(self.output_dir, 'summary.txt'), 'w', encoding='utf-8') as f:
+            f.write(self.summary(Config.PROFILER_TOP * 3) + '\n')
+        return self.output_dir
+
+    def _speedscope(self) -> Dict:
+        """speedscope格式：每个阶段一个sampled profile，共享帧表"""
+        frames: List[Dict] = []
+        index: Dict[str, int] = {}
+        profiles = []
+        for stage, stacks in sorted(self.stacks.items()):
+            samples, weights = [], []
+            for stack, count in stacks.items():
+                ids = []
+                for label in stack.split(';'):
+                    if label not in index:
+                        index[label] = len(frames)
+                        frames.append({'name': label})
+                    ids.append(index[label])
+                samples.append(ids)
+                weights.append(round(count * self.interval, 6))
+            profiles.append({
+                'type': 'sampled', 'name': stage, 'unit': 'seconds',
+                'startValue': 0, 'endValue': round(sum(weights), 6),
+                'samples': samples, 'weights': weights,
+            })
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'shared': {'frames': frames},
+            'profiles': profiles,
+            'name': Config.EPUB_TITLE,
+            'exporter': 'novel-crawler sampling profiler',
+        }
+
+    def summary(self, top: Optional[int] = None) -> str:
+        """各阶段采样时间和自身时间最多的函数"""
+        top = top or Config.PROFILER_TOP
+        lines = [f"采样分析: {self.samples} 个样本（间隔 {self.interval * 1000:.0f}ms），"
+                 f"运行 {time.perf_counter() - self._started:.1f}秒"]
+        for stage, stacks in sorted(self.stacks.items(), key=lambda item: -sum(item[1].values())):
+            lines.append(f"  {stage:<10} {sum(stacks.values()) * self.interval:8.2f}秒")
+        lines.append("  自身时间最多的函数:")
+        for label, seconds in self.self_times()[:top]:
+            lines.append(f"    {seconds:8.2f}秒  {label}")
+        return '\n'.join(lines)
+
+def profile_worker():
+    """工作进程初始化时调用：主进程开启了--profile时在本进程内采样，进程退出时写出结果"""
+    output_dir = os.environ.get(PROFILE_ENV)
+    if not output_dir:
+        return
+    from multiprocessing import util
+
+    profiler = SamplingProfiler(output_dir=output_dir)
+    profiler.start()
+    # 进程池工作进程退出时不执行atexit，使用multiprocessing的退出回调
+    util.Finalize(None, profiler.dump_worker, exitpriority=10)
@@ -0,0 +1,286 @@
+"""
+全文搜索索引模块
+CJK bigram inverted index over stored chapters, with fixed-width array posting lists
+"""
+
+import math
+import re
+import sqlite3
+import sys
+import time
+from array import array
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from utils.config import Config
+from utils.logger import logger
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_docs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chapter_id INTEGER NOT NULL UNIQUE,
+    length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS search_terms (
+    term TEXT NOT NULL,
+    first_doc INTEGER NOT NULL,
+    df INTEGER NOT NULL,
+    postings BLOB NOT NULL,
+    PRIMARY KEY (term, first_doc)
+) WITHOUT ROWID;
+"""
+
+# 中日文字（汉字、假名）连续片段，以及拉丁字母/数字单词
+_CJK_RUN = re.compile(r'[぀-ヿ㐀-䶿一-鿿豈-﫿]+')
+_WORD = re.compile(r'[a-z0-9]+')
+
+def tokenize(text: str, unigrams: bool = False) -> Iterable[str]:
+    """切分索引词：汉字片段取相邻二字组（单字片段保留单字），英文数字按单词
+
+    unigrams为True时（建立索引）另外产生每个单字，单字查询可以找到出现在片段任意位置的字。
+    """
+    text = text.lower()
+    for match in _CJK_RUN.finditer(text):
+        run = match.group()
+        if unigrams or len(run) == 1:
+            yield from run
+        for i in range(len(run) - 1):
+            yield run[i:i + 2]
+    for match in _WORD.finditer(text):
+        yield match.group()
+
+def encode_postings(postings: Iterable[Tuple[int, int]]) -> bytes:
+    """倒排表编码：定长数组，先是全部文档ID（uint32），再是对应的词频（uint16，超出时截断）
+
+    定长格式用array整块解码，长倒排表的读取不经过逐字节的Python循环。
+    """
+    docs, tfs = array('I'), array('H')
+    for doc, tf in postings:
+        docs.append(doc)
+        tfs.append(min(tf, 0xffff))
+    if sys.byteorder == 'big':
+        docs.byteswap()
+        tfs.byteswap()
+    return docs.tobytes() + tfs.tobytes()
+
+def decode_postings(blob: bytes) -> Tuple[array, array]:
+    """倒排表解码，返回 (文档ID数组, 词频数组)"""
+    count = len(blob) // 6
+    docs, tfs = array('I'), array('H')
+    docs.frombytes(blob[:count * 4])
+    tfs.frombytes(blob[count * 4:])
+    if sys.byteorder == 'big':
+        docs.byteswap()
+        tfs.byteswap()
+    return docs, tfs
+
+class SearchIndex:
+    """章节全文索引（与章节存储同库）
+
+    每个索引词的倒排表由若干段组成：新章节先在内存中累积，达到SEARCH_FLUSH_DOCS章
+    或搜索/关闭时每个词写入一段，不读取也不重写已有的段；段数超过SEARCH_MAX_SEGMENTS
+    的词在compact时合并为一段，同时去掉已被替换章节的旧倒排项。
+    文档记录与倒排段在同一事务中写入，进程中断时尚未写入的章节没有文档记录，由missing找回。
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        conn.executescript(_SCHEMA)
+        # 倒排项中的文档号是_pending_docs中的序号，写入时加上数据库中的下一个文档ID
+        self._pending: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self._pending_docs: List[Optional[Tuple[int, int]]] = []
+        self.flushes = 0
+
+    def add(self, chapter_id: int, title: str, content: str):
+        """加入（或替换）一章"""
+        self._drop_pending({chapter_id})
+        doc = len(self._pending_docs)
+        self._pending_docs.append((chapter_id, len(content)))
+        for term, tf in Counter(tokenize(f'{title}\n{content}', unigrams=True)).items():
+            self._pending[term].append((doc, tf))
+
+        if len(self._pending_docs) >= Config.SEARCH_FLUSH_DOCS:
+            self.flush()
+
+    def remove(self, chapter_ids: Iterable[int]):
+        """删除章节的文档记录，倒排表中的旧项在compact时去掉"""
+        chapter_ids = set(chapter_ids)
+        self._drop_pending(chapter_ids)
+        with self.conn:
+            self.conn.executemany('DELETE FROM search_docs WHERE chapter_id = ?',
+                                  ((chapter_id,) for chapter_id in chapter_ids))
+
+    def _drop_pending(self, chapter_ids: Set[int]):
+        """从内存中去掉这些章节尚未写入的文档和倒排项
+
+        写入时没有文档记录的序号不会占用文档ID，留下的倒排项会被之后的文档继承，必须一并去掉。
+        """
+        dropped = {doc for doc, entry in enumerate(self._pending_docs) if entry and entry[0] in chapter_ids}
+        if not dropped:
+            return
+        for doc in dropped:
+            self._pending_docs[doc] = None
+        for term in list(self._pending):
+            postings = [posting for posting in self._pending[term] if posting[0] not in dropped]
+            if postings:
+                self._pending[term] = postings
+            else:
+                del self._pending[term]
+
+    def flush(self):
+        """把内存中累积的文档记录和倒排项（作为新的段）在同一事务中写入数据库"""
+        if not self._pending_docs:
+            return
+        with self.conn:
+            # 在写事务中取下一个文档ID，其他连接同时写入时也不会冲突
+            self.conn.execute('BEGIN IMMEDIATE')
+            base = self.conn.execute(
+                "SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'search_docs'), 0), "
+                "COALESCE((SELECT MAX(id) FROM search_docs), 0)) + 1"
+            ).fetchone()[0]
+            # 同一章节已写入的旧文档记录被替换，旧倒排项在compact时去掉
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO search_docs (id, chapter_id, length) VALUES (?, ?, ?)',
+                ((base + doc, entry[0], entry[1]) for doc, entry in enumerate(self._pending_docs) if entry)
+            )
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO search_terms (term, first_doc, df, postings) VALUES (?, ?, ?, ?)',
+                ((term, base + postings[0][0], len(postings),
+                  encode_postings((base + doc, tf) for doc, tf in postings))
+                 for term, postings in self._pending.items())
+            )
+        self._pending.clear()
+        self._pending_docs = []
+        self.flushes += 1
+
+    def compact(self):
+        """合并段数过多的倒排表，去掉已不存在的文档"""
+        self.flush()
+        terms = [row[0] for row in self.conn.execute(
+            'SELECT term FROM search_terms GROUP BY term HAVING COUNT(*) > ?', (Config.SEARCH_MAX_SEGMENTS,)
+        )]
+        if not terms:
+            return
+
+        start = time.perf_counter()
+        live = {row[0] for row in self.conn.execute('SELECT id FROM search_docs')}
+        with self.conn:
+            for term in terms:
+                postings = sorted(
+                    (doc, tf) for doc, tf in self._postings(term).items() if doc in live
+                )
+                self.conn.execute('DELETE FROM search_terms WHERE term = ?', (term,))
+                if postings:
+                    self.conn.execute('INSERT INTO search_terms VALUES (?, ?, ?, ?)',
+                                      (term, postings[0][0], len(postings), encode_postings(postings)))
+        logger.debug(f"搜索索引合并 {len(terms)} 个词，用时 {time.perf_counter() - start:.2f}秒")
+
+    def missing(self) -> List[int]:
+        """章节存储中尚未建立索引的章节ID"""
+        self.flush()
+        rows = self.conn.execute(
+            'SELECT c.id FROM chapters c LEFT JOIN search_docs d ON d.chapter_id = c.id WHERE d.id IS NULL'
+        )
+        return [row[0] for row in rows]
+
+    def _postings(self, term: str) -> Dict[int, int]:
+        """单个索引词所有段的 {文档ID: 词频}（每次写入的文档ID都是新的，各段之间不重复）"""
+        rows = self.conn.execute('SELECT postings FROM search_terms WHERE term = ?', (term,))
+        merged: Dict[int, int] = {}
+        for (blob,) in rows:
+            merged.update(zip(*decode_postings(blob)))
+        return merged
+
+    def candidates(self, query: str) -> List[Tuple[float, int, int, int]]:
+        """按BM25排序的候选章节 [(得分, 文档ID, 章节ID, volume_id)]，包含查询的所有索引词"""
+        self.flush()
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return []
+
+        postings = sorted((self._postings(term) for term in terms), key=len)
+        docs = set(postings[0])
+        for other in postings[1:]:
+            docs &= other.keys()
+        if not docs:
+            return []
+
+        total, avg_length = self.conn.execute('SELECT COUNT(*), AVG(length) FROM search_docs').fetchone()
+        avg_length = avg_length or 1
+
+        # 每个词的idf与文档无关，先算好；文档长度归一化只与文档有关
+        weights = [(term_postings, math.log(1 + (total - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+                    * (self.K1 + 1)) for term_postings in postings]
+        k1_b = self.K1 * self.B / avg_length
+        k1_rest = self.K1 * (1 - self.B)
+
+        # 只读取候选文档的信息（分批避免超出SQLite参数上限），边读边计分
+        results = []
+        ids = sorted(docs)
+        for i in range(0, len(ids), 500):
+            batch = ids[i:i + 500]
+            rows = self.conn.execute(
+                f'SELECT d.id, d.chapter_id, c.volume_id, d.length FROM search_docs d '
+                f'JOIN chapters c ON c.id = d.chapter_id WHERE d.id IN ({",".join("?" * len(batch))})', batch
+            )
+            for doc, chapter_id, volume_id, length in rows:
+                norm = k1_rest + k1_b * length
+                score = 0.0
+                for term_postings, weight in weights:
+                    tf = term_postings[doc]
+                    score += weight * tf / (tf + norm)
+                results.append((score, doc, chapter_id, volume_id))
+
+        results.sort(key=lambda item: (-item[0], item[1]))
+        return results
+
+    def search(self, query: str, volumes: Dict[int, Tuple[str, str]], decode: Callable[[bytes, str, int], str],
+               limit: Optional[int] = None) -> List[Dict]:
+        """在指定卷册 {volume_id: (小说, 卷册标题)} 中搜索，返回按相关度排序的命中（含小说、章节标题、出现次数和摘要）
+
+        倒排表只保证包含所有二字组，按得分顺序读取候选章节正文确认整句出现并截取摘要，
+        得到limit条即停止，不扫描全部正文。
+        """
+        start = time.perf_counter()
+        limit = limit or Config.SEARCH_LIMIT
+        needle = query.strip().lower()
+
+        hits = []
+        for score, _, chapter_id, volume_id in self.candidates(needle):
+            if volume_id not in volumes:
+                continue
+            row = self.conn.execute(
+                'SELECT position, title, content, codec, dict_id FROM chapters WHERE id = ?', (chapter_id,)
+            ).fetchone()
+            if row is None:
+                continue
+            position, title, blob, codec, dict_id = row
+            content = decode(blob, codec, dict_id)
+            text = f'{title}\n{content}'
+            count = text.lower().count(needle)
+            if not count:
+                continue
+
+            hits.append({
+                'novel': volumes[volume_id][0], 'volume': volumes[volume_id][1], 'chapter': title, 'position': position,
+                'score': round(score, 3), 'count': count, 'snippet': self.snippet(text, needle),
+            })
+            if len(hits) >= limit:
+                break
+
+        logger.debug(f"搜索 \"{query}\": {len(hits)} 条结果，{(time.perf_counter() - start) * 1000:.1f}ms")
+        return hits
+
+    @staticmethod
+    def snippet(text: str, needle: str, width: Optional[int] = None) -> str:
+        """以第一次出现的位置为中心截取摘要，命中处用【】标出"""
+        width = width or Config.SEARCH_SNIPPET_CHARS
+        index = text.lower().find(needle)
+        begin = max(0, index - width)
+        end = min(len(text), index + len(needle) + width)
+        snippet = (text[begin:index] + '【' + text[index:index + len(needle)] + '】'
+                   + text[index + len(needle):end]).replace('\n', ' ')
+        return ('…' if begin else '') + snippet + ('…' if end < len(text) else '')
@@ -0,0 +1,265 @@
+"""
+章节正文压缩模块
+Dictionary-trained compression for stored chapter text (zstd, falling back to zlib)
+"""
+
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from utils.config import Config
+from utils.logger import logger
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖，未安装时使用zlib预设字典
+    zstandard = None
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dictionaries (
+    id INTEGER PRIMARY KEY,
+    scope TEXT NOT NULL,
+    codec TEXT NOT NULL,
+    data BLOB NOT NULL,
+    samples INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+"""
+
+# zlib预设字典只有最后32KB有效
+_ZLIB_DICT_SIZE = 32 * 1024
+
+def available_codec() -> str:
+    """按配置和已安装的库选择压缩算法"""
+    if Config.TEXT_CODEC == 'zstd' and zstandard is None:
+        logger.warning("未安装zstandard，章节压缩改用zlib")
+    if Config.TEXT_CODEC in ('auto', 'zstd') and zstandard is not None:
+        return 'zstd'
+    return 'zlib'
+
+def dictionary_scope(novel: str) -> str:
+    """字典的适用范围：按小说或按站点共享"""
+    return urlparse(novel).netloc or novel if Config.TEXT_DICT_SCOPE == 'site' else novel
+
+def train_zlib_dictionary(samples: List[bytes], size: int = _ZLIB_DICT_SIZE) -> bytes:
+    """为zlib构造预设字典：多个样本中反复出现的行（人名、套话等）
+
+    出现越频繁的内容放在越靠后的位置，离待压缩数据越近，引用代价越低。
+    """
+    counts = Counter()
+    for sample in samples:
+        counts.update(set(line.strip() for line in sample.split(b'\n') if len(line.strip()) >= 4))
+
+    dictionary = b''
+    for line, count in counts.most_common():
+        if count < 2 or len(dictionary) + len(line) + 1 > size:
+            break
+        dictionary = line + b'\n' + dictionary
+
+    # 字典未填满时用最近样本的正文补足
+    if len(dictionary) < size and samples:
+        filler = b'\n'.join(samples)[-(size - len(dictionary)):]
+        dictionary = filler + dictionary
+    return dictionary
+
+class TextCodec:
+    """章节正文编解码
+
+    每个压缩块记录编码方式和字典ID（0表示无字典），解压单章只需要对应的字典，
+    可随机访问。字典按小说（或站点）从已存储的章节中抽样训练，章节数每增加
+    TEXT_DICT_RETRAIN_EVERY章在后台线程中重新训练，并把旧块重新压缩。
+    """
+
+    def __init__(self, conn: sqlite3.Connection, path: str, scope: str):
+        self.conn = conn
+        self.path = path
+        self.scope = scope
+        self.codec = available_codec()
+        conn.executescript(_SCHEMA)
+
+        self._dictionaries: Dict[int, Tuple[str, bytes]] = {}
+        self._compressors = {}
+        self._decompressors = {}
+        self._current: Optional[int] = None
+        self._written = 0
+        self._training: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _dictionary(self, dict_id: int) -> Tuple[str, bytes]:
+        """读取字典（缓存）"""
+        if dict_id not in self._dictionaries:
+            row = self.conn.execute('SELECT codec, data FROM dictionaries WHERE id = ?', (dict_id,)).fetchone()
+            if row is None:
+                raise ValueError(f"缺少压缩字典: {dict_id}")
+            self._dictionaries[dict_id] = (row[0], bytes(row[1]))
+        return self._dictionaries[dict_id]
+
+    def current_dictionary(self) -> int:
+        """当前范围内最新的、与压缩算法匹配的字典ID（没有时为0）"""
+        with self._lock:
+            if self._current is None:
+                row = self.conn.execute(
+                    'SELECT MAX(id) FROM dictionaries WHERE scope = ? AND codec = ?', (self.scope, self.codec)
+                ).fetchone()
+                self._current = row[0] or 0
+            return self._current
+
+    def encode(self, text: str) -> Tuple[bytes, str, int]:
+        """压缩正文，返回 (压缩块, 编码方式, 字典ID)"""
+        data = text.encode('utf-8')
+        dict_id = self.current_dictionary()
+        self._written += 1
+        return self._compress(data, dict_id), self.codec, dict_id
+
+    def _compress(self, data: bytes, dict_id: int) -> bytes:
+        if self.codec == 'zstd':
+            compressor = self._compressors.get(dict_id)
+            if compressor is None:
+                dict_data = zstandard.ZstdCompressionDict(self._dictionary(dict_id)[1]) if dict_id else None
+                compressor = zstandard.ZstdCompressor(level=Config.TEXT_ZSTD_LEVEL, dict_data=dict_data)
+                self._compressors[dict_id] = compressor
+            return compressor.compress(data)
+
+        if dict_id:
+            compressor = zlib.compressobj(9, zlib.DEFLATED, 15, 9, zlib.Z_DEFAULT_STRATEGY,
+                                          self._dictionary(dict_id)[1])
+        else:
+            compressor = zlib.compressobj(9)
+        return compressor.compress(data) + compressor.flush()
+
+    def decode(self, blob: bytes, codec: str, dict_id: int) -> str:
+        """解压单章正文"""
+        if codec == 'zstd':
+            if zstandard is None:
+                raise RuntimeError("该章节使用zstd压缩，需要安装zstandard")
+            decompressor = self._decompressors.get(dict_id)
+            if decompressor is None:
+                dict_data = zstandard.ZstdCompressionDict(self._dictionary(dict_id)[1]) if dict_id else None
+                decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+                self._decompressors[dict_id] = decompressor
+            return decompressor.decompress(blob).decode('utf-8')
+
+        if dict_id:
+            decompressor = zlib.decompressobj(15, self._dictionary(dict_id)[1])
+            return (decompressor.decompress(blob) + decompressor.flush()).decode('utf-8')
+        return zlib.decompress(blob).decode('utf-8')
+
+    def maybe_retrain(self, chapter_count: Callable[[], int]):
+        """新写入的章节达到阈值时在后台重新训练字典
+
+        还没有字典时每写入TEXT_DICT_MIN_SAMPLES章尝试一次，之后每TEXT_DICT_RETRAIN_EVERY章一次。
+        """
+        if self._training is not None and self._training.is_alive():
+            return
+        threshold = Config.TEXT_DICT_RETRAIN_EVERY if self.current_dictionary() else Config.TEXT_DICT_MIN_SAMPLES
+        if self._written < threshold or chapter_count() < Config.TEXT_DICT_MIN_SAMPLES:
+            return
+
+        self._written = 0
+        self._training = threading.Thread(target=self._retrain, name='text-dict-trainer', daemon=True)
+        self._training.start()
+
+    def wait(self):
+        """等待后台训练完成"""
+        if self._training is not None:
+            self._training.join()
+
+    def _retrain(self):
+        """后台线程：抽样训练新字典，再用新字典重新压缩旧块"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            worker = TextCodec(conn, self.path, self.scope)
+            dict_id = worker.train()
+            if dict_id:
+                with self._lock:
+                    self._current = dict_id
+                worker.recompress(dict_id)
+        except Exception as e:
+            logger.warning(f"压缩字典训练失败: {str(e)}")
+        finally:
+            conn.close()
+
+    def _scope_filter(self) -> Tuple[str, str]:
+        """范围对应的卷册过滤条件"""
+        if Config.TEXT_DICT_SCOPE == 'site':
+            return 'v.novel LIKE ?', f'%://{self.scope}/%'
+        return 'v.novel = ?', self.scope
+
+    def train(self) -> int:
+        """从已存储章节中抽样训练字典，返回新字典ID（样本不足时返回0）"""
+        condition, value = self._scope_filter()
+        ids = [row[0] for row in self.conn.execute(
+            f'SELECT c.id FROM chapters c JOIN volumes v ON c.volume_id = v.id WHERE {condition}', (value,)
+        )]
+        if len(ids) < Config.TEXT_DICT_MIN_SAMPLES:
+            return 0
+
+        # 先抽样章节ID，只读取被抽中章节的正文
+        start = time.perf_counter()
+        ids = random.Random(len(ids)).sample(ids, min(len(ids), Config.TEXT_DICT_MAX_SAMPLES))
+        samples = []
+        for chapter_id in ids:
+            row = self.conn.execute(
+                'SELECT content, codec, dict_id FROM chapters WHERE id = ?', (chapter_id,)
+            ).fetchone()
+            if row is not None:
+                samples.append(self.decode(bytes(row[0]), row[1], row[2]).encode('utf-8'))
+
+        if self.codec == 'zstd':
+            data = zstandard.train_dictionary(Config.TEXT_DICT_SIZE, samples).as_bytes()
+        else:
+            data = train_zlib_dictionary(samples)
+
+        with self.conn:
+            cursor = self.conn.execute(
+                'INSERT INTO dictionaries (scope, codec, data, samples, created) VALUES (?, ?, ?, ?, ?)',
+                (self.scope, self.codec, data, len(samples), time.time())
+            )
+        logger.info(f"压缩字典训练完成: {self.scope} ({self.codec}, 样本 {len(samples)}, "
+                    f"字典 {len(data) // 1024} KB, {time.perf_counter() - start:.2f}秒)")
+        return cursor.lastrowid
+
+    def recompress(self, dict_id: int, batch_size: int = 100):
+        """用指定字典重新压缩范围内的旧块（分批提交，不长时间占用写锁）
+
+        训练期间主线程仍在用旧字典写入，处理完一轮后再查一次，直到没有旧块为止。
+        """
+        condition, value = self._scope_filter()
+        before = after = total = 0
+        while True:
+            keys = self.conn.execute(
+                f'SELECT c.id FROM chapters c JOIN volumes v ON c.volume_id = v.id '
+                f'WHERE {condition} AND NOT (c.codec = ? AND c.dict_id = ?)',
+                (value, self.codec, dict_id)
+            ).fetchall()
+            if not keys:
+                break
+            total += len(keys)
+
+            for i in range(0, len(keys), batch_size):
+                with self.conn:
+                    for (chapter_id,) in keys[i:i + batch_size]:
+                        row = self.conn.execute(
+                            'SELECT content, codec, dict_id FROM chapters WHERE id = ?', (chapter_id,)
+                        ).fetchone()
+                        if row is None:
+                            continue
+                        text = self.decode(bytes(row[0]), row[1], row[2])
+                        blob = self._compress(text.encode('utf-8'), dict_id)
+                        # 读取之后章节可能被重新爬取写入，只在内容未变时替换，否则留到下一轮
+                        cursor = self.conn.execute(
+                            'UPDATE chapters SET content = ?, codec = ?, dict_id = ? '
+                            'WHERE id = ? AND codec = ? AND dict_id = ? AND content = ?',
+                            (blob, self.codec, dict_id, chapter_id, row[1], row[2], row[0])
+                        )
+                        if cursor.rowcount:
+                            before += len(row[0])
+                            after += len(blob)
+
+        if total:
+            logger.info(f"已用新字典重新压缩 {total} 章: {before // 1024} KB -> {after // 1024} KB")